@@ -2,146 +2,503 @@
 Handling the AI moves.
 """
 
+import cProfile
 import random
+import time
+from math import isclose, log
 from game_state import GameState
-from move import Move
+from move import Move, MOVE_ID_MASK, TACTICAL_MASK, PROMOTION_MASK, CAPTURED_SHIFT, PIECE_MASK, find_move
 from multiprocessing import Queue
+from transposition_table import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
+from pawn_hash_table import PawnHashTable
+from evaluation import PIECE_CODE_SCORE, compute_evaluation, evaluate_pawn_structure
+from move_ordering import MoveOrdering, mvv_lva, MAX_PLY
+from tablebase import MAX_PIECES as MAX_TABLEBASE_PIECES, WIN, LOSS
+from search_stats import SearchStats
+from zobrist import compute_pawn_hash
 
 
-PIECE_SCORE = {"K": 200, "Q": 9, "R": 5, "B": 3, "N": 3, "p": 1}
-
-KNIGHT_SCORE = [[0.0, 0.1, 0.2, 0.2, 0.2, 0.2, 0.1, 0.0],
-                [0.1, 0.3, 0.5, 0.5, 0.5, 0.5, 0.3, 0.1],
-                [0.2, 0.5, 0.6, 0.65, 0.65, 0.6, 0.5, 0.2],
-                [0.2, 0.55, 0.65, 0.7, 0.7, 0.65, 0.55, 0.2],
-                [0.2, 0.5, 0.65, 0.7, 0.7, 0.65, 0.5, 0.2],
-                [0.2, 0.55, 0.6, 0.65, 0.65, 0.6, 0.55, 0.2],
-                [0.1, 0.3, 0.5, 0.55, 0.55, 0.5, 0.3, 0.1],
-                [0.0, 0.1, 0.2, 0.2, 0.2, 0.2, 0.1, 0.0]]
-
-BISHOP_SCORE = [[0.0, 0.2, 0.2, 0.2, 0.2, 0.2, 0.2, 0.0],
-                [0.2, 0.4, 0.4, 0.4, 0.4, 0.4, 0.4, 0.2],
-                [0.2, 0.4, 0.5, 0.6, 0.6, 0.5, 0.4, 0.2],
-                [0.2, 0.5, 0.5, 0.6, 0.6, 0.5, 0.5, 0.2],
-                [0.2, 0.4, 0.6, 0.6, 0.6, 0.6, 0.4, 0.2],
-                [0.2, 0.6, 0.6, 0.6, 0.6, 0.6, 0.6, 0.2],
-                [0.2, 0.5, 0.4, 0.4, 0.4, 0.4, 0.5, 0.2],
-                [0.0, 0.2, 0.2, 0.2, 0.2, 0.2, 0.2, 0.0]]
-
-ROOK_SCORE = [[0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25],
-              [0.5, 0.75, 0.75, 0.75, 0.75, 0.75, 0.75, 0.5],
-              [0.0, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.0],
-              [0.0, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.0],
-              [0.0, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.0],
-              [0.0, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.0],
-              [0.0, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.0],
-              [0.25, 0.25, 0.25, 0.5, 0.5, 0.25, 0.25, 0.25]]
-
-QUEEN_SCORE = [[0.0, 0.2, 0.2, 0.3, 0.3, 0.2, 0.2, 0.0],
-               [0.2, 0.4, 0.4, 0.4, 0.4, 0.4, 0.4, 0.2],
-               [0.2, 0.4, 0.5, 0.5, 0.5, 0.5, 0.4, 0.2],
-               [0.3, 0.4, 0.5, 0.5, 0.5, 0.5, 0.4, 0.3],
-               [0.4, 0.4, 0.5, 0.5, 0.5, 0.5, 0.4, 0.3],
-               [0.2, 0.5, 0.5, 0.5, 0.5, 0.5, 0.4, 0.2],
-               [0.2, 0.4, 0.5, 0.4, 0.4, 0.4, 0.4, 0.2],
-               [0.0, 0.2, 0.2, 0.3, 0.3, 0.2, 0.2, 0.0]]
-
-PAWN_SCORE = [[0.8, 0.8, 0.8, 0.8, 0.8, 0.8, 0.8, 0.8],
-              [0.7, 0.7, 0.7, 0.7, 0.7, 0.7, 0.7, 0.7],
-              [0.3, 0.3, 0.4, 0.5, 0.5, 0.4, 0.3, 0.3],
-              [0.25, 0.25, 0.3, 0.45, 0.45, 0.3, 0.25, 0.25],
-              [0.2, 0.2, 0.2, 0.4, 0.4, 0.2, 0.2, 0.2],
-              [0.25, 0.15, 0.1, 0.2, 0.2, 0.1, 0.15, 0.25],
-              [0.25, 0.3, 0.3, 0.0, 0.0, 0.3, 0.3, 0.25],
-              [0.2, 0.2, 0.2, 0.2, 0.2, 0.2, 0.2, 0.2]]
-
-PIECE_POSITION_SCORE = {"wN": KNIGHT_SCORE,
-                        "bN": KNIGHT_SCORE[::-1],
-                        "wB": BISHOP_SCORE,
-                        "bB": BISHOP_SCORE[::-1],
-                        "wQ": QUEEN_SCORE,
-                        "bQ": QUEEN_SCORE[::-1],
-                        "wR": ROOK_SCORE,
-                        "bR": ROOK_SCORE[::-1],
-                        "wp": PAWN_SCORE,
-                        "bp": PAWN_SCORE[::-1]}
-
-CHECKMATE = 1000
+CHECKMATE = 1000  # minus the plies from the root to the mate, a shorter mate scores more
 STALEMATE = 0
-DEPTH = 3
-ENDGAME_DEPTH = 5
+TABLEBASE_WIN = CHECKMATE / 2  # minus the plies to mate, a won endgame scores more than any evaluation
+# the scores from TABLEBASE_SCORE_MIN to TABLEBASE_WIN are tablebase wins and the scores from MATE_SCORE_MIN
+# to CHECKMATE are mates, both counted in plies from the root
+TABLEBASE_SCORE_MIN = TABLEBASE_WIN - 2 * MAX_PLY
+MATE_SCORE_MIN = CHECKMATE - 2 * MAX_PLY
+MAX_DEPTH = 64
+TIME_LIMIT = 2.0  # seconds per move
+NODE_LIMIT = None  # nodes per move, None for no limit
+TT_SIZE_MB = 16
+PAWN_HASH_SIZE_MB = 1  # the pawn hash table, about 32000 pawn structures
+CHECK_BUDGET_EVERY = 256  # nodes between two checks of the clock
+MAX_QUIESCENCE_DEPTH = 8  # captures searched after the horizon
+DELTA_MARGIN = 2  # a capture that can't raise the score above alpha by this margin isn't searched
+NULL_WINDOW = 0.001  # width of the window that tests if a move is better than the principal variation
+ASPIRATION_WINDOW = 0.5  # the next iteration is searched within this margin of the score of the last one
+ASPIRATION_MIN_DEPTH = 3  # the first iterations are fast, they are searched with the full window
+# selective search, every technique can be turned off on its own
+NULL_MOVE_PRUNING = True  # a position still above beta after passing the turn isn't searched
+LATE_MOVE_REDUCTIONS = True  # the late quiet moves of a node are searched less deep
+FUTILITY_PRUNING = True  # the quiet moves that can't reach alpha near the leaves aren't searched
+REVERSE_FUTILITY_PRUNING = True  # a position far above beta near the leaves isn't searched
+NULL_MOVE_MIN_DEPTH = 3
+NULL_MOVE_REDUCTION = 2  # plies saved by the null-move search, one more from depth NULL_MOVE_DEEP_DEPTH
+NULL_MOVE_DEEP_DEPTH = 7
+NULL_MOVE_MIN_PIECES = 8  # with fewer pieces (kings and pawns included) zugzwang is likely, no null move
+LMR_MIN_DEPTH = 3
+LMR_MIN_MOVE_NUMBER = 3  # the hash move, the best captures and the killers are searched to the full depth
+FUTILITY_MARGINS = (0, 2, 4)  # by remaining depth, in pawns
+REVERSE_FUTILITY_MARGIN = 1.2  # per ply of remaining depth, in pawns
+DEBUG_INCREMENTAL_EVALUATION = False  # check the incremental evaluation against a full board scan
+VERBOSE = False  # print the progress and the statistics of every search (for debugging), see search_stats
+TIME_PHASES = False  # measure the time of the move generation, make/undo move and evaluation (slows the search)
+PHASES = ("get_valid_moves", "make_move", "undo_move")  # the GameState methods timed by TIME_PHASES
 
+transposition_table = TranspositionTable(TT_SIZE_MB)
+pawn_hash_table = PawnHashTable(PAWN_HASH_SIZE_MB)  # kept between searches, the pawn structures don't go stale
+move_ordering = MoveOrdering()
+opening_book = None  # an OpeningBook (book.py), the moves of the book are played without a search
+tablebases = None  # Tablebases (tablebase.py), endgames in the tables are looked up instead of searched
+search_stats = SearchStats()  # the statistics of the last search
+principal_variation = []  # the expected line of play of the last completed iteration
+pv_table = [[] for _ in range(MAX_PLY + 1)]  # the principal variation found at every ply of the search
+PRUNING_COUNTERS = ("null_move_searches", "null_move_cutoffs", "reductions", "reduction_researches", "futility",
+                    "reverse_futility")
+pruning_counts = dict.fromkeys(PRUNING_COUNTERS, 0)  # how often each selective technique applied in the last search
+# the plies taken off a late move by depth and move number, more for later moves and deeper searches
+LMR_REDUCTIONS = [[int(0.75 + log(depth) * log(move_number) / 2.25) if depth > 0 and move_number > 0 else 0
+                   for move_number in range(64)] for depth in range(MAX_DEPTH + 1)]
 
-def move_sort(gs: GameState, valid_moves: list) -> list:
+
+def find_best_move(gs: GameState, valid_moves: list, return_queue: Queue = None, time_limit: float = TIME_LIMIT,
+                   node_limit: int = NODE_LIMIT, max_depth: int = MAX_DEPTH, stop_event=None,
+                   info_callback=None, time_phases: bool = TIME_PHASES, profile_path: str = None) -> int:
     """
-    The function sort the moves by thier priority
+    Iterative deepening: search depth 1, 2, 3... until the time or node budget expires and return the best
+    move of the last completed iteration (also put in the queue if one is given). Moves are packed ints
+    (see move.py), like the moves of valid_moves.
+    The search is cancelled as soon as stop_event (anything with an is_set method) is set.
+    info_callback is called after every completed iteration with a dict of the depth, score (from the
+    point of view of the side to move), nodes, time and principal variation. The principal variation of
+    the last completed iteration is left in principal_variation.
+    The statistics of the search are left in search_stats, with the time of every phase if time_phases.
+    If profile_path is given the search runs under cProfile and the profile is dumped to the file
+    (read it with pstats or snakeviz).
     """
-    # convert each move into a tuple where each field represent different type of move
-    # 1: if the move contains checkmate 1, otherwise 0
-    # 2: if the move contains check 1, otherwise 0
-    # 3: if the move contains promotion 1, otherwise 0
-    # 4: if the move contains capture 1, otherwise 0
-    tmp_moves = {}
-    for i in range(len(valid_moves)):
-        checkmate, check, promotion, capture = 0, 0, 0, 0
-        move = valid_moves[i]
-        gs.make_move(move)
-        if gs.inCheck:
-            check = 1
-        if gs.checkmate:
-            checkmate = 1
-        gs.undo_move()
-        if move.is_pawn_promotion:
-            promotion = 1
-        if move.is_capture:
-            capture = 1
-        tmp_moves[i] = [checkmate, check, promotion, capture, move]
+    global search_stats
+    search_stats = SearchStats()
+    if tablebases is not None:
+        tablebases.reset_stats()
+    profiler = None
+    if profile_path is not None:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    if time_phases:
+        add_phase_timers(gs)
+    try:
+        best_move = iterative_deepening(gs, valid_moves, time_limit, node_limit, max_depth, stop_event, info_callback)
+    finally:
+        if time_phases:
+            remove_phase_timers(gs)
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(profile_path)
+    search_stats.finish(nodes, qnodes, transposition_table, move_ordering, tablebases, pawn_hash_table)
+    search_stats.record_researches(null_window_searches, null_window_researches, aspiration_searches,
+                                   aspiration_researches)
+    search_stats.pruning = dict(pruning_counts)
+    if VERBOSE:
+        print(f"search statistics {search_stats.as_dict()}")
+    if return_queue is not None:
+        return_queue.put(best_move)
+    return best_move
+
+
+def add_phase_timers(gs: GameState) -> None:
+    """
+    The function replaces the methods of the game state and the evaluation with timed versions
+    """
+    global score_board
+    for phase in PHASES:
+        setattr(gs, phase, search_stats.timed(phase, getattr(gs, phase)))
+    score_board = search_stats.timed("score_board", score_board)
+
 
-    # sort the dictionary by the priority
-    sorted_list = sorted(tmp_moves.values(),
-                         key=lambda x: (x[0], x[1]), reverse=True)
-    sorted_moves = [move for _, _, _, _, move in sorted_list]
-    return sorted_moves
+def remove_phase_timers(gs: GameState) -> None:
+    global score_board
+    for phase in PHASES:
+        delattr(gs, phase)  # the methods of the class are used again
+    score_board = score_board.__wrapped__
 
 
-def find_best_move(gs: GameState, valid_moves: list, return_queue: Queue) -> None:
-    global next_move
+def iterative_deepening(gs: GameState, valid_moves: list, time_limit: float, node_limit: int, max_depth: int,
+                        stop_event, info_callback) -> int:
+    """
+    The search of find_best_move: search depth 1, 2, 3... and return the best move of the deepest
+    completed iteration. From ASPIRATION_MIN_DEPTH on, an iteration is searched in a window around the
+    score of the last one, widened and searched again when the score falls outside of it.
+    """
+    global next_move, nodes, qnodes, search_stopped, stop_allowed, deadline, max_nodes, cancel_event
+    global completed_depth, best_score, principal_variation
+    global null_window_searches, null_window_researches, aspiration_searches, aspiration_researches, pruning_counts
     next_move = None
     # random.shuffle(valid_moves)
 
-    # sort the moves
-    sorted_moves = move_sort(gs, valid_moves)
+    # find the best move
+    transposition_table.new_search()
+    transposition_table.reset_stats()
+    pawn_hash_table.reset_stats()
+    move_ordering.new_search()
+    start_time = time.perf_counter()
+    deadline = start_time + time_limit if time_limit is not None else None
+    max_nodes = node_limit
+    cancel_event = stop_event
+    nodes = 0
+    qnodes = 0
+    search_stopped = False
+    stop_allowed = False  # the first iteration always completes so there is a move to play
+    best_move = None
+    completed_depth = 0
+    best_score = None
+    principal_variation = []
+    null_window_searches = null_window_researches = 0
+    aspiration_searches = aspiration_researches = 0
+    pruning_counts = dict.fromkeys(PRUNING_COUNTERS, 0)
+    if VERBOSE:
+        print(f"piece count {gs.piece_count}")
 
-    # add book move data base
+    # play from the opening book while the position is in it
+    if opening_book is not None:
+        best_move = opening_book.choose_move(gs, valid_moves)
+        if best_move is not None:
+            if VERBOSE:
+                print(f"book move {Move(best_move)}")
+            principal_variation = [best_move]
+            return best_move
 
-    # find the best move
-    print(f"piece count {gs.piece_count}")
-    if gs.piece_count >= 9:
-        find_move_nega_max_alpha_beta(
-            gs, sorted_moves, DEPTH, -CHECKMATE, CHECKMATE, 1 if gs.whiteToMove else -1)
-    else:
-        print("started end game faze")
-        find_move_nega_max_alpha_beta(
-            gs, sorted_moves, ENDGAME_DEPTH, -CHECKMATE, CHECKMATE, 1 if gs.whiteToMove else -1)
-    return_queue.put(next_move)
+    # play the best move of the tablebases when there are few pieces left
+    if tablebases is not None and gs.piece_count <= MAX_TABLEBASE_PIECES:
+        best_move = tablebases.best_move(gs, valid_moves)
+        if best_move is not None:
+            best_score = tablebase_score(tablebases.probe(gs), 0)
+            if VERBOSE:
+                print(f"tablebase move {Move(best_move)} score {best_score}")
+            principal_variation = [best_move]
+            return best_move
+
+    for depth in range(1, max_depth + 1):
+        # mate scores change from one iteration to the next, they are searched with the full window
+        window = ASPIRATION_WINDOW
+        if depth >= ASPIRATION_MIN_DEPTH and abs(best_score) < TABLEBASE_SCORE_MIN:
+            alpha, beta = best_score - window, best_score + window
+            aspiration_searches += 1
+        else:
+            alpha, beta = -CHECKMATE, CHECKMATE
+        # the best move of the previous iteration is searched first
+        root_move_id = best_move & MOVE_ID_MASK if best_move is not None else None
+        while True:
+            score = find_move_nega_max_alpha_beta(gs, valid_moves, depth, alpha, beta, 1 if gs.whiteToMove else -1,
+                                                  root_move_id=root_move_id)
+            if search_stopped:
+                break
+            if score <= alpha and alpha > -CHECKMATE:  # fail low, the score is only an upper bound
+                alpha = max(score - window, -CHECKMATE)
+            elif score >= beta and beta < CHECKMATE:  # fail high, the score is only a lower bound
+                beta = min(score + window, CHECKMATE)
+                # the move that failed high is searched first
+                root_move_id = next_move & MOVE_ID_MASK
+            else:
+                break
+            window *= 2
+            aspiration_researches += 1
+        if search_stopped:
+            break
+        best_move = next_move
+        best_score = score
+        principal_variation = complete_principal_variation(gs, pv_table[0], depth)
+        completed_depth = depth
+        stop_allowed = True
+        search_stats.add_iteration(depth, score, nodes + qnodes, principal_variation)
+        if VERBOSE:
+            print(f"depth {depth} score {score:.2f} nodes {nodes} qnodes {qnodes} "
+                  f"time {time.perf_counter() - start_time:.2f}s "
+                  f"pv {' '.join(str(Move(move)) for move in principal_variation)}")
+        if info_callback is not None:
+            info_callback({"depth": depth, "score": score, "nodes": nodes + qnodes,
+                           "time": time.perf_counter() - start_time, "pv": principal_variation})
+        # nothing more to search: a forced mate was found or there is only one move
+        if abs(score) >= MATE_SCORE_MIN or len(valid_moves) <= 1:
+            break
+        if deadline is not None and time.perf_counter() >= deadline:
+            break
+        if max_nodes is not None and nodes + qnodes >= max_nodes:
+            break
+    return best_move
 
 
-def find_move_nega_max_alpha_beta(gs, valid_moves, depth, alpha, beta, turn_multiplier):
-    global next_move
-    if depth == 0:
-        return turn_multiplier * score_board(gs)
-    # move ordering - implement later //TODO
+def complete_principal_variation(gs: GameState, pv: list, length: int) -> list:
+    """
+    The function returns the principal variation of the search extended with the best moves stored in the
+    transposition table, where the variation was cut short by a score of the table
+    """
+    pv = list(pv)
+    for move in pv:
+        gs.make_move(move)
+    while len(pv) < length:
+        entry = transposition_table.probe(gs.zobrist_key)
+        if entry is None or entry[3] is None:
+            break
+        next_pv_move = find_move(gs.get_valid_moves(), entry[3])
+        if next_pv_move is None:
+            break
+        pv.append(next_pv_move)
+        gs.make_move(next_pv_move)
+    for _ in range(len(pv)):
+        gs.undo_move()
+    return pv
+
+
+def check_budget() -> None:
+    """
+    The function stops the search if the time or node budget of the move expired
+    """
+    global search_stopped
+    if cancel_event is not None and cancel_event.is_set():
+        search_stopped = True
+        return
+    if not stop_allowed:
+        return
+    if (deadline is not None and time.perf_counter() >= deadline) or \
+            (max_nodes is not None and nodes + qnodes >= max_nodes):
+        search_stopped = True
+
+
+def find_move_nega_max_alpha_beta(gs, valid_moves, depth, alpha, beta, turn_multiplier, ply=0, root_move_id=None,
+                                  allow_null_move=True):
+    """
+    Negamax alpha-beta search with principal variation search: the moves are searched in the order of
+    move_ordering, the first one with the full window and the others with a null window that only proves
+    they are not better. A move that turns out better is searched again with the full window.
+    Outside of the principal variation the search is selective: null-move pruning, late move reductions
+    and (reverse) futility pruning near the leaves.
+    The principal variation of the node is left in pv_table[ply].
+    root_move_id is the move searched first at the root (the best move of the previous iteration).
+    allow_null_move is False right after a null move, two null moves in a row would only lose depth.
+    """
+    global next_move, nodes, null_window_searches, null_window_researches
+    pv_table[ply] = []
+    if ply > 0:
+        if len(valid_moves) == 0:
+            return -(CHECKMATE - ply) if gs.inCheck else STALEMATE
+        # a repeated position is a draw: if repeating it was best, it will be repeated again. The
+        # fifty-move rule doesn't apply to a checkmate, which is found above
+        if gs.is_repetition() or gs.is_fifty_move_draw():
+            return STALEMATE
+    # the exact result of the endgames in the tablebases
+    if ply > 0 and tablebases is not None and gs.piece_count <= MAX_TABLEBASE_PIECES:
+        result = tablebases.probe(gs)
+        if result is not None:
+            return tablebase_score(result, ply)
+    if depth <= 0:
+        return quiescence_search(gs, valid_moves, alpha, beta, turn_multiplier, ply=ply)
+    nodes += 1
+    if (nodes + qnodes) % CHECK_BUDGET_EVERY == 0:
+        check_budget()
+    if search_stopped:
+        return 0
+    # the moves of the children overwrite the check of the game state
+    in_check = gs.inCheck
+    # the nodes searched with a null window (width NULL_WINDOW) aren't in the principal variation
+    pv_node = beta - alpha > 2 * NULL_WINDOW
+
+    # probe the transposition table, at the root we only use the stored move for ordering
+    # because the root has to set next_move
+    alpha_orig = alpha
+    hash_move_id = None
+    entry = transposition_table.probe(gs.zobrist_key)
+    if entry is not None:
+        entry_depth, bound, entry_score, hash_move_id = entry
+        entry_score = score_from_table(entry_score, ply)
+        if ply > 0 and entry_depth >= depth:
+            if bound == EXACT:
+                return entry_score
+            if bound == LOWER_BOUND and entry_score > alpha:
+                alpha = entry_score
+            elif bound == UPPER_BOUND and entry_score < beta:
+                beta = entry_score
+            if alpha >= beta:
+                return entry_score
+
+    if root_move_id is not None:
+        hash_move_id = root_move_id
+
+    selective = ply > 0 and not pv_node and not in_check
+    static_score = turn_multiplier * score_board(gs) if selective else None
+    if selective and abs(beta) < TABLEBASE_SCORE_MIN:
+        # reverse futility pruning: far enough above beta, a few plies won't bring the score back down
+        if REVERSE_FUTILITY_PRUNING and depth < len(FUTILITY_MARGINS) and \
+                static_score - REVERSE_FUTILITY_MARGIN * depth >= beta:
+            pruning_counts["reverse_futility"] += 1
+            return static_score
+        # null-move pruning: if the position is still above beta after passing the turn, a real move
+        # would be even better. Not with few pieces, where passing could be the best move (zugzwang).
+        if NULL_MOVE_PRUNING and allow_null_move and depth >= NULL_MOVE_MIN_DEPTH and static_score >= beta and \
+                gs.piece_count >= NULL_MOVE_MIN_PIECES:
+            reduction = NULL_MOVE_REDUCTION + (depth >= NULL_MOVE_DEEP_DEPTH)
+            pruning_counts["null_move_searches"] += 1
+            gs.make_null_move()
+            next_moves = gs.get_valid_moves()
+            score = -find_move_nega_max_alpha_beta(gs, next_moves, depth - 1 - reduction, -beta, -beta + NULL_WINDOW,
+                                                   -turn_multiplier, ply + 1, allow_null_move=False)
+            gs.undo_null_move()
+            if search_stopped:
+                return 0
+            if score >= beta:
+                pruning_counts["null_move_cutoffs"] += 1
+                # a mate found after a null move isn't a real mate
+                return beta if score >= TABLEBASE_SCORE_MIN else score
+    # futility pruning: near the leaves, the quiet moves can't bring a score far below alpha back up
+    futile = FUTILITY_PRUNING and selective and depth < len(FUTILITY_MARGINS) and \
+        static_score + FUTILITY_MARGINS[depth] <= alpha and abs(alpha) < TABLEBASE_SCORE_MIN
+
     max_score = -CHECKMATE
-    for move in valid_moves:
+    best_move = None
+    for move_number, move in enumerate(move_ordering.order_moves(valid_moves, ply, hash_move_id)):
+        quiet = not move & TACTICAL_MASK
         gs.make_move(move)
+        # a quiet move that gives check isn't futile, the check can change the score a lot
+        if futile and quiet and best_move is not None and not gs.in_check():
+            gs.undo_move()
+            pruning_counts["futility"] += 1
+            # the score of the move is at most the margin above the static score
+            max_score = max(max_score, static_score + FUTILITY_MARGINS[depth])
+            continue
         next_moves = gs.get_valid_moves()
-        score = -find_move_nega_max_alpha_beta(gs, next_moves,
-                                               depth - 1, -beta, -alpha, -turn_multiplier)
-        if score > max_score:
+        if move_number == 0:
+            score = -find_move_nega_max_alpha_beta(gs, next_moves,
+                                                   depth - 1, -beta, -alpha, -turn_multiplier, ply + 1)
+        else:
+            # late move reductions: the late quiet moves are searched less deep, unless they are or give check
+            reduction = 0
+            if LATE_MOVE_REDUCTIONS and quiet and depth >= LMR_MIN_DEPTH and move_number >= LMR_MIN_MOVE_NUMBER \
+                    and not in_check and not gs.inCheck:
+                reduction = min(LMR_REDUCTIONS[min(depth, MAX_DEPTH)][min(move_number, 63)] - pv_node, depth - 2)
+            null_window_searches += 1
+            score = -find_move_nega_max_alpha_beta(gs, next_moves, depth - 1 - max(reduction, 0),
+                                                   -alpha - NULL_WINDOW, -alpha, -turn_multiplier, ply + 1)
+            if reduction > 0:
+                pruning_counts["reductions"] += 1
+                # a reduced move that beats alpha is searched again to the full depth
+                if score > alpha and not search_stopped:
+                    pruning_counts["reduction_researches"] += 1
+                    score = -find_move_nega_max_alpha_beta(gs, next_moves, depth - 1,
+                                                           -alpha - NULL_WINDOW, -alpha, -turn_multiplier, ply + 1)
+            if alpha < score < beta and not search_stopped:
+                null_window_researches += 1
+                score = -find_move_nega_max_alpha_beta(gs, next_moves,
+                                                       depth - 1, -beta, -alpha, -turn_multiplier, ply + 1)
+        gs.undo_move()
+        if search_stopped:
+            # the result of an unfinished search can't be trusted
+            return 0
+        # a move is kept even if it is mated, so the root always has a move
+        if score > max_score or best_move is None:
             max_score = score
-            if depth == DEPTH:
+            best_move = move
+            if ply == 0:
                 next_move = move
+        if max_score > alpha:
+            alpha = max_score
+            pv_table[ply] = [move] + pv_table[ply + 1]
+        if alpha >= beta:
+            move_ordering.record_cutoff(move, ply, depth, move_number)
+            break
+
+    if max_score <= alpha_orig:
+        bound = UPPER_BOUND
+    elif max_score >= beta:
+        bound = LOWER_BOUND
+    else:
+        bound = EXACT
+    transposition_table.store(gs.zobrist_key, depth, bound, score_to_table(max_score, ply),
+                              best_move & MOVE_ID_MASK if best_move is not None else None)
+    return max_score
+
+
+def tablebase_score(result: tuple, ply: int) -> float:
+    """
+    The function converts a tablebase result to a score of the side to move, a win (or loss) in fewer plies
+    from the root scores higher (or lower)
+    """
+    outcome, plies = result
+    if outcome == WIN:
+        return TABLEBASE_WIN - plies - ply
+    if outcome == LOSS:
+        return -(TABLEBASE_WIN - plies - ply)
+    return STALEMATE
+
+
+def score_to_table(score: float, ply: int) -> float:
+    """
+    The function converts a score of the search at the ply to the score stored in the transposition table:
+    mates and tablebase wins are counted in plies from the stored position instead of from the root, so
+    the entry is right whatever the ply it is read at
+    """
+    if score >= TABLEBASE_SCORE_MIN:
+        return score + ply
+    if score <= -TABLEBASE_SCORE_MIN:
+        return score - ply
+    return score
+
+
+def score_from_table(score: float, ply: int) -> float:
+    """
+    The function converts a score of the transposition table back to a score of the search at the ply
+    """
+    if score >= TABLEBASE_SCORE_MIN:
+        return score - ply
+    if score <= -TABLEBASE_SCORE_MIN:
+        return score + ply
+    return score
+
+
+def quiescence_search(gs, valid_moves, alpha, beta, turn_multiplier, qdepth=0, ply=0):
+    """
+    Search only captures and promotions after the horizon so positions are evaluated when they are quiet,
+    ply is the distance from the root (for the mate scores)
+    """
+    global qnodes
+    qnodes += 1
+    if (nodes + qnodes) % CHECK_BUDGET_EVERY == 0:
+        check_budget()
+    if search_stopped:
+        return 0
+
+    if len(valid_moves) == 0:
+        return -(CHECKMATE - ply) if gs.inCheck else STALEMATE
+    # stand pat: the side to move doesn't have to capture
+    stand_pat = turn_multiplier * score_board(gs)
+    if stand_pat >= beta or qdepth >= MAX_QUIESCENCE_DEPTH:
+        return stand_pat
+    if stand_pat > alpha:
+        alpha = stand_pat
+
+    captures = [move for move in valid_moves if move & TACTICAL_MASK]
+    captures.sort(key=mvv_lva, reverse=True)
+    max_score = stand_pat
+    for move in captures:
+        # delta pruning: skip captures that can't bring the score back to alpha
+        if not move & PROMOTION_MASK and \
+                stand_pat + PIECE_CODE_SCORE[move >> CAPTURED_SHIFT & PIECE_MASK] + DELTA_MARGIN <= alpha:
+            continue
+        gs.make_move(move)
+        next_moves = gs.get_valid_moves()
+        score = -quiescence_search(gs, next_moves, -beta, -alpha, -turn_multiplier, qdepth + 1, ply + 1)
         gs.undo_move()
+        if search_stopped:
+            return 0
+        if score > max_score:
+            max_score = score
         if max_score > alpha:
             alpha = max_score
         if alpha >= beta:
@@ -160,24 +517,33 @@ def score_board(gs):
             return CHECKMATE  # white wins
     elif gs.stalemate:
         return STALEMATE
-    score = 0
-    for row in range(len(gs.board)):
-        for col in range(len(gs.board[row])):
-            piece = gs.board[row][col]
-            if piece != "--":
-                piece_position_score = 0
-                if piece[1] != "K":
-                    piece_position_score = PIECE_POSITION_SCORE[piece][row][col]
-                if piece[0] == "w":
-                    score += PIECE_SCORE[piece[1]] + piece_position_score
-                if piece[0] == "b":
-                    score -= PIECE_SCORE[piece[1]] + piece_position_score
+    # material and piece-square scores are kept up to date by make_move and undo_move
+    score = gs.material_score + gs.position_score
+    if DEBUG_INCREMENTAL_EVALUATION:
+        material, position = compute_evaluation(gs.board)
+        assert gs.material_score == material and isclose(gs.position_score, position, abs_tol=1e-6), \
+            f"incremental evaluation {gs.material_score}, {gs.position_score} != {material}, {position}"
+        assert gs.pawn_key == compute_pawn_hash(gs), f"incremental pawn hash {gs.pawn_key:x}"
+    # the pawn structure score is cached in the pawn hash table
+    score += pawn_structure(gs)[0]
 
     score += force_king_to_corner(gs.white_king_loc,
                                   gs.black_king_loc, len(gs.moveLog))
     return score
 
 
+def pawn_structure(gs) -> tuple:
+    """
+    The function returns (score, white passed pawns, black passed pawns) of the pawns of the game state
+    (see evaluation.evaluate_pawn_structure), from the pawn hash table when the structure is in it
+    """
+    entry = pawn_hash_table.probe(gs.pawn_key)
+    if entry is None:
+        entry = evaluate_pawn_structure(gs.board)
+        pawn_hash_table.store(gs.pawn_key, *entry)
+    return entry
+
+
 def force_king_to_corner(ally_king_loc: tuple, enemy_king_loc: tuple, move_count: int) -> float:
     eval = 0
     enemy_king_dist_center_row = max(
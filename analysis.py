@@ -0,0 +1,145 @@
+"""
+Batch analysis of position files (EPD or FEN lines) with a pool of engine processes.
+The results are written as JSON lines in the order the positions finish:
+    python analysis.py positions.epd --depth 4 --output results.jsonl
+The positions are read lazily and only a few of them per process are queued at a time, so the memory
+stays flat whatever the size of the input. The EPD operations acd (depth) and acs (seconds) set the
+budget of a single position.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from multiprocessing import Pool
+from queue import Queue
+from game_state import GameState
+from move import Move
+from bitboard import BitboardGameState
+from epd import parse_epd
+from transposition_table import TranspositionTable
+import ai
+
+BACKENDS = {"mailbox": GameState, "bitboard": BitboardGameState}
+PENDING_PER_PROCESS = 4  # positions queued per process, enough to keep all of them busy
+
+
+def init_worker(tt_size_mb: float) -> None:
+    """
+    The function prepares the engine of a pool process
+    """
+    ai.VERBOSE = False
+    if tt_size_mb != ai.TT_SIZE_MB:
+        ai.transposition_table = TranspositionTable(tt_size_mb)
+
+
+def analyze_position(task: tuple) -> dict:
+    """
+    The function searches one position and returns the result as a dict, task is
+    (index, line, backend, max_depth, time_limit, node_limit)
+    """
+    index, line, backend, max_depth, time_limit, node_limit = task
+    result = {"index": index}
+    try:
+        fen, operations = parse_epd(line)
+        gs = BACKENDS[backend].from_fen(fen)
+        if "acd" in operations:
+            max_depth, time_limit = int(operations["acd"][0]), None
+        if "acs" in operations:
+            time_limit = float(operations["acs"][0])
+    except (ValueError, KeyError, IndexError) as error:
+        result["error"] = f"invalid position: {error}"
+        return result
+    result["fen"] = fen
+    if "id" in operations:
+        result["id"] = " ".join(operations["id"])
+
+    # every position is analyzed from a clean state, so the result doesn't depend on the process
+    ai.transposition_table.clear()
+    ai.move_ordering.clear()
+    start_time = time.perf_counter()
+    valid_moves = gs.get_valid_moves()
+    if not valid_moves:
+        # the game is over, the score is from the side to move
+        result.update({"bestmove": None, "score": -ai.CHECKMATE if gs.checkmate else ai.STALEMATE, "depth": 0,
+                       "nodes": 0, "seconds": round(time.perf_counter() - start_time, 4)})
+        return result
+    best_move = ai.find_best_move(gs, valid_moves, time_limit=time_limit, node_limit=node_limit,
+                                  max_depth=max_depth)
+    stats = ai.search_stats
+    result.update({"bestmove": Move(best_move).get_uci_notation(), "score": ai.best_score, "depth": ai.completed_depth,
+                   "nodes": ai.nodes + ai.qnodes, "seconds": round(time.perf_counter() - start_time, 4),
+                   "nps": round(stats.nps()), "branching_factor": round(stats.branching_factor(), 2),
+                   "tt_hit_rate": round(stats.transposition_table["hit_rate"], 3),
+                   "first_move_cutoff_rate": round(stats.move_ordering["first_move_cutoff_rate"], 3),
+                   "research_rate": round(stats.research_rate(), 3),
+                   "pv": [Move(move).get_uci_notation() for move in ai.principal_variation]})
+    return result
+
+
+def analyze(lines, processes: int = os.cpu_count(), max_depth: int = ai.MAX_DEPTH, time_limit: float = None,
+            node_limit: int = None, backend: str = "mailbox", tt_size_mb: float = ai.TT_SIZE_MB):
+    """
+    Generator of the analysis results of the positions (an iterable of EPD or FEN lines), in the order
+    they finish. Empty lines and comments (#) are skipped, the index of a result is its line number.
+    """
+    finished = Queue()
+    pending = 0
+    with Pool(processes, initializer=init_worker, initargs=(tt_size_mb,)) as pool:
+        for index, line in enumerate(lines, start=1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            pool.apply_async(analyze_position, ((index, line, backend, max_depth, time_limit, node_limit),),
+                             callback=finished.put,
+                             error_callback=lambda error, index=index: finished.put(
+                                 {"index": index, "error": repr(error)}))
+            pending += 1
+            # wait for a position to finish before reading more of the input
+            while pending >= processes * PENDING_PER_PROCESS:
+                yield finished.get()
+                pending -= 1
+        while pending > 0:
+            yield finished.get()
+            pending -= 1
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Analyze a file of EPD or FEN positions with a process pool")
+    parser.add_argument("input", help="the position file, - for stdin")
+    parser.add_argument("--output", "-o", help="the JSON lines output file (default stdout)")
+    parser.add_argument("--depth", type=int, default=None, help="search depth of every position")
+    parser.add_argument("--movetime", type=float, default=None, help="seconds per position")
+    parser.add_argument("--nodes", type=int, default=None, help="nodes per position")
+    parser.add_argument("--processes", type=int, default=os.cpu_count())
+    parser.add_argument("--backend", choices=BACKENDS, default="mailbox")
+    parser.add_argument("--hash", type=float, default=ai.TT_SIZE_MB, help="transposition table size (MB) per process")
+    args = parser.parse_args()
+    if args.depth is None and args.movetime is None and args.nodes is None:
+        args.movetime = ai.TIME_LIMIT
+
+    input_file = sys.stdin if args.input == "-" else open(args.input)
+    output_file = sys.stdout if args.output is None else open(args.output, "w")
+    start_time = time.perf_counter()
+    count = errors = 0
+    try:
+        for result in analyze(input_file, args.processes, args.depth or ai.MAX_DEPTH, args.movetime, args.nodes,
+                              args.backend, args.hash):
+            output_file.write(json.dumps(result) + "\n")
+            output_file.flush()
+            count += 1
+            errors += "error" in result
+    finally:
+        if input_file is not sys.stdin:
+            input_file.close()
+        if output_file is not sys.stdout:
+            output_file.close()
+    seconds = time.perf_counter() - start_time
+    print(json.dumps({"positions": count, "errors": errors, "seconds": round(seconds, 3),
+                      "positions_per_second": round(count / seconds, 2) if seconds > 0 else None}), file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
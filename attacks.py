@@ -0,0 +1,92 @@
+"""
+Attack queries on the 8x8 board.
+Answers "is the square (row, col) attacked by the given color" by looking outward from the square:
+knight and king jumps, the two pawn squares, and the first piece on every rook and bishop ray.
+No moves are generated, so it is much cheaper than scanning the opponent's pseudo-legal moves.
+"""
+
+KNIGHT_OFFSETS = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+KING_OFFSETS = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+ORTHOGONAL_DIRECTIONS = ((-1, 0), (0, -1), (1, 0), (0, 1))
+DIAGONAL_DIRECTIONS = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+
+
+def compute_jumps(offsets: tuple) -> list:
+    """
+    The function computes for every square the list of squares reached by the given offsets
+    """
+    return [[[(row + d_row, col + d_col) for d_row, d_col in offsets
+              if 0 <= row + d_row < 8 and 0 <= col + d_col < 8]
+             for col in range(8)] for row in range(8)]
+
+
+def compute_rays(directions: tuple) -> list:
+    """
+    The function computes for every square the list of squares in each direction, nearest square first
+    """
+    rays = []
+    for row in range(8):
+        row_rays = []
+        for col in range(8):
+            square_rays = []
+            for d_row, d_col in directions:
+                ray = []
+                end_row, end_col = row + d_row, col + d_col
+                while 0 <= end_row < 8 and 0 <= end_col < 8:
+                    ray.append((end_row, end_col))
+                    end_row, end_col = end_row + d_row, end_col + d_col
+                if ray:
+                    square_rays.append(ray)
+            row_rays.append(square_rays)
+        rays.append(row_rays)
+    return rays
+
+
+KNIGHT_SQUARES = compute_jumps(KNIGHT_OFFSETS)
+KING_SQUARES = compute_jumps(KING_OFFSETS)
+ORTHOGONAL_RAYS = compute_rays(ORTHOGONAL_DIRECTIONS)
+DIAGONAL_RAYS = compute_rays(DIAGONAL_DIRECTIONS)
+
+
+def is_square_attacked(board: list, row: int, col: int, attacker_color: str) -> bool:
+    """
+    The function determines if a piece of attacker_color ("w" or "b") attacks the square (row, col)
+    """
+    # pawns attack diagonally forward, so a white pawn attacking the square is one row below it
+    pawn_row = row + 1 if attacker_color == "w" else row - 1
+    if 0 <= pawn_row < 8:
+        pawn = attacker_color + "p"
+        if col > 0 and board[pawn_row][col - 1] == pawn:
+            return True
+        if col < 7 and board[pawn_row][col + 1] == pawn:
+            return True
+
+    knight = attacker_color + "N"
+    for end_row, end_col in KNIGHT_SQUARES[row][col]:
+        if board[end_row][end_col] == knight:
+            return True
+
+    queen = attacker_color + "Q"
+    rook = attacker_color + "R"
+    for ray in ORTHOGONAL_RAYS[row][col]:
+        for end_row, end_col in ray:
+            piece = board[end_row][end_col]
+            if piece != "--":
+                if piece == rook or piece == queen:
+                    return True
+                break
+
+    bishop = attacker_color + "B"
+    for ray in DIAGONAL_RAYS[row][col]:
+        for end_row, end_col in ray:
+            piece = board[end_row][end_col]
+            if piece != "--":
+                if piece == bishop or piece == queen:
+                    return True
+                break
+
+    king = attacker_color + "K"
+    for end_row, end_col in KING_SQUARES[row][col]:
+        if board[end_row][end_col] == king:
+            return True
+    return False
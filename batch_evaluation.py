@@ -0,0 +1,246 @@
+"""
+Evaluation of many positions at once with NumPy. A board is encoded as 64 int8 piece codes, row by row
+like GameState.board: 0 for an empty square, 1 to 6 for the white pawn, knight, bishop, rook, queen and
+king and -1 to -6 for the black ones. evaluate_boards scores an (N, 64) array of boards in one vectorized
+pass with the terms of ai.score_board: material, piece-square tables, the pawn structure of
+evaluation.evaluate_pawn_structure and the king distance term of ai.force_king_to_corner. The search keeps
+its incremental score for single positions, the batches are for the children of a node (evaluate_moves)
+and for scoring position files offline:
+    python batch_evaluation.py positions.epd --output scores.jsonl
+"""
+
+import argparse
+import json
+import sys
+import numpy as np
+from evaluation import PIECE_SCORE, PIECE_POSITION_SCORE, DOUBLED_PAWN_PENALTY, ISOLATED_PAWN_PENALTY, \
+    PASSED_PAWN_BONUS
+from epd import parse_epd
+from move import Move, SQUARE_MASK, END_SQUARE_SHIFT
+
+PIECE_CODES = {"--": 0, "wp": 1, "wN": 2, "wB": 3, "wR": 4, "wQ": 5, "wK": 6,
+               "bp": -1, "bN": -2, "bB": -3, "bR": -4, "bQ": -5, "bK": -6}
+FEN_PIECE_CODES = {"P": 1, "N": 2, "B": 3, "R": 4, "Q": 5, "K": 6, "p": -1, "n": -2, "b": -3, "r": -4, "q": -5, "k": -6}
+WHITE_KING, BLACK_KING = PIECE_CODES["wK"], PIECE_CODES["bK"]
+WHITE_PAWN, BLACK_PAWN = PIECE_CODES["wp"], PIECE_CODES["bp"]
+CODE_OFFSET = 6  # the row of a piece code in the score tables
+BATCH_SIZE = 4096  # positions of a position file scored at once
+SQUARE_INDICES = np.arange(64)
+SQUARE_ROWS, SQUARE_COLS = np.divmod(SQUARE_INDICES, 8)
+# distance of every square to the 4 center squares, by row plus by column (see ai.force_king_to_corner)
+CENTER_DISTANCE = np.maximum(3 - SQUARE_ROWS, SQUARE_ROWS - 4) + np.maximum(3 - SQUARE_COLS, SQUARE_COLS - 4)
+ROWS = np.arange(8)[:, np.newaxis]  # the row of every square of an (8, 8) board
+# the passed pawn bonus of a white and of a black pawn by its row
+WHITE_PASSED_BONUS = np.array(PASSED_PAWN_BONUS[::-1])[:, np.newaxis]
+BLACK_PASSED_BONUS = np.array(PASSED_PAWN_BONUS)[:, np.newaxis]
+
+
+def compute_score_table() -> np.ndarray:
+    """
+    The function computes the (13, 64) table of the material plus piece-square score of every piece code
+    on every square, from white's point of view
+    """
+    table = np.zeros((2 * CODE_OFFSET + 1, 64))
+    for piece, code in PIECE_CODES.items():
+        if piece == "--":
+            continue
+        sign = 1 if piece[0] == "w" else -1
+        table[code + CODE_OFFSET] = sign * PIECE_SCORE[piece[1]]
+        if piece[1] != "K":
+            table[code + CODE_OFFSET] += sign * np.array(PIECE_POSITION_SCORE[piece]).ravel()
+    return table
+
+
+SCORE_TABLE = compute_score_table()
+# CHAR_CODES[color character][piece character] is the code of the 2 character piece string of GameState.board
+CHAR_CODES = np.zeros((128, 128), dtype=np.int8)
+for _piece, _code in PIECE_CODES.items():
+    CHAR_CODES[ord(_piece[0]), ord(_piece[1])] = _code
+
+
+def encode_board(board: list) -> np.ndarray:
+    """
+    The function returns the int8 encoding (64 piece codes) of a GameState board
+    """
+    return encode_piece_strings("".join(["".join(row) for row in board])).reshape(64)
+
+
+def encode_piece_strings(pieces: str) -> np.ndarray:
+    """
+    The function returns the (N, 64) encoding of the 2 character piece strings of N boards joined together,
+    all the characters are looked up in one pass
+    """
+    chars = np.frombuffer(pieces.encode("ascii"), dtype=np.uint8).reshape(-1, 64, 2)
+    return CHAR_CODES[chars[:, :, 0], chars[:, :, 1]]
+
+
+def encode_fen(fen: str) -> np.ndarray:
+    """
+    The function returns the int8 encoding of the piece placement of a FEN string, ValueError if the
+    placement doesn't have 64 squares
+    """
+    codes = []
+    for char in fen.split()[0]:
+        if char.isdigit():
+            codes.extend([0] * int(char))
+        elif char != "/":
+            codes.append(FEN_PIECE_CODES[char])
+    if len(codes) != 64:
+        raise ValueError(f"the piece placement has {len(codes)} squares instead of 64")
+    return np.array(codes, dtype=np.int8)
+
+
+def encode_game_states(game_states: list) -> tuple:
+    """
+    The function returns the (N, 64) boards and the (N,) move counts of the game states
+    """
+    boards = encode_piece_strings("".join(["".join(row) for gs in game_states for row in gs.board]))
+    move_counts = np.array([len(gs.moveLog) for gs in game_states])
+    return boards, move_counts
+
+
+def evaluate_boards(boards: np.ndarray, move_counts=0) -> np.ndarray:
+    """
+    The function returns the scores (positive is good for white) of the (N, 64) boards, move_counts is
+    the number of moves played in every position (a scalar or an (N,) array) like len(gs.moveLog) in
+    ai.score_board. Every board must have both kings. Checkmates and stalemates aren't detected, they
+    need the moves of the position.
+    """
+    boards = np.asarray(boards, dtype=np.int8).reshape(-1, 64)
+    # material and piece-square scores: one lookup of (piece, square) per square
+    scores = SCORE_TABLE[boards + CODE_OFFSET, SQUARE_INDICES].sum(axis=1) + evaluate_pawn_structures(boards)
+    # force_king_to_corner: the black king away from the center and the kings close to each other
+    white_king = np.argmax(boards == WHITE_KING, axis=1)
+    black_king = np.argmax(boards == BLACK_KING, axis=1)
+    king_distance = np.abs(SQUARE_ROWS[white_king] - SQUARE_ROWS[black_king]) + \
+        np.abs(SQUARE_COLS[white_king] - SQUARE_COLS[black_king])
+    king_term = CENTER_DISTANCE[black_king] + 14 - king_distance
+    return scores + king_term * (np.asarray(move_counts) / 90)
+
+
+def evaluate_pawn_structures(boards: np.ndarray) -> np.ndarray:
+    """
+    The function returns the pawn structure scores (see evaluation.evaluate_pawn_structure) of the
+    (N, 64) boards
+    """
+    boards = boards.reshape(-1, 8, 8)
+    white, black = boards == WHITE_PAWN, boards == BLACK_PAWN
+    white_count, black_count = white.sum(axis=1), black.sum(axis=1)  # (N, 8) pawns of every file
+    doubled = np.maximum(white_count - 1, 0).sum(axis=1) - np.maximum(black_count - 1, 0).sum(axis=1)
+    isolated = (white_count * (beside_files(white_count, np.add) == 0)).sum(axis=1) - \
+        (black_count * (beside_files(black_count, np.add) == 0)).sum(axis=1)
+    # a white pawn is passed if the most advanced black pawn of its file and the files beside it isn't in
+    # front of it (the front row of a file without black pawns is 8), the same for black the other way
+    black_front = np.where(black, ROWS, 8).min(axis=1)
+    black_front = np.minimum(black_front, beside_files(black_front, np.minimum, 8))
+    white_front = np.where(white, ROWS, -1).max(axis=1)
+    white_front = np.maximum(white_front, beside_files(white_front, np.maximum, -1))
+    white_passed = white & (black_front[:, np.newaxis, :] >= ROWS)
+    black_passed = black & (white_front[:, np.newaxis, :] <= ROWS)
+    passed = (white_passed * WHITE_PASSED_BONUS).sum(axis=(1, 2)) - (black_passed * BLACK_PASSED_BONUS).sum(axis=(1, 2))
+    return passed - ISOLATED_PAWN_PENALTY * isolated - DOUBLED_PAWN_PENALTY * doubled
+
+
+def beside_files(values: np.ndarray, combine, empty=0) -> np.ndarray:
+    """
+    The function combines the (N, 8) values of the 2 files beside every file, empty stands for the missing
+    file beside the a and h files
+    """
+    padded = np.pad(values, ((0, 0), (1, 1)), constant_values=empty)
+    return combine(padded[:, :-2], padded[:, 2:])
+
+
+def evaluate_game_states(game_states: list) -> np.ndarray:
+    """
+    The function returns the scores of the game states (positive is good for white) in one batch
+    """
+    boards, move_counts = encode_game_states(game_states)
+    return evaluate_boards(boards, move_counts)
+
+
+def evaluate_moves(gs, moves: list) -> np.ndarray:
+    """
+    The function returns the scores (positive is good for white) of the positions after each of the (packed)
+    moves of the game state, without making the moves: the board is encoded once and every move is applied to
+    its own copy with array indexing
+    """
+    count = len(moves)
+    boards = np.repeat(encode_board(gs.board)[np.newaxis], count, axis=0)
+    positions = np.arange(count)
+    packed = np.array(moves, dtype=np.int64)
+    start = packed & SQUARE_MASK
+    end = packed >> END_SQUARE_SHIFT & SQUARE_MASK
+    moves = [Move(move) for move in moves]
+    end_codes = np.array([PIECE_CODES[move.piece_moved[0] + move.promotion_piece if move.is_pawn_promotion
+                                      else move.piece_moved] for move in moves], dtype=np.int8)
+    boards[positions, start] = 0
+    boards[positions, end] = end_codes
+    # the pawn taken en passant is beside the end square, the castling rook jumps over the king
+    for i, move in enumerate(moves):
+        if move.is_enpassant_move:
+            boards[i, move.start_row * 8 + move.end_col] = 0
+        elif move.is_castle_move:
+            if move.end_col - move.start_col == 2:  # king-side castle move
+                rook_start, rook_end = end[i] + 1, end[i] - 1
+            else:  # queen-side castle move
+                rook_start, rook_end = end[i] - 2, end[i] + 1
+            boards[i, rook_end] = boards[i, rook_start]
+            boards[i, rook_start] = 0
+    return evaluate_boards(boards, len(gs.moveLog) + 1)
+
+
+def evaluate_file(lines, batch_size: int = BATCH_SIZE):
+    """
+    Generator of the results of the positions (an iterable of EPD or FEN lines) as dicts of the index, fen
+    and score, or of the index and error of a line that isn't a valid position. The positions are scored in
+    batches of batch_size. Empty lines and comments (#) are skipped, the index of a position is its line number.
+    """
+    batch = []
+    for index, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        try:
+            fen, _ = parse_epd(line)
+            board = encode_fen(fen)
+        except (ValueError, KeyError, IndexError) as error:
+            yield {"index": index, "fen": line, "error": f"invalid position: {error}"}
+            continue
+        batch.append((index, fen, board))
+        if len(batch) == batch_size:
+            yield from score_batch(batch)
+            batch = []
+    if batch:
+        yield from score_batch(batch)
+
+
+def score_batch(batch: list):
+    scores = evaluate_boards(np.stack([board for _, _, board in batch]))
+    for (index, fen, _), score in zip(batch, scores):
+        yield {"index": index, "fen": fen, "score": round(float(score), 4)}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Score a file of EPD or FEN positions in NumPy batches")
+    parser.add_argument("input", help="the position file, - for stdin")
+    parser.add_argument("--output", "-o", help="the JSON lines output file (default stdout)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    input_file = sys.stdin if args.input == "-" else open(args.input)
+    output_file = sys.stdout if args.output is None else open(args.output, "w")
+    errors = 0
+    try:
+        for result in evaluate_file(input_file, args.batch_size):
+            output_file.write(json.dumps(result) + "\n")
+            errors += "error" in result
+    finally:
+        if input_file is not sys.stdin:
+            input_file.close()
+        if output_file is not sys.stdout:
+            output_file.close()
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,312 @@
+"""
+Benchmarks of the engine, the results are printed as JSON so they can be compared across commits.
+    python benchmark.py smp --depth 4 --workers 1 2 4 8
+    python benchmark.py imports
+    python benchmark.py search --depth 4 --profile search.prof
+    python benchmark.py pruning --depth 5 --movetime 5
+    python benchmark.py allocations --plies 4000 --depth 5
+    python benchmark.py evaluation --positions 20000
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from game_state import GameState
+from move import Move
+from parallel_search import ParallelSearch
+import ai
+
+BENCHMARK_POSITIONS = [
+    ("start", "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"),
+    ("italian", "r1bqk1nr/pppp1ppp/2n5/2b1p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4"),
+    ("middlegame", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10"),
+    ("endgame", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1"),
+]
+
+
+def benchmark_smp(depth: int, worker_counts: list) -> dict:
+    """
+    The function measures the time to reach the given depth with every number of search processes
+    """
+    results = []
+    for num_workers in worker_counts:
+        search = ParallelSearch(num_workers)
+        seconds = nodes = 0
+        for name, fen in BENCHMARK_POSITIONS:
+            _, info = search.search(GameState.from_fen(fen), time_limit=None, max_depth=depth)
+            seconds += info["seconds"]
+            nodes += info["nodes"]
+        search.close()
+        results.append({"workers": num_workers, "seconds": round(seconds, 3), "nodes": nodes,
+                        "nps": round(nodes / seconds)})
+    for result in results:
+        result["speedup"] = round(results[0]["seconds"] / result["seconds"], 2)
+    return {"benchmark": "smp", "depth": depth, "cpu_count": os.cpu_count(), "results": results}
+
+
+def benchmark_search(depth: int, profile_path: str = None) -> dict:
+    """
+    The function searches every position to the depth with the phase timers on, and returns the search
+    statistics of every position. With profile_path the searches are profiled and dumped to the file.
+    """
+    ai.VERBOSE = False
+    results = []
+    for name, fen in BENCHMARK_POSITIONS:
+        ai.transposition_table.clear()
+        ai.pawn_hash_table.clear()  # the hit rate of every position starts from an empty table
+        ai.move_ordering.clear()
+        gs = GameState.from_fen(fen)
+        ai.find_best_move(gs, gs.get_valid_moves(), time_limit=None, max_depth=depth, time_phases=True,
+                          profile_path=f"{profile_path}.{name}" if profile_path is not None else None)
+        stats = ai.search_stats.as_dict()
+        del stats["iterations"]
+        results.append({"position": name, **stats})
+    return {"benchmark": "search", "depth": depth, "results": results}
+
+
+# the switches of the selective search (ai.py), compared one at a time against no pruning and all of them
+PRUNING_SWITCHES = ("NULL_MOVE_PRUNING", "LATE_MOVE_REDUCTIONS", "FUTILITY_PRUNING", "REVERSE_FUTILITY_PRUNING")
+
+
+def benchmark_pruning(depth: int, movetime: float) -> dict:
+    """
+    The function searches every position with no selective search, with each technique alone and with all
+    of them: to the fixed depth (nodes, time, best move and score) and for movetime seconds (depth reached)
+    """
+    ai.VERBOSE = False
+    configurations = [("none", ())] + [(switch.lower(), (switch,)) for switch in PRUNING_SWITCHES] + \
+        [("all", PRUNING_SWITCHES)]
+    saved = {switch: getattr(ai, switch) for switch in PRUNING_SWITCHES}
+    results = []
+    try:
+        for name, switches in configurations:
+            for switch in PRUNING_SWITCHES:
+                setattr(ai, switch, switch in switches)
+            positions = []
+            for position, fen in BENCHMARK_POSITIONS:
+                position_result = {"position": position}
+                for limits, prefix in (({"time_limit": None, "max_depth": depth}, "fixed_depth"),
+                                       ({"time_limit": movetime}, "fixed_time")):
+                    if prefix == "fixed_time" and not movetime:
+                        continue
+                    ai.transposition_table.clear()
+                    ai.move_ordering.clear()
+                    gs = GameState.from_fen(fen)
+                    best_move = ai.find_best_move(gs, gs.get_valid_moves(), **limits)
+                    stats = ai.search_stats
+                    position_result[prefix] = {"depth": stats.depth, "nodes": stats.nodes + stats.qnodes,
+                                               "seconds": round(stats.seconds, 3),
+                                               "bestmove": Move(best_move).get_uci_notation(), "score": round(ai.best_score, 2)}
+                positions.append(position_result)
+            results.append({"configuration": name, "nodes": sum(p["fixed_depth"]["nodes"] for p in positions),
+                            "seconds": round(sum(p["fixed_depth"]["seconds"] for p in positions), 3),
+                            "positions": positions})
+    finally:
+        for switch, value in saved.items():
+            setattr(ai, switch, value)
+    for result in results:
+        result["node_ratio"] = round(result["nodes"] / results[0]["nodes"], 3)
+    return {"benchmark": "pruning", "depth": depth, "movetime": movetime, "results": results}
+
+
+def random_positions(count: int, seed: int = 0) -> list:
+    """
+    The function returns count game states reached by random games from the start position
+    """
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        gs = GameState()
+        for _ in range(rng.randrange(10, 80)):
+            valid_moves = gs.get_valid_moves()
+            if not valid_moves:
+                break
+            gs.make_move(rng.choice(valid_moves))
+        gs.checkmate = gs.stalemate = False  # the batch evaluation doesn't detect the end of the game
+        positions.append(gs)
+    return positions
+
+
+def benchmark_evaluation(count: int, batch_size: int) -> dict:
+    """
+    The function compares the positions per second of the scalar evaluation (the full board scans of
+    compute_evaluation and evaluate_pawn_structure plus the king term, and ai.score_board with its
+    incremental score and pawn hash table) against the NumPy batch evaluation of batch_evaluation.py, with
+    and without encoding the boards
+    """
+    import numpy as np
+    from batch_evaluation import encode_game_states, evaluate_boards
+    from evaluation import compute_evaluation, evaluate_pawn_structure
+
+    positions = random_positions(count)
+    start_time = time.perf_counter()
+    scalar = [sum(compute_evaluation(gs.board)) + evaluate_pawn_structure(gs.board)[0] +
+              ai.force_king_to_corner(gs.white_king_loc, gs.black_king_loc, len(gs.moveLog)) for gs in positions]
+    scalar_seconds = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    for gs in positions:
+        ai.score_board(gs)
+    incremental_seconds = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    boards, move_counts = encode_game_states(positions)
+    encoding_seconds = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    batch = np.concatenate([evaluate_boards(boards[i:i + batch_size], move_counts[i:i + batch_size])
+                            for i in range(0, count, batch_size)])
+    batch_seconds = time.perf_counter() - start_time
+    return {"benchmark": "evaluation", "positions": count, "batch_size": batch_size,
+            "max_difference": float(np.abs(np.array(scalar) - batch).max()),
+            "scalar_positions_per_second": round(count / scalar_seconds),
+            "score_board_positions_per_second": round(count / incremental_seconds),
+            "batch_positions_per_second": round(count / batch_seconds),
+            "batch_with_encoding_positions_per_second": round(count / (encoding_seconds + batch_seconds))}
+
+
+# the knights go out and back, repeated it is a game of any length
+ALLOCATION_LINE = ("g1f3", "g8f6", "f3g1", "f6g8")
+
+
+def benchmark_allocations(plies: int, depth: int) -> dict:
+    """
+    The function measures the memory the game state allocates per move with tracemalloc: the blocks still
+    held after making the moves of a game of the given plies (the undo information) and the peak of making
+    and undoing a move. It also times a make and undo of a move without tracing, and measures the memory
+    per node of a search of the middlegame position to the depth (see search_allocations).
+    """
+    gs = GameState()
+    line = []
+    for uci in ALLOCATION_LINE:
+        move = next(move for move in gs.get_valid_moves() if Move(move).get_uci_notation() == uci)
+        line.append(move)
+        gs.make_move(move)
+    for _ in line:
+        gs.undo_move()
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for ply in range(plies):
+        gs.make_move(line[ply % len(line)])
+    after = tracemalloc.take_snapshot()
+    held = after.compare_to(before, "filename")
+    held_bytes = sum(stat.size_diff for stat in held)
+    held_blocks = sum(stat.count_diff for stat in held)
+    for _ in range(plies):
+        gs.undo_move()
+    tracemalloc.reset_peak()
+    start_bytes = tracemalloc.get_traced_memory()[0]
+    gs.make_move(line[0])
+    gs.undo_move()
+    make_undo_peak = tracemalloc.get_traced_memory()[1] - start_bytes
+    tracemalloc.stop()
+
+    start_time = time.perf_counter()
+    for ply in range(plies):
+        gs.make_move(line[ply % len(line)])
+    for _ in range(plies):
+        gs.undo_move()
+    seconds = time.perf_counter() - start_time
+    return {"benchmark": "allocations", "plies": plies, "held_bytes_per_move": round(held_bytes / plies, 1),
+            "held_blocks_per_move": round(held_blocks / plies, 2), "make_undo_peak_bytes": make_undo_peak,
+            "make_undo_microseconds": round(1e6 * seconds / plies, 2), **search_allocations(depth)}
+
+
+def search_allocations(depth: int) -> dict:
+    """
+    The function traces a search of the middlegame benchmark position to the depth and returns the peak of
+    the memory allocated during the search and the memory still held after it, per searched node (nodes
+    plus quiescence nodes). The tables of the search are allocated before the trace starts.
+    """
+    ai.VERBOSE = False
+    ai.transposition_table.clear()
+    ai.pawn_hash_table.clear()
+    ai.move_ordering.clear()
+    gs = GameState.from_fen(dict(BENCHMARK_POSITIONS)["middlegame"])
+    valid_moves = gs.get_valid_moves()
+    tracemalloc.start()
+    start_bytes = tracemalloc.get_traced_memory()[0]
+    ai.find_best_move(gs, valid_moves, time_limit=None, max_depth=depth)
+    held_bytes, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    nodes = ai.search_stats.nodes + ai.search_stats.qnodes
+    return {"search_depth": depth, "search_nodes": nodes,
+            "search_peak_bytes_per_node": round((peak_bytes - start_bytes) / nodes, 1),
+            "search_held_bytes_per_node": round((held_bytes - start_bytes) / nodes, 1)}
+
+
+ENGINE_MODULES = ["game_state", "move", "castle_right", "ai"]
+
+
+def time_python(code: str, runs: int) -> float:
+    """
+    The function returns the median wall time of running the code in a new python process
+    """
+    times = []
+    for _ in range(runs):
+        start_time = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], check=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+                       stdout=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start_time)
+    return statistics.median(times)
+
+
+def benchmark_imports(runs: int) -> dict:
+    """
+    The function measures the startup cost of the engine modules (what every search process pays)
+    """
+    interpreter = time_python("pass", runs)
+    engine = time_python(f"import {', '.join(ENGINE_MODULES)}", runs)
+    pygame_loaded = subprocess.run(
+        [sys.executable, "-c", f"import sys, {', '.join(ENGINE_MODULES)}; print('pygame' in sys.modules)"],
+        check=True, cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True).stdout.strip()
+    return {"benchmark": "imports", "runs": runs, "interpreter_seconds": round(interpreter, 4),
+            "engine_seconds": round(engine, 4), "engine_import_seconds": round(engine - interpreter, 4),
+            "pygame_loaded": pygame_loaded == "True"}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Engine benchmarks")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+    smp = subparsers.add_parser("smp", help="parallel search speedup by number of processes")
+    smp.add_argument("--depth", type=int, default=4)
+    smp.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count()])
+    search = subparsers.add_parser("search", help="search statistics and phase timings of the benchmark positions")
+    search.add_argument("--depth", type=int, default=4)
+    search.add_argument("--profile", help="dump a cProfile profile of every position to PROFILE.<position>")
+    pruning = subparsers.add_parser("pruning", help="selective search techniques compared at a fixed depth and time")
+    pruning.add_argument("--depth", type=int, default=5)
+    pruning.add_argument("--movetime", type=float, default=5.0, help="seconds per position, 0 to skip")
+    allocations = subparsers.add_parser("allocations", help="memory allocated per move and per search node")
+    allocations.add_argument("--plies", type=int, default=4000)
+    allocations.add_argument("--depth", type=int, default=5, help="depth of the traced search")
+    evaluation = subparsers.add_parser("evaluation", help="scalar against NumPy batch evaluation")
+    evaluation.add_argument("--positions", type=int, default=20000)
+    evaluation.add_argument("--batch-size", type=int, default=4096)
+    imports = subparsers.add_parser("imports", help="startup time of the engine modules")
+    imports.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.benchmark == "smp":
+        result = benchmark_smp(args.depth, sorted(set(args.workers)))
+    elif args.benchmark == "search":
+        result = benchmark_search(args.depth, args.profile)
+    elif args.benchmark == "pruning":
+        result = benchmark_pruning(args.depth, args.movetime)
+    elif args.benchmark == "allocations":
+        result = benchmark_allocations(args.plies, args.depth)
+    elif args.benchmark == "evaluation":
+        result = benchmark_evaluation(args.positions, args.batch_size)
+    elif args.benchmark == "imports":
+        result = benchmark_imports(args.runs)
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,371 @@
+"""
+Bitboard backend of the GameState.
+Every piece type of every color is kept as a 64-bit integer where bit (row * 8 + col) is set if the piece
+is on the square (row, col). The 8x8 board of the GameState is still updated so the GUI and the
+evaluation work unchanged, the bitboards are used to generate the legal moves.
+Sliding pieces use hyperbola quintessence for files and diagonals and a lookup table for ranks.
+"""
+
+from move import PIECES, PIECE_BITS, CAPTURED_BITS, PROMOTION_PIECES, SQUARE_MASK, END_SQUARE_SHIFT, \
+    PROMOTION_SHIFT, PIECE_SHIFT, CAPTURED_SHIFT, PIECE_MASK, CAPTURED_MASK, ENPASSANT_FLAG, CASTLE_FLAG
+from game_state import GameState
+from castle_right import WHITE_KING_SIDE, WHITE_QUEEN_SIDE, BLACK_KING_SIDE, BLACK_QUEEN_SIDE
+
+FULL = 0xFFFFFFFFFFFFFFFF
+
+
+def square_bit(row: int, col: int) -> int:
+    return 1 << (row * 8 + col)
+
+
+def byte_swap(bb: int) -> int:
+    """
+    The function mirrors the bitboard vertically (row 0 <-> row 7)
+    """
+    return int.from_bytes(bb.to_bytes(8, "little"), "big")
+
+
+def step_attacks(steps: tuple) -> list:
+    """
+    The function computes for every square the squares reached by a single step in each of the given directions
+    """
+    attacks = []
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        bb = 0
+        for d_row, d_col in steps:
+            end_row, end_col = row + d_row, col + d_col
+            if 0 <= end_row < 8 and 0 <= end_col < 8:
+                bb |= square_bit(end_row, end_col)
+        attacks.append(bb)
+    return attacks
+
+
+def line_mask(sq: int, d_row: int, d_col: int) -> int:
+    """
+    The function returns the full line through the square in the given direction, without the square itself
+    """
+    row, col = divmod(sq, 8)
+    bb = 0
+    for sign in (1, -1):
+        end_row, end_col = row + sign * d_row, col + sign * d_col
+        while 0 <= end_row < 8 and 0 <= end_col < 8:
+            bb |= square_bit(end_row, end_col)
+            end_row, end_col = end_row + sign * d_row, end_col + sign * d_col
+    return bb
+
+
+KNIGHT_ATTACKS = step_attacks(((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)))
+KING_ATTACKS = step_attacks(((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)))
+# white pawns move up the board (to row 0), black pawns move down
+PAWN_ATTACKS = {"w": step_attacks(((-1, -1), (-1, 1))), "b": step_attacks(((1, -1), (1, 1)))}
+
+SQUARE_BITS = [1 << sq for sq in range(64)]
+FILE_MASKS = [line_mask(sq, 1, 0) for sq in range(64)]
+DIAGONAL_MASKS = [line_mask(sq, 1, 1) for sq in range(64)]
+ANTI_DIAGONAL_MASKS = [line_mask(sq, 1, -1) for sq in range(64)]
+
+
+def compute_rank_attacks() -> list:
+    """
+    RANK_ATTACKS[col][occupancy] are the attacks of a rook on the column col of a single rank
+    """
+    table = []
+    for col in range(8):
+        row_attacks = []
+        for occupancy in range(256):
+            bb = 0
+            for step in (1, -1):
+                end_col = col + step
+                while 0 <= end_col < 8:
+                    bb |= 1 << end_col
+                    if occupancy & (1 << end_col):
+                        break
+                    end_col += step
+            row_attacks.append(bb)
+        table.append(row_attacks)
+    return table
+
+
+RANK_ATTACKS = compute_rank_attacks()
+
+
+def line_attacks(sq: int, occupied: int, mask: int) -> int:
+    """
+    Hyperbola quintessence: the attacks of a slider on the square along a line with one square per row
+    """
+    piece = SQUARE_BITS[sq]
+    forward = occupied & mask
+    reverse = byte_swap(forward)
+    forward = (forward - 2 * piece) & FULL
+    reverse = (reverse - 2 * byte_swap(piece)) & FULL
+    return (forward ^ byte_swap(reverse)) & mask
+
+
+def rank_attacks(sq: int, occupied: int) -> int:
+    shift = sq & 56
+    return RANK_ATTACKS[sq & 7][(occupied >> shift) & 0xFF] << shift
+
+
+def rook_attacks(sq: int, occupied: int) -> int:
+    return line_attacks(sq, occupied, FILE_MASKS[sq]) | rank_attacks(sq, occupied)
+
+
+def bishop_attacks(sq: int, occupied: int) -> int:
+    return line_attacks(sq, occupied, DIAGONAL_MASKS[sq]) | line_attacks(sq, occupied, ANTI_DIAGONAL_MASKS[sq])
+
+
+def compute_between_and_lines() -> tuple:
+    """
+    BETWEEN[a][b] are the squares strictly between two aligned squares,
+    LINE[a][b] is the whole line through them (0 if they are not aligned)
+    """
+    between = [[0] * 64 for _ in range(64)]
+    lines = [[0] * 64 for _ in range(64)]
+    for a in range(64):
+        row, col = divmod(a, 8)
+        for d_row, d_col in ((-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1)):
+            bb = 0
+            end_row, end_col = row + d_row, col + d_col
+            while 0 <= end_row < 8 and 0 <= end_col < 8:
+                b = end_row * 8 + end_col
+                between[a][b] = bb
+                lines[a][b] = line_mask(a, d_row, d_col) | SQUARE_BITS[a]
+                bb |= SQUARE_BITS[b]
+                end_row, end_col = end_row + d_row, end_col + d_col
+    return between, lines
+
+
+BETWEEN, LINE = compute_between_and_lines()
+
+
+def squares(bb: int):
+    """
+    The function yields the squares of all the set bits of the bitboard
+    """
+    while bb:
+        lsb = bb & -bb
+        yield lsb.bit_length() - 1
+        bb ^= lsb
+
+
+class BitboardGameState(GameState):
+    def __init__(self):
+        super().__init__()
+        self.bitboards = {}
+        self.load_bitboards()
+
+    @classmethod
+    def from_fen(cls, fen: str) -> "BitboardGameState":
+        gs = super().from_fen(fen)
+        gs.load_bitboards()
+        return gs
+
+    def load_bitboards(self) -> None:
+        """
+        The function computes the bitboards from the 8x8 board
+        """
+        self.bitboards = {color + piece: 0 for color in "wb" for piece in "pRNBQK"}
+        for row in range(8):
+            for col in range(8):
+                piece = self.board[row][col]
+                if piece != "--":
+                    self.bitboards[piece] |= square_bit(row, col)
+
+    def toggle_move(self, move: int) -> None:
+        """
+        The function applies the packed move to the bitboards, applying the same move again takes it back
+        """
+        bitboards = self.bitboards
+        start_sq, end_sq = move & SQUARE_MASK, move >> END_SQUARE_SHIFT & SQUARE_MASK
+        start, end = SQUARE_BITS[start_sq], SQUARE_BITS[end_sq]
+        piece_moved = PIECES[move >> PIECE_SHIFT & PIECE_MASK]
+        bitboards[piece_moved] ^= start
+        promotion = move >> PROMOTION_SHIFT & 0x7
+        if promotion:
+            bitboards[piece_moved[0] + PROMOTION_PIECES[promotion - 1]] ^= end
+        else:
+            bitboards[piece_moved] ^= end
+        if move & ENPASSANT_FLAG:
+            # the captured pawn is on the row of the start square and the column of the end square
+            bitboards[PIECES[move >> CAPTURED_SHIFT & PIECE_MASK]] ^= SQUARE_BITS[start_sq & 56 | end_sq & 7]
+        elif move & CAPTURED_MASK:
+            bitboards[PIECES[move >> CAPTURED_SHIFT & PIECE_MASK]] ^= end
+        if move & CASTLE_FLAG:
+            rook = piece_moved[0] + "R"
+            if end_sq - start_sq == 2:  # king-side castle move
+                bitboards[rook] ^= end << 1 | end >> 1
+            else:  # queen-side castle move
+                bitboards[rook] ^= end >> 2 | end << 1
+
+    def make_move(self, move: int) -> None:
+        super().make_move(move)
+        self.toggle_move(move)
+
+    def undo_move(self) -> None:
+        if len(self.moveLog) != 0:
+            move = self.moveLog[-1]
+            super().undo_move()
+            self.toggle_move(move)
+
+    def color_occupancy(self, color: str) -> int:
+        bitboards = self.bitboards
+        return bitboards[color + "p"] | bitboards[color + "R"] | bitboards[color + "N"] | \
+            bitboards[color + "B"] | bitboards[color + "Q"] | bitboards[color + "K"]
+
+    def attackers(self, sq: int, color: str, occupied: int) -> int:
+        """
+        The function returns the pieces of the given color that attack the square
+        """
+        bitboards = self.bitboards
+        enemy = "b" if color == "w" else "w"
+        queens = bitboards[color + "Q"]
+        return (KNIGHT_ATTACKS[sq] & bitboards[color + "N"]) | (KING_ATTACKS[sq] & bitboards[color + "K"]) | \
+            (PAWN_ATTACKS[enemy][sq] & bitboards[color + "p"]) | \
+            (rook_attacks(sq, occupied) & (bitboards[color + "R"] | queens)) | \
+            (bishop_attacks(sq, occupied) & (bitboards[color + "B"] | queens))
+
+    def square_under_attack(self, row: int, col: int) -> bool:
+        """
+        The function determines if the enemy player can attack the square (row, col)
+        """
+        enemy_color = "b" if self.whiteToMove else "w"
+        occupied = self.color_occupancy("w") | self.color_occupancy("b")
+        return self.attackers(row * 8 + col, enemy_color, occupied) != 0
+
+    def get_valid_moves(self) -> list:
+        """
+        All moves considering checks, generated directly from check and pin masks
+        """
+        bitboards = self.bitboards
+        board = self.board
+        ally_color, enemy_color = ("w", "b") if self.whiteToMove else ("b", "w")
+        own = self.color_occupancy(ally_color)
+        enemies = self.color_occupancy(enemy_color)
+        occupied = own | enemies
+        king_bb = bitboards[ally_color + "K"]
+        king_sq = king_bb.bit_length() - 1
+        king_row, king_col = divmod(king_sq, 8)
+        moves = []
+
+        checkers = self.attackers(king_sq, enemy_color, occupied)
+        self.inCheck = checkers != 0
+
+        # king moves, the king itself mustn't block the attacks on the squares it moves to
+        occupied_without_king = occupied ^ king_bb
+        king_move = king_sq | PIECE_BITS[ally_color + "K"]
+        for sq in squares(KING_ATTACKS[king_sq] & ~own):
+            if not self.attackers(sq, enemy_color, occupied_without_king):
+                moves.append(king_move | sq << END_SQUARE_SHIFT | CAPTURED_BITS[board[sq >> 3][sq & 7]])
+
+        if checkers & (checkers - 1) == 0:  # not in double check
+            if checkers:
+                # capture the checking piece or block the check
+                checker_sq = checkers.bit_length() - 1
+                target_mask = checkers | BETWEEN[king_sq][checker_sq]
+            else:
+                target_mask = FULL
+
+            # pinned pieces can only move along the line of the pin
+            pin_lines = {}
+            enemy_queens = bitboards[enemy_color + "Q"]
+            snipers = (rook_attacks(king_sq, enemies) & (bitboards[enemy_color + "R"] | enemy_queens)) | \
+                (bishop_attacks(king_sq, enemies) & (bitboards[enemy_color + "B"] | enemy_queens))
+            for sniper_sq in squares(snipers):
+                blockers = BETWEEN[king_sq][sniper_sq] & occupied
+                if blockers and blockers & (blockers - 1) == 0 and blockers & own:
+                    pin_lines[blockers.bit_length() - 1] = LINE[king_sq][sniper_sq]
+
+            not_own = ~own
+            for piece, attacks in (("N", None), ("B", bishop_attacks), ("R", rook_attacks), ("Q", None)):
+                piece_bits = PIECE_BITS[ally_color + piece]
+                for sq in squares(bitboards[ally_color + piece]):
+                    if piece == "N":
+                        if sq in pin_lines:
+                            continue
+                        targets = KNIGHT_ATTACKS[sq]
+                    elif piece == "Q":
+                        targets = rook_attacks(sq, occupied) | bishop_attacks(sq, occupied)
+                    else:
+                        targets = attacks(sq, occupied)
+                    targets &= not_own & target_mask
+                    if sq in pin_lines:
+                        targets &= pin_lines[sq]
+                    start = sq | piece_bits
+                    for end_sq in squares(targets):
+                        moves.append(start | end_sq << END_SQUARE_SHIFT | CAPTURED_BITS[board[end_sq >> 3][end_sq & 7]])
+
+            self.get_bitboard_pawn_moves(ally_color, enemy_color, king_sq, occupied, enemies,
+                                         target_mask, pin_lines, checkers, moves)
+
+            if not checkers:
+                self.get_bitboard_castle_moves(ally_color, enemy_color, king_row, king_col, occupied, moves)
+
+        if len(moves) == 0:  # either a checkmate or stalemate
+            if self.inCheck:
+                self.checkmate = True
+            else:
+                self.stalemate = True
+        return moves
+
+    def get_bitboard_pawn_moves(self, ally_color: str, enemy_color: str, king_sq: int, occupied: int,
+                                enemies: int, target_mask: int, pin_lines: dict, checkers: int,
+                                moves: list) -> None:
+        """
+        Get all the legal pawn moves (pushes, captures and en-passant) and add them to the list of moves
+        """
+        board = self.board
+        pawns = self.bitboards[ally_color + "p"]
+        pawn_bits = PIECE_BITS[ally_color + "p"]
+        if ally_color == "w":
+            move_amount, start_row = -1, 6
+        else:
+            move_amount, start_row = 1, 1
+        pawn_attacks = PAWN_ATTACKS[ally_color]
+        if self.enpassant_possible != ():
+            enpassant_sq = self.enpassant_possible[0] * 8 + self.enpassant_possible[1]
+        else:
+            enpassant_sq = -1
+
+        for sq in squares(pawns):
+            row, col = divmod(sq, 8)
+            start = sq | pawn_bits
+            line = pin_lines.get(sq, FULL)
+            one_step = sq + 8 * move_amount
+            if not occupied & SQUARE_BITS[one_step]:
+                if SQUARE_BITS[one_step] & target_mask & line:
+                    self.add_pawn_move(start | one_step << END_SQUARE_SHIFT, row + move_amount, moves)
+                if row == start_row:
+                    two_step = one_step + 8 * move_amount
+                    if not occupied & SQUARE_BITS[two_step] and SQUARE_BITS[two_step] & target_mask & line:
+                        moves.append(start | two_step << END_SQUARE_SHIFT)
+            for end_sq in squares(pawn_attacks[sq] & enemies & target_mask & line):
+                self.add_pawn_move(start | end_sq << END_SQUARE_SHIFT | CAPTURED_BITS[board[end_sq >> 3][end_sq & 7]],
+                                   end_sq >> 3, moves)
+            if enpassant_sq >= 0 and pawn_attacks[sq] & SQUARE_BITS[enpassant_sq]:
+                # the captured pawn leaves the board too, check the king is safe after the capture
+                captured_sq = row * 8 + enpassant_sq % 8
+                occupied_after = occupied ^ SQUARE_BITS[sq] ^ SQUARE_BITS[captured_sq] | SQUARE_BITS[enpassant_sq]
+                attackers = self.attackers(king_sq, enemy_color, occupied_after) & ~SQUARE_BITS[captured_sq]
+                if not attackers:
+                    moves.append(start | enpassant_sq << END_SQUARE_SHIFT | ENPASSANT_FLAG |
+                                 CAPTURED_BITS[enemy_color + "p"])
+
+    def get_bitboard_castle_moves(self, ally_color: str, enemy_color: str, row: int, col: int,
+                                  occupied: int, moves: list) -> None:
+        """
+        Get the castle moves of the king at (row, col), the king is known not to be in check
+        """
+        if ally_color == "w":
+            king_side = self.current_castling_rights & WHITE_KING_SIDE
+            queen_side = self.current_castling_rights & WHITE_QUEEN_SIDE
+        else:
+            king_side = self.current_castling_rights & BLACK_KING_SIDE
+            queen_side = self.current_castling_rights & BLACK_QUEEN_SIDE
+        sq = row * 8 + col
+        if king_side and not occupied & (SQUARE_BITS[sq + 1] | SQUARE_BITS[sq + 2]):
+            if not self.attackers(sq + 1, enemy_color, occupied) and not self.attackers(sq + 2, enemy_color, occupied):
+                moves.append(sq | (sq + 2) << END_SQUARE_SHIFT | CASTLE_FLAG | PIECE_BITS[ally_color + "K"])
+        if queen_side and not occupied & (SQUARE_BITS[sq - 1] | SQUARE_BITS[sq - 2] | SQUARE_BITS[sq - 3]):
+            if not self.attackers(sq - 1, enemy_color, occupied) and not self.attackers(sq - 2, enemy_color, occupied):
+                moves.append(sq | (sq - 2) << END_SQUARE_SHIFT | CASTLE_FLAG | PIECE_BITS[ally_color + "K"])
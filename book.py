@@ -0,0 +1,197 @@
+"""
+Opening books in the Polyglot .bin format: a file of 16 byte entries (big endian key, move, weight and
+learn fields) sorted by the key of the position, with one entry per book move of the position.
+The file is memory-mapped and searched with a binary search, so a lookup reads only a few pages of the
+file and all the engine processes share the same pages of the OS cache.
+Build a book from a PGN collection with:
+    python book.py build games.pgn book.bin --max-ply 20
+"""
+
+import argparse
+import mmap
+import os
+import random
+import struct
+import sys
+from game_state import GameState
+from move import Move
+from pgn import read_games, find_san_move
+from zobrist import ENPASSANT_FILE_KEYS
+
+ENTRY = struct.Struct(">QHHI")  # key, move, weight, learn
+# the promotion piece of a Polyglot move: 1 knight, 2 bishop, 3 rook, 4 queen
+POLYGLOT_PROMOTIONS = {"N": 1, "B": 2, "R": 3, "Q": 4}
+MAX_WEIGHT = 0xFFFF
+GAME_RESULT_POINTS = {"1-0": (2, 0), "0-1": (0, 2), "1/2-1/2": (1, 1)}  # (white, black)
+
+
+def polyglot_key(gs: GameState) -> int:
+    """
+    The function returns the Polyglot key of the position. It is the zobrist key of the game state, except
+    that Polyglot only hashes the en-passant file when a pawn of the side to move can capture en passant.
+    """
+    key = gs.zobrist_key
+    if gs.enpassant_possible:
+        row, col = gs.enpassant_possible
+        pawn_row, pawn = (row + 1, "wp") if gs.whiteToMove else (row - 1, "bp")
+        if not any(0 <= pawn_col < 8 and gs.board[pawn_row][pawn_col] == pawn for pawn_col in (col - 1, col + 1)):
+            key ^= ENPASSANT_FILE_KEYS[col]
+    return key
+
+
+def encode_move(packed_move: int) -> int:
+    """
+    The function returns the Polyglot encoding of the packed move (castling is written as the king taking
+    its rook)
+    """
+    move = Move(packed_move)
+    end_col = move.end_col
+    if move.is_castle_move:
+        end_col = 7 if move.end_col == 6 else 0
+    encoded = end_col | (7 - move.end_row) << 3 | move.start_col << 6 | (7 - move.start_row) << 9
+    if move.is_pawn_promotion:
+        encoded |= POLYGLOT_PROMOTIONS[move.promotion_piece] << 12
+    return encoded
+
+
+def decode_move(encoded: int, valid_moves: list):
+    """
+    The function returns the packed move of valid_moves with the Polyglot encoding, or None
+    """
+    end_col, end_row = encoded & 7, 7 - (encoded >> 3 & 7)
+    start_col, start_row = encoded >> 6 & 7, 7 - (encoded >> 9 & 7)
+    promotion = encoded >> 12 & 7
+    for packed_move in valid_moves:
+        move = Move(packed_move)
+        if move.start_row != start_row or move.start_col != start_col or move.end_row != end_row:
+            continue
+        if move.is_castle_move:
+            if end_col == (7 if move.end_col == 6 else 0):
+                return packed_move
+        elif move.end_col == end_col and \
+                (not move.is_pawn_promotion or POLYGLOT_PROMOTIONS[move.promotion_piece] == promotion):
+            return packed_move
+    return None
+
+
+class OpeningBook:
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, "rb")
+        self.size = os.path.getsize(path) // ENTRY.size
+        # an empty file can't be mapped
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+
+    def close(self) -> None:
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
+
+    def entries(self, key: int) -> list:
+        """
+        The function returns the (move, weight) of the entries of the key, found with a binary search
+        """
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if ENTRY.unpack_from(self.data, middle * ENTRY.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        entries = []
+        for index in range(low, self.size):
+            entry_key, encoded, weight, _ = ENTRY.unpack_from(self.data, index * ENTRY.size)
+            if entry_key != key:
+                break
+            entries.append((encoded, weight))
+        return entries
+
+    def get_moves(self, gs: GameState, valid_moves: list = None) -> list:
+        """
+        The function returns the (move, weight) of the book moves of the position, the best first
+        """
+        if valid_moves is None:
+            valid_moves = gs.get_valid_moves()
+        moves = []
+        for encoded, weight in self.entries(polyglot_key(gs)):
+            move = decode_move(encoded, valid_moves)
+            if move is not None:
+                moves.append((move, weight))
+        moves.sort(key=lambda move_weight: move_weight[1], reverse=True)
+        return moves
+
+    def choose_move(self, gs: GameState, valid_moves: list = None, best: bool = False, rng=random):
+        """
+        The function returns a book move of the position, or None if the position isn't in the book.
+        The move is picked at random in proportion to the weights, or the move with the highest weight if best.
+        """
+        moves = [(move, weight) for move, weight in self.get_moves(gs, valid_moves) if weight > 0]
+        if not moves:
+            return None
+        if best:
+            return moves[0][0]
+        return rng.choices([move for move, _ in moves], weights=[weight for _, weight in moves])[0]
+
+
+def build_book(pgn_paths: list, output_path: str, max_ply: int = 20, min_games: int = 1) -> dict:
+    """
+    The function builds a Polyglot book of the first max_ply plies of the games. The weight of a move is
+    2 points for every win and 1 for every draw of the side that played it (games without a result count
+    as draws), moves played in less than min_games games or that never scored are left out.
+    """
+    points = {}  # (key, encoded move) to [points, games]
+    games = skipped = 0
+    for path in pgn_paths:
+        for headers, san_moves in read_games(path):
+            white_points, black_points = GAME_RESULT_POINTS.get(headers.get("Result"), (1, 1))
+            gs = GameState.from_fen(headers["FEN"]) if "FEN" in headers else GameState()
+            for san in san_moves[:max_ply]:
+                move = find_san_move(san, gs.get_valid_moves())
+                if move is None:
+                    skipped += 1
+                    break
+                stats = points.setdefault((polyglot_key(gs), encode_move(move)), [0, 0])
+                stats[0] += white_points if gs.whiteToMove else black_points
+                stats[1] += 1
+                gs.make_move(move)
+            games += 1
+
+    entries = [(key, encoded, score) for (key, encoded), (score, count) in points.items()
+               if count >= min_games and score > 0]
+    # scale the weights down to 16 bits
+    scale = max((score for _, _, score in entries), default=0) / MAX_WEIGHT
+    entries.sort()
+    with open(output_path, "wb") as file:
+        for key, encoded, score in entries:
+            weight = max(1, round(score / scale)) if scale > 1 else score
+            file.write(ENTRY.pack(key, encoded, weight, 0))
+    return {"games": games, "unreadable_games": skipped, "entries": len(entries),
+            "positions": len({key for key, _, _ in entries})}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Polyglot opening books")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="build a book from PGN files")
+    build.add_argument("pgn", nargs="+")
+    build.add_argument("output")
+    build.add_argument("--max-ply", type=int, default=20)
+    build.add_argument("--min-games", type=int, default=1)
+    probe = subparsers.add_parser("probe", help="print the book moves of a position")
+    probe.add_argument("book")
+    probe.add_argument("fen", nargs="?", default=None)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        print(build_book(args.pgn, args.output, args.max_ply, args.min_games))
+    elif args.command == "probe":
+        book = OpeningBook(args.book)
+        gs = GameState.from_fen(args.fen) if args.fen else GameState()
+        for move, weight in book.get_moves(gs):
+            print(Move(move).get_uci_notation(), weight)
+        book.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
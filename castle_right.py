@@ -1,6 +1,39 @@
-class CastleRights:
-    def __init__(self, wks, bks, wqs, bqs):
-        self.wks = wks
-        self.bks = bks
-        self.wqs = wqs
-        self.bqs = bqs
+"""
+Castling rights as a 4-bit integer, one bit per right. A move takes away the rights of the squares it
+starts and ends on: the squares of the kings and of the rooks in their corners.
+"""
+
+WHITE_KING_SIDE = 1
+WHITE_QUEEN_SIDE = 2
+BLACK_KING_SIDE = 4
+BLACK_QUEEN_SIDE = 8
+NO_CASTLING_RIGHTS = 0
+ALL_CASTLING_RIGHTS = WHITE_KING_SIDE | WHITE_QUEEN_SIDE | BLACK_KING_SIDE | BLACK_QUEEN_SIDE
+
+# the letter of every right in a FEN string, in FEN order
+FEN_CASTLING_RIGHTS = (("K", WHITE_KING_SIDE), ("Q", WHITE_QUEEN_SIDE), ("k", BLACK_KING_SIDE),
+                       ("q", BLACK_QUEEN_SIDE))
+# the rights lost when a king or a rook leaves (or a rook is captured on) the square (row, col)
+LOST_CASTLING_RIGHTS = {(7, 4): WHITE_KING_SIDE | WHITE_QUEEN_SIDE, (7, 7): WHITE_KING_SIDE, (7, 0): WHITE_QUEEN_SIDE,
+                        (0, 4): BLACK_KING_SIDE | BLACK_QUEEN_SIDE, (0, 7): BLACK_KING_SIDE, (0, 0): BLACK_QUEEN_SIDE}
+# CASTLING_RIGHTS_MASKS[row][col] is the rights kept by a move that starts or ends on (row, col)
+CASTLING_RIGHTS_MASKS = [[ALL_CASTLING_RIGHTS & ~LOST_CASTLING_RIGHTS.get((row, col), 0) for col in range(8)]
+                         for row in range(8)]
+
+
+def castling_rights_from_fen(field: str) -> int:
+    """
+    The function returns the castling rights of the castling field of a FEN string ("KQkq", "-"...)
+    """
+    rights = NO_CASTLING_RIGHTS
+    for letter, right in FEN_CASTLING_RIGHTS:
+        if letter in field:
+            rights |= right
+    return rights
+
+
+def castling_rights_to_fen(rights: int) -> str:
+    """
+    The function returns the castling field of a FEN string of the castling rights
+    """
+    return "".join(letter for letter, right in FEN_CASTLING_RIGHTS if rights & right) or "-"
@@ -0,0 +1,165 @@
+"""
+A long-lived engine process that searches the AI moves.
+The worker keeps its own GameState, so for every search only the moves played (or taken back) since the
+previous search are sent to it, as move ids. The transposition table of the ai module lives in the worker
+process and stays warm from one move to the next. A running search can be cancelled at any time.
+If a move id sent to the worker isn't a valid move of its position (the GUI and the worker disagree on the
+position), the worker answers the next search with RESYNC and the GUI side replays the whole game to it.
+"""
+
+from multiprocessing import Process, Queue, Value
+from queue import Empty
+from game_state import GameState
+from move import MOVE_ID_MASK, find_move
+from book import OpeningBook
+from tablebase import Tablebases
+import ai
+
+RESYNC = -1  # the move id of the result of a search the worker didn't run because its position is out of sync
+
+
+class CancelFlag:
+    """
+    The stop event of one search: the search is cancelled once the cancelled search id reaches its id
+    """
+
+    def __init__(self, cancelled_id, search_id: int):
+        self.cancelled_id = cancelled_id
+        self.search_id = search_id
+
+    def is_set(self) -> bool:
+        return self.cancelled_id.value >= self.search_id
+
+
+def worker_loop(game_state_class, requests: Queue, results: Queue, cancelled_id, book_path=None,
+                tablebase_dir=None) -> None:
+    """
+    The main loop of the engine process, handles the requests until it gets "quit"
+    """
+    if book_path is not None:
+        ai.opening_book = OpeningBook(book_path)
+    if tablebase_dir is not None:
+        ai.tablebases = Tablebases(tablebase_dir)
+    gs = game_state_class()
+    in_sync = True  # False after a move id that isn't valid in the position, until the next reset
+    while True:
+        request = requests.get()
+        command = request[0]
+        if command == "quit":
+            break
+        elif command == "reset":
+            gs = game_state_class()
+            in_sync = True
+        elif command == "undo":
+            for _ in range(request[1]):
+                gs.undo_move()
+        elif command == "moves" and in_sync:
+            for move_id in request[1]:
+                move = find_move(gs.get_valid_moves(), move_id)
+                if move is None:
+                    in_sync = False
+                    break
+                gs.make_move(move)
+        elif command == "go":
+            _, search_id, time_limit, node_limit = request
+            if not in_sync:
+                results.put((search_id, RESYNC, None))
+                continue
+            stop_event = CancelFlag(cancelled_id, search_id)
+            best_move = None
+            if not stop_event.is_set():
+                best_move = ai.find_best_move(gs, gs.get_valid_moves(), time_limit=time_limit,
+                                              node_limit=node_limit, stop_event=stop_event)
+            results.put((search_id, best_move & MOVE_ID_MASK if best_move is not None else None,
+                         ai.search_stats.as_dict() if best_move is not None else None))
+
+
+class EngineWorker:
+    def __init__(self, game_state_class=GameState, book_path: str = None, tablebase_dir: str = None):
+        self.requests = Queue()
+        self.results = Queue()
+        self.cancelled_id = Value("i", 0)
+        self.search_id = 0
+        self.searching = False
+        self.last_stats = None  # the search statistics (SearchStats.as_dict) of the last search
+        self.synced_moves = []  # move ids of the position the worker has
+        self.search_limits = None  # the (time limit, node limit) of the current search, to run it again
+        self.resynced = False  # the current search was already sent again after a resync
+        self.process = Process(target=worker_loop, args=(game_state_class, self.requests, self.results,
+                                                         self.cancelled_id, book_path, tablebase_dir),
+                               daemon=True)
+        self.process.start()
+
+    def sync(self, gs: GameState) -> None:
+        """
+        The function sends the worker only the moves that changed since the last sync
+        """
+        move_ids = [move & MOVE_ID_MASK for move in gs.moveLog]
+        common = 0
+        while common < len(self.synced_moves) and common < len(move_ids) and \
+                self.synced_moves[common] == move_ids[common]:
+            common += 1
+        if common == 0 and self.synced_moves:
+            self.requests.put(("reset",))
+        elif common < len(self.synced_moves):
+            self.requests.put(("undo", len(self.synced_moves) - common))
+        if common < len(move_ids):
+            self.requests.put(("moves", move_ids[common:]))
+        self.synced_moves = move_ids
+
+    def start_search(self, gs: GameState, time_limit: float = ai.TIME_LIMIT, node_limit: int = ai.NODE_LIMIT) -> None:
+        """
+        The function starts searching the best move of the position, the result is read with get_result
+        """
+        self.sync(gs)
+        self.search_id += 1
+        self.searching = True
+        self.search_limits = (time_limit, node_limit)
+        self.resynced = False
+        self.requests.put(("go", self.search_id, time_limit, node_limit))
+
+    def resync(self) -> None:
+        """
+        The function replays the whole game to the worker from the initial position and searches again
+        """
+        self.resynced = True
+        self.requests.put(("reset",))
+        if self.synced_moves:
+            self.requests.put(("moves", self.synced_moves))
+        self.requests.put(("go", self.search_id, *self.search_limits))
+
+    def get_result(self, valid_moves: list, block: bool = False):
+        """
+        The function returns the best move of the current search, or None if the search isn't finished.
+        Results of cancelled searches are dropped. A search the worker answers with RESYNC is sent again
+        once with the whole game, if it fails again the result is None.
+        """
+        while self.searching:
+            try:
+                search_id, move_id, stats = self.results.get(block=block)
+            except Empty:
+                return None
+            if search_id != self.search_id:
+                continue
+            if move_id == RESYNC and not self.resynced:
+                self.resync()
+                continue
+            self.searching = False
+            self.last_stats = stats
+            return find_move(valid_moves, move_id)
+        return None
+
+    def cancel(self) -> None:
+        """
+        The function stops the current search, its result will be ignored
+        """
+        with self.cancelled_id.get_lock():
+            self.cancelled_id.value = self.search_id
+        self.searching = False
+
+    def close(self) -> None:
+        self.cancel()
+        self.requests.put(("quit",))
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.terminate()
@@ -0,0 +1,63 @@
+"""
+Reading position files. An EPD line is the first four fields of a FEN string (piece placement, side to move,
+castling rights and en-passant square) followed by operations separated by semicolons, for example
+    r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - bm Bb5; id "ruy lopez";
+Lines with full FEN strings (with the move counters) are read as well. The files are read lazily, line by
+line, so files with any number of positions can be pushed through the engine without loading them to memory.
+"""
+
+import re
+from game_state import GameState
+
+# a quoted string, the semicolon ending an operation or a plain word
+OPERATION_TOKEN = re.compile(r'"([^"]*)"|(;)|([^\s;"]+)')
+
+
+def parse_epd(line: str) -> tuple:
+    """
+    The function returns the FEN string and the dict of the operations (opcode to the list of operands)
+    of an EPD line. The hmvc and fmvn operations set the move counters of the FEN string.
+    """
+    fields = line.split(maxsplit=4)
+    if len(fields) < 4:
+        raise ValueError(f"invalid EPD line: {line!r}")
+    rest = fields[4] if len(fields) > 4 else ""
+    counters = rest.split(maxsplit=2)
+    if len(counters) >= 2 and counters[0].isdigit() and counters[1].isdigit():
+        # a FEN line: the move counters come before the operations
+        halfmove_clock, fullmove_number = counters[0], counters[1]
+        rest = counters[2] if len(counters) > 2 else ""
+    else:
+        halfmove_clock, fullmove_number = "0", "1"
+
+    operations = {}
+    tokens = []
+    for quoted, end, word in OPERATION_TOKEN.findall(rest + ";"):
+        if end:
+            if tokens:
+                operations[tokens[0]] = tokens[1:]
+            tokens = []
+        else:
+            tokens.append(quoted or word)
+    halfmove_clock = operations.get("hmvc", [halfmove_clock])[0]
+    fullmove_number = operations.get("fmvn", [fullmove_number])[0]
+    return " ".join(fields[:4] + [halfmove_clock, fullmove_number]), operations
+
+
+def read_epd(path: str):
+    """
+    Generator of the (FEN, operations) of the positions in the file, empty lines and comments (#) are skipped
+    """
+    with open(path) as file:
+        for line in file:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield parse_epd(line)
+
+
+def load_positions(path: str, game_state_class=GameState):
+    """
+    Generator of the (game state, operations) of the positions in the file
+    """
+    for fen, operations in read_epd(path):
+        yield game_state_class.from_fen(fen), operations
@@ -0,0 +1,175 @@
+"""
+The piece values and piece-square tables of the evaluation, and the functions that compute the material
+and positional scores of a board, either from scratch or as the change made by a single move, and the
+pawn structure score (cached by the search in the pawn hash table, it only depends on the pawns).
+Scores are from white's point of view: white pieces count positive and black pieces negative.
+"""
+
+from move import PIECES, PIECE_CODES, PROMOTION_PIECES, BLACK_PIECE, SQUARE_MASK, END_SQUARE_SHIFT, PROMOTION_SHIFT, \
+    PIECE_SHIFT, CAPTURED_SHIFT, PIECE_MASK, CAPTURED_MASK, ENPASSANT_FLAG, CASTLE_FLAG
+
+PIECE_SCORE = {"K": 200, "Q": 9, "R": 5, "B": 3, "N": 3, "p": 1}
+# the value of the piece of every piece code of move.py whatever its color, 0 for an empty square
+PIECE_CODE_SCORE = tuple(PIECE_SCORE[piece[1]] if piece is not None and piece != "--" else 0 for piece in PIECES)
+
+KNIGHT_SCORE = [[0.0, 0.1, 0.2, 0.2, 0.2, 0.2, 0.1, 0.0],
+                [0.1, 0.3, 0.5, 0.5, 0.5, 0.5, 0.3, 0.1],
+                [0.2, 0.5, 0.6, 0.65, 0.65, 0.6, 0.5, 0.2],
+                [0.2, 0.55, 0.65, 0.7, 0.7, 0.65, 0.55, 0.2],
+                [0.2, 0.5, 0.65, 0.7, 0.7, 0.65, 0.5, 0.2],
+                [0.2, 0.55, 0.6, 0.65, 0.65, 0.6, 0.55, 0.2],
+                [0.1, 0.3, 0.5, 0.55, 0.55, 0.5, 0.3, 0.1],
+                [0.0, 0.1, 0.2, 0.2, 0.2, 0.2, 0.1, 0.0]]
+
+BISHOP_SCORE = [[0.0, 0.2, 0.2, 0.2, 0.2, 0.2, 0.2, 0.0],
+                [0.2, 0.4, 0.4, 0.4, 0.4, 0.4, 0.4, 0.2],
+                [0.2, 0.4, 0.5, 0.6, 0.6, 0.5, 0.4, 0.2],
+                [0.2, 0.5, 0.5, 0.6, 0.6, 0.5, 0.5, 0.2],
+                [0.2, 0.4, 0.6, 0.6, 0.6, 0.6, 0.4, 0.2],
+                [0.2, 0.6, 0.6, 0.6, 0.6, 0.6, 0.6, 0.2],
+                [0.2, 0.5, 0.4, 0.4, 0.4, 0.4, 0.5, 0.2],
+                [0.0, 0.2, 0.2, 0.2, 0.2, 0.2, 0.2, 0.0]]
+
+ROOK_SCORE = [[0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25],
+              [0.5, 0.75, 0.75, 0.75, 0.75, 0.75, 0.75, 0.5],
+              [0.0, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.0],
+              [0.0, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.0],
+              [0.0, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.0],
+              [0.0, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.0],
+              [0.0, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.0],
+              [0.25, 0.25, 0.25, 0.5, 0.5, 0.25, 0.25, 0.25]]
+
+QUEEN_SCORE = [[0.0, 0.2, 0.2, 0.3, 0.3, 0.2, 0.2, 0.0],
+               [0.2, 0.4, 0.4, 0.4, 0.4, 0.4, 0.4, 0.2],
+               [0.2, 0.4, 0.5, 0.5, 0.5, 0.5, 0.4, 0.2],
+               [0.3, 0.4, 0.5, 0.5, 0.5, 0.5, 0.4, 0.3],
+               [0.4, 0.4, 0.5, 0.5, 0.5, 0.5, 0.4, 0.3],
+               [0.2, 0.5, 0.5, 0.5, 0.5, 0.5, 0.4, 0.2],
+               [0.2, 0.4, 0.5, 0.4, 0.4, 0.4, 0.4, 0.2],
+               [0.0, 0.2, 0.2, 0.3, 0.3, 0.2, 0.2, 0.0]]
+
+PAWN_SCORE = [[0.8, 0.8, 0.8, 0.8, 0.8, 0.8, 0.8, 0.8],
+              [0.7, 0.7, 0.7, 0.7, 0.7, 0.7, 0.7, 0.7],
+              [0.3, 0.3, 0.4, 0.5, 0.5, 0.4, 0.3, 0.3],
+              [0.25, 0.25, 0.3, 0.45, 0.45, 0.3, 0.25, 0.25],
+              [0.2, 0.2, 0.2, 0.4, 0.4, 0.2, 0.2, 0.2],
+              [0.25, 0.15, 0.1, 0.2, 0.2, 0.1, 0.15, 0.25],
+              [0.25, 0.3, 0.3, 0.0, 0.0, 0.3, 0.3, 0.25],
+              [0.2, 0.2, 0.2, 0.2, 0.2, 0.2, 0.2, 0.2]]
+
+PIECE_POSITION_SCORE = {"wN": KNIGHT_SCORE,
+                        "bN": KNIGHT_SCORE[::-1],
+                        "wB": BISHOP_SCORE,
+                        "bB": BISHOP_SCORE[::-1],
+                        "wQ": QUEEN_SCORE,
+                        "bQ": QUEEN_SCORE[::-1],
+                        "wR": ROOK_SCORE,
+                        "bR": ROOK_SCORE[::-1],
+                        "wp": PAWN_SCORE,
+                        "bp": PAWN_SCORE[::-1]}
+
+DOUBLED_PAWN_PENALTY = 0.2  # for every pawn behind another pawn of its color on the same file
+ISOLATED_PAWN_PENALTY = 0.15  # for every pawn without pawns of its color on the files beside it
+# PASSED_PAWN_BONUS[rank] of a pawn that no enemy pawn can stop, by its rank from its own side (1 to 6)
+PASSED_PAWN_BONUS = (0.0, 0.05, 0.1, 0.2, 0.35, 0.6, 1.0, 0.0)
+
+
+def piece_score(piece: str, row: int, col: int) -> tuple:
+    """
+    The function returns the (material, position) score of the piece standing on the square (row, col)
+    """
+    material = PIECE_SCORE[piece[1]]
+    position = PIECE_POSITION_SCORE[piece][row][col] if piece[1] != "K" else 0
+    if piece[0] == "w":
+        return material, position
+    return -material, -position
+
+
+# the scores of piece_score by the piece codes of move.py (0 for the empty square and the unused codes), used by
+# move_evaluation_delta: PIECE_CODE_MATERIAL[code] and PIECE_CODE_POSITION[code][row * 8 + col]
+PIECE_CODE_MATERIAL = tuple(piece_score(piece, 0, 0)[0] if piece is not None and piece != "--" else 0
+                            for piece in PIECES)
+PIECE_CODE_POSITION = tuple(tuple(piece_score(piece, sq >> 3, sq & 7)[1] if piece is not None and piece != "--"
+                                  else 0 for sq in range(64)) for piece in PIECES)
+# the white piece code of every promotion value of a packed move, the black code adds BLACK_PIECE
+PROMOTION_CODES = (0,) + tuple(PIECE_CODES["w" + piece] for piece in PROMOTION_PIECES)
+ROOK_CODE = PIECE_CODES["wR"]
+
+
+def compute_evaluation(board: list) -> tuple:
+    """
+    The function computes the (material, position) score of the board from scratch
+    """
+    material = position = 0
+    for row in range(len(board)):
+        for col in range(len(board[row])):
+            piece = board[row][col]
+            if piece != "--":
+                piece_material, piece_position = piece_score(piece, row, col)
+                material += piece_material
+                position += piece_position
+    return material, position
+
+
+def move_evaluation_delta(move: int) -> tuple:
+    """
+    The function returns the change of the (material, position) score made by the packed move, including
+    captures, en-passant, promotions and the rook of a castle move
+    """
+    start, end = move & SQUARE_MASK, move >> END_SQUARE_SHIFT & SQUARE_MASK
+    moved = move >> PIECE_SHIFT & PIECE_MASK
+    promotion = move >> PROMOTION_SHIFT & 0x7
+    end_code = moved & BLACK_PIECE | PROMOTION_CODES[promotion] if promotion else moved
+    material = -PIECE_CODE_MATERIAL[moved] + PIECE_CODE_MATERIAL[end_code]
+    position = -PIECE_CODE_POSITION[moved][start] + PIECE_CODE_POSITION[end_code][end]
+    if move & CAPTURED_MASK:
+        captured = move >> CAPTURED_SHIFT & PIECE_MASK
+        # the pawn taken en passant is on the row of the start square
+        captured_square = start & 56 | end & 7 if move & ENPASSANT_FLAG else end
+        material -= PIECE_CODE_MATERIAL[captured]
+        position -= PIECE_CODE_POSITION[captured][captured_square]
+    if move & CASTLE_FLAG:
+        rook = moved & BLACK_PIECE | ROOK_CODE
+        if end - start == 2:  # king-side castle move
+            rook_start, rook_end = end + 1, end - 1
+        else:  # queen-side castle move
+            rook_start, rook_end = end - 2, end + 1
+        position += PIECE_CODE_POSITION[rook][rook_end] - PIECE_CODE_POSITION[rook][rook_start]
+    return material, position
+
+
+def evaluate_pawn_structure(board: list) -> tuple:
+    """
+    The function returns the (score, white passed pawns, black passed pawns) of the pawns of the board:
+    penalties for doubled and isolated pawns and a bonus for passed pawns. The passed pawns are masks with
+    the bit row * 8 + col of every passed pawn.
+    """
+    white_rows = [[] for _ in range(8)]  # the rows of the pawns of every file
+    black_rows = [[] for _ in range(8)]
+    for row in range(1, 7):  # pawns never stand on the first and last rows
+        for col in range(8):
+            if board[row][col] == "wp":
+                white_rows[col].append(row)
+            elif board[row][col] == "bp":
+                black_rows[col].append(row)
+    score = 0.0
+    white_passed = black_passed = 0
+    for col in range(8):
+        files = range(max(col - 1, 0), min(col + 2, 8))  # the file and the files beside it
+        white_isolated = not any(white_rows[file] for file in files if file != col)
+        black_isolated = not any(black_rows[file] for file in files if file != col)
+        for row in white_rows[col]:
+            if white_isolated:
+                score -= ISOLATED_PAWN_PENALTY
+            # passed if no black pawn stands in front of it (a lower row) on its file or the files beside it
+            if not any(black_row < row for file in files for black_row in black_rows[file]):
+                score += PASSED_PAWN_BONUS[7 - row]
+                white_passed |= 1 << (row * 8 + col)
+        for row in black_rows[col]:
+            if black_isolated:
+                score += ISOLATED_PAWN_PENALTY
+            if not any(white_row > row for file in files for white_row in white_rows[file]):
+                score -= PASSED_PAWN_BONUS[row]
+                black_passed |= 1 << (row * 8 + col)
+        score -= DOUBLED_PAWN_PENALTY * (max(len(white_rows[col]) - 1, 0) - max(len(black_rows[col]) - 1, 0))
+    return score, white_passed, black_passed
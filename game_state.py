@@ -4,8 +4,23 @@ It will also be responsible for determining the valid moves at the current state
 a move log
 """
 
-from move import Move
-from castle_right import CastleRights
+from move import PROMOTION_PIECES, PIECES, PIECE_BITS, CAPTURED_BITS, PROMOTION_BITS, SQUARE_MASK, END_SQUARE_SHIFT, \
+    PROMOTION_SHIFT, PIECE_SHIFT, CAPTURED_SHIFT, PIECE_MASK, CAPTURED_MASK, ENPASSANT_FLAG, CASTLE_FLAG
+from const import RANK2ROW, FILES2COLS, ROW2RANK, COL2FILE
+from castle_right import ALL_CASTLING_RIGHTS, CASTLING_RIGHTS_MASKS, WHITE_KING_SIDE, WHITE_QUEEN_SIDE, \
+    BLACK_KING_SIDE, BLACK_QUEEN_SIDE, castling_rights_from_fen, castling_rights_to_fen
+from attacks import is_square_attacked, KNIGHT_SQUARES, KING_SQUARES, ORTHOGONAL_RAYS, DIAGONAL_RAYS
+from evaluation import compute_evaluation, move_evaluation_delta
+from zobrist import PIECE_SQUARE_KEYS, WHITE_TO_MOVE_KEY, castle_rights_key, enpassant_key, compute_hash, \
+    compute_pawn_hash
+
+# every move pushes a record of the position before it on the undo stack: the castling rights, the en-passant
+# square, the hash, the halfmove clock and the pawn hash. The stack is one list with UNDO_RECORD_SIZE entries
+# per record.
+UNDO_RECORD_SIZE = 5
+UNDO_STACK_PLIES = 1024  # records allocated at first, the stack doubles for longer games
+# the (row, col) tuple of every square, shared so make_move doesn't create new ones
+SQUARES = [[(row, col) for col in range(8)] for row in range(8)]
 
 
 class GameState:
@@ -25,7 +40,7 @@ class GameState:
             ["wR", "wN", "wB", "wQ", "wK", "wB", "wN", "wR"]
         ]
         self.whiteToMove = True
-        self.moveLog = []
+        self.moveLog = []  # the packed moves played (see move.py)
         self.moveFunctions = {
             "p": self.get_pawn_moves,
             "R": self.get_rook_moves,
@@ -43,22 +58,123 @@ class GameState:
         self.stalemate = False
 
         # king locations
-        self.white_king_loc = (7, 4)
-        self.black_king_loc = (0, 4)
+        self.white_king_loc = SQUARES[7][4]
+        self.black_king_loc = SQUARES[0][4]
 
         # checks
         self.inCheck = False
         self.pins = []  # pieces that have pin
         self.check = []  # piece that attack the oppenent king
+        self.pin_directions = {}  # square of every pinned piece to the direction of its pin
+        self.evasion_squares = None  # squares that block or capture the single check, None when not in check
 
         # enpassant
         self.enpassant_possible = ()  # cordinates for the square where en-passent is possible
-        self.enpassant_possible_log = [self.enpassant_possible]
 
-        # castling
-        self.current_castling_rights = CastleRights(True, True, True, True)
-        self.castle_rights_log = [CastleRights(self.current_castling_rights.wks, self.current_castling_rights.bks,
-                                               self.current_castling_rights.wqs, self.current_castling_rights.bqs)]
+        # castling rights, the bits of castle_right.py
+        self.current_castling_rights = ALL_CASTLING_RIGHTS
+
+        # move counters: half moves since the last capture or pawn move (for the fifty-move rule)
+        # and the number of the full move, which starts at 1 and goes up after every black move
+        self.halfmove_clock = 0
+        self.fullmove_number = 1
+
+        # zobrist hash of the position, updated incrementally by make_move and undo_move
+        self.zobrist_key = compute_hash(self)
+        # hash of the pawns only, the key of the pawn hash table of the evaluation
+        self.pawn_key = compute_pawn_hash(self)
+
+        # the state taken back by undo_move, see UNDO_RECORD_SIZE. undo_top is the index of the next record.
+        self.undo_stack = [None] * (UNDO_STACK_PLIES * UNDO_RECORD_SIZE)
+        self.undo_top = 0
+
+        # material and piece-square scores (white minus black), updated incrementally by make_move and undo_move
+        self.material_score, self.position_score = compute_evaluation(self.board)
+
+    @classmethod
+    def from_fen(cls, fen: str) -> "GameState":
+        """
+        The function creates a game state from a FEN string. The move counters are optional (EPD positions
+        don't have them).
+        """
+        gs = cls()
+        fields = fen.split()
+        gs.board = []
+        for rank in fields[0].split("/"):
+            row = []
+            for char in rank:
+                if char.isdigit():
+                    row.extend(["--"] * int(char))
+                else:
+                    row.append(("w" if char.isupper() else "b") + ("p" if char in "pP" else char.upper()))
+            gs.board.append(row)
+        for row in range(8):
+            for col in range(8):
+                if gs.board[row][col] == "wK":
+                    gs.white_king_loc = SQUARES[row][col]
+                elif gs.board[row][col] == "bK":
+                    gs.black_king_loc = SQUARES[row][col]
+        gs.whiteToMove = fields[1] == "w"
+        gs.current_castling_rights = castling_rights_from_fen(fields[2] if len(fields) > 2 else "-")
+        enpassant = fields[3] if len(fields) > 3 else "-"
+        gs.enpassant_possible = () if enpassant == "-" else SQUARES[RANK2ROW[enpassant[1]]][FILES2COLS[enpassant[0]]]
+        gs.halfmove_clock = int(fields[4]) if len(fields) > 4 else 0
+        gs.fullmove_number = int(fields[5]) if len(fields) > 5 else 1
+        gs.piece_count = gs.count_pieces_on_board()
+        gs.zobrist_key = compute_hash(gs)
+        gs.pawn_key = compute_pawn_hash(gs)
+        gs.material_score, gs.position_score = compute_evaluation(gs.board)
+        return gs
+
+    def to_fen(self) -> str:
+        """
+        The function returns the FEN string of the position
+        """
+        ranks = []
+        for row in self.board:
+            rank = ""
+            empty = 0
+            for square in row:
+                if square == "--":
+                    empty += 1
+                    continue
+                if empty:
+                    rank += str(empty)
+                    empty = 0
+                rank += square[1].upper() if square[0] == "w" else square[1].lower()
+            if empty:
+                rank += str(empty)
+            ranks.append(rank)
+        castling = castling_rights_to_fen(self.current_castling_rights)
+        enpassant = COL2FILE[self.enpassant_possible[1]] + ROW2RANK[self.enpassant_possible[0]] \
+            if self.enpassant_possible else "-"
+        return f"{'/'.join(ranks)} {'w' if self.whiteToMove else 'b'} {castling} {enpassant} " \
+               f"{self.halfmove_clock} {self.fullmove_number}"
+
+    def is_repetition(self, times: int = 2) -> bool:
+        """
+        The function checks if the position occurred `times` times (including now). Only the positions since
+        the last capture or pawn move can repeat, so only the last halfmove_clock hashes of the same side
+        to move are compared. The hashes of the earlier positions are in the records of the undo stack.
+        """
+        last = self.undo_top // UNDO_RECORD_SIZE  # the number of the current position
+        first = max(last - self.halfmove_clock, 0)
+        count = 1
+        for i in range(last - 2, first - 1, -2):
+            if self.undo_stack[i * UNDO_RECORD_SIZE + 2] == self.zobrist_key:
+                count += 1
+                if count >= times:
+                    return True
+        return False
+
+    def is_threefold_repetition(self) -> bool:
+        return self.is_repetition(3)
+
+    def is_fifty_move_draw(self) -> bool:
+        """
+        The function checks the fifty-move rule: fifty moves of each side without a capture or a pawn move
+        """
+        return self.halfmove_clock >= 100
 
     def count_pieces_on_board(self) -> int:
         """
@@ -71,69 +187,113 @@ class GameState:
                     count += 1
         return count
 
-    def make_move(self, move: Move) -> None:
-        """
-        The function apply the move to the board (this will not work for castling, en-passent and promotion)
-        """
-        self.board[move.start_row][move.start_col] = "--"
-        self.board[move.end_row][move.end_col] = move.piece_moved
+    def make_move(self, move: int) -> None:
+        """
+        The function apply the packed move (see move.py) to the board, including castling, en-passent and promotion
+        """
+        start, end = move & SQUARE_MASK, move >> END_SQUARE_SHIFT & SQUARE_MASK
+        start_row, start_col, end_row, end_col = start >> 3, start & 7, end >> 3, end & 7
+        piece_moved = PIECES[move >> PIECE_SHIFT & PIECE_MASK]
+        piece_captured = PIECES[move >> CAPTURED_SHIFT & PIECE_MASK]
+        is_capture = move & CAPTURED_MASK
+        is_enpassant_move = move & ENPASSANT_FLAG
+        promotion = move >> PROMOTION_SHIFT & 0x7
+
+        self.push_undo_record()
+        # remove the old en-passant and castling keys, the new ones are added at the end of the move
+        key = self.zobrist_key ^ WHITE_TO_MOVE_KEY ^ enpassant_key(self.enpassant_possible) ^ \
+            castle_rights_key(self.current_castling_rights)
+        key ^= PIECE_SQUARE_KEYS[piece_moved][start_row][start_col]
+        if is_enpassant_move:
+            key ^= PIECE_SQUARE_KEYS[piece_captured][start_row][end_col]
+        elif is_capture:
+            key ^= PIECE_SQUARE_KEYS[piece_captured][end_row][end_col]
+        # the pawn hash changes only with pawn moves, captures of pawns and promotions
+        if piece_moved[1] == "p":
+            pawn_key = self.pawn_key ^ PIECE_SQUARE_KEYS[piece_moved][start_row][start_col]
+            if not promotion:
+                pawn_key ^= PIECE_SQUARE_KEYS[piece_moved][end_row][end_col]
+            if is_enpassant_move:
+                pawn_key ^= PIECE_SQUARE_KEYS[piece_captured][start_row][end_col]
+            elif piece_captured[1] == "p":
+                pawn_key ^= PIECE_SQUARE_KEYS[piece_captured][end_row][end_col]
+            self.pawn_key = pawn_key
+        elif piece_captured[1] == "p":
+            self.pawn_key ^= PIECE_SQUARE_KEYS[piece_captured][end_row][end_col]
+
+        self.board[start_row][start_col] = "--"
+        self.board[end_row][end_col] = piece_moved
         # save the move
         self.moveLog.append(move)
         # swap players
         self.whiteToMove = not self.whiteToMove
         # update king's location if moved
-        if move.piece_moved == "wK":
-            self.white_king_loc = (move.end_row, move.end_col)
-        elif move.piece_moved == "bK":
-            self.black_king_loc = (move.end_row, move.end_col)
+        if piece_moved == "wK":
+            self.white_king_loc = SQUARES[end_row][end_col]
+        elif piece_moved == "bK":
+            self.black_king_loc = SQUARES[end_row][end_col]
 
         # pawn promotion
-        if move.is_pawn_promotion:
-            # promoted_piece = input("Promote to Q, R, B or N: ")
-            # self.board[move.end_row][move.end_col] = f"{move.piece_moved[0]}{promoted_piece}"
-            self.board[move.end_row][move.end_col] = f"{move.piece_moved[0]}Q"
+        if promotion:
+            self.board[end_row][end_col] = piece_moved[0] + PROMOTION_PIECES[promotion - 1]
 
         # enpassant move
-        if move.is_enpassant_move:
+        if is_enpassant_move:
             # capturing the pawn
-            self.board[move.start_row][move.end_col] = "--"
+            self.board[start_row][end_col] = "--"
 
         # update enpassant_possible variable
         # only on 2 square pawn promote
-        if move.piece_moved[1] == "p" and abs(move.start_row - move.end_row) == 2:
-            self.enpassant_possible = (
-                (move.start_row + move.end_row) // 2, move.start_col)
+        if piece_moved[1] == "p" and abs(start_row - end_row) == 2:
+            self.enpassant_possible = SQUARES[(start_row + end_row) // 2][start_col]
         else:
             self.enpassant_possible = ()
 
         # castle move
-        if move.is_castle_move:
-            if move.end_col - move.start_col == 2:  # king-side castle move
+        is_castle_move = move & CASTLE_FLAG
+        if is_castle_move:
+            if end_col - start_col == 2:  # king-side castle move
                 # moves the rook to its new square
-                self.board[move.end_row][move.end_col - 1] = self.board[move.end_row][
-                    move.end_col + 1]
+                self.board[end_row][end_col - 1] = self.board[end_row][end_col + 1]
                 # erase old rook
-                self.board[move.end_row][move.end_col +
-                                         1] = "--"
+                self.board[end_row][end_col + 1] = "--"
             else:  # queen-side castle move
                 # moves the rook to its new square
-                self.board[move.end_row][move.end_col + 1] = self.board[move.end_row][
-                    move.end_col - 2]
+                self.board[end_row][end_col + 1] = self.board[end_row][end_col - 2]
                 # erase old rook
-                self.board[move.end_row][move.end_col -
-                                         2] = "--"
-
-        self.enpassant_possible_log.append(self.enpassant_possible)
+                self.board[end_row][end_col - 2] = "--"
 
         # update castling rights - whenever it is a rook or king move
         self.update_castling_rights(move)
-        self.castle_rights_log.append(CastleRights(self.current_castling_rights.wks, self.current_castling_rights.bks,
-                                                   self.current_castling_rights.wqs, self.current_castling_rights.bqs))
 
-        if move.is_capture:
+        if is_capture:
             # update piece count
             self.piece_count -= 1
 
+        # update the move counters
+        if is_capture or piece_moved[1] == "p":
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+        if self.whiteToMove:  # black made the move
+            self.fullmove_number += 1
+
+        # add the moved (or promoted) piece and the castling rook to the hash
+        key ^= PIECE_SQUARE_KEYS[self.board[end_row][end_col]][end_row][end_col]
+        if is_castle_move:
+            rook = piece_moved[0] + "R"
+            if end_col - start_col == 2:  # king-side castle move
+                key ^= PIECE_SQUARE_KEYS[rook][end_row][end_col + 1] ^ PIECE_SQUARE_KEYS[rook][end_row][end_col - 1]
+            else:  # queen-side castle move
+                key ^= PIECE_SQUARE_KEYS[rook][end_row][end_col - 2] ^ PIECE_SQUARE_KEYS[rook][end_row][end_col + 1]
+        key ^= enpassant_key(self.enpassant_possible) ^ castle_rights_key(self.current_castling_rights)
+        self.zobrist_key = key
+
+        # update the evaluation
+        material, position = move_evaluation_delta(move)
+        self.material_score += material
+        self.position_score += position
+
     def undo_move(self) -> None:
         """
         The function undo the last move
@@ -141,82 +301,114 @@ class GameState:
         # make sure there is a move to undo
         if len(self.moveLog) != 0:
             move = self.moveLog.pop()
-            self.board[move.start_row][move.start_col] = move.piece_moved
-            self.board[move.end_row][move.end_col] = move.piece_captured
+            start, end = move & SQUARE_MASK, move >> END_SQUARE_SHIFT & SQUARE_MASK
+            start_row, start_col, end_row, end_col = start >> 3, start & 7, end >> 3, end & 7
+            piece_moved = PIECES[move >> PIECE_SHIFT & PIECE_MASK]
+            piece_captured = PIECES[move >> CAPTURED_SHIFT & PIECE_MASK]
+            self.board[start_row][start_col] = piece_moved
+            self.board[end_row][end_col] = piece_captured
             # switch turn
             self.whiteToMove = not self.whiteToMove
             # update king's location if needed
-            if move.piece_moved == "wK":
-                self.white_king_loc = (move.start_row, move.start_col)
-            elif move.piece_moved == "bK":
-                self.black_king_loc = (move.start_row, move.start_col)
+            if piece_moved == "wK":
+                self.white_king_loc = SQUARES[start_row][start_col]
+            elif piece_moved == "bK":
+                self.black_king_loc = SQUARES[start_row][start_col]
 
             # undo enpassant move
-            if move.is_enpassant_move:
+            if move & ENPASSANT_FLAG:
                 # leave landing square empty
-                self.board[move.end_row][move.end_col] = "--"
-                self.board[move.start_row][move.end_col] = move.piece_captured
+                self.board[end_row][end_col] = "--"
+                self.board[start_row][end_col] = piece_captured
 
-            self.enpassant_possible_log.pop()
-            self.enpassant_possible = self.enpassant_possible_log[-1]
+            # restore the castling rights, en-passant square, hashes and halfmove clock from before the move
+            self.pop_undo_record()
 
-            # undo castle rights
-            # get rid of the new castle rights from the move we are undoing
-            self.castle_rights_log.pop()
-            # set the current castle rights to the last one in the list
-            self.current_castling_rights = self.castle_rights_log[-1]
             # undo the castle move
-            if move.is_castle_move:
-                if move.end_col - move.start_col == 2:  # king-side castle
-                    self.board[move.end_row][move.end_col +
-                                             1] = self.board[move.end_row][move.end_col - 1]
-                    self.board[move.end_row][move.end_col - 1] = '--'
+            if move & CASTLE_FLAG:
+                if end_col - start_col == 2:  # king-side castle
+                    self.board[end_row][end_col + 1] = self.board[end_row][end_col - 1]
+                    self.board[end_row][end_col - 1] = '--'
                 else:  # queen-side castle
-                    self.board[move.end_row][move.end_col -
-                                             2] = self.board[move.end_row][move.end_col + 1]
-                    self.board[move.end_row][move.end_col + 1] = '--'
+                    self.board[end_row][end_col - 2] = self.board[end_row][end_col + 1]
+                    self.board[end_row][end_col + 1] = '--'
+
+            # restore the move counter
+            if not self.whiteToMove:  # the undone move was black's
+                self.fullmove_number -= 1
+
+            # take back the evaluation change of the move
+            material, position = move_evaluation_delta(move)
+            self.material_score -= material
+            self.position_score -= position
 
             # update results
             self.checkmate = False
             self.stalemate = False
 
-            if move.is_capture:
+            if move & CAPTURED_MASK:
                 # update the count of pieces
                 self.piece_count += 1
 
-    def update_castling_rights(self, move: Move) -> None:
-        """
-        The function updates the castling rights given the move
-        """
-        if move.piece_captured == "wR":
-            if move.end_col == 0:  # left rook
-                self.current_castling_rights.wqs = False
-            elif move.end_col == 7:  # right rook
-                self.current_castling_rights.wks = False
-        elif move.piece_captured == "bR":
-            if move.end_col == 0:  # left rook
-                self.current_castling_rights.bqs = False
-            elif move.end_col == 7:  # right rook
-                self.current_castling_rights.bks = False
-
-        if move.piece_moved == 'wK':
-            self.current_castling_rights.wqs = False
-            self.current_castling_rights.wks = False
-        elif move.piece_moved == 'bK':
-            self.current_castling_rights.bqs = False
-            self.current_castling_rights.bks = False
-        elif move.piece_moved == 'wR':
-            if move.start_row == 7:
-                if move.start_col == 0:  # left rook
-                    self.current_castling_rights.wqs = False
-                elif move.start_col == 7:  # right rook
-                    self.current_castling_rights.wks = False
-        elif move.piece_moved == 'bR':
-            if move.start_row == 0:
-                if move.start_col == 0:  # left rook
-                    self.current_castling_rights.bqs = False
-                elif move.start_col == 7:  # right rook
-                    self.current_castling_rights.bks = False
+    def make_null_move(self) -> None:
+        """
+        The function passes the turn to the opponent without moving (used by the null-move pruning of the
+        search). The move log isn't changed, the null move is taken back with undo_null_move.
+        """
+        self.push_undo_record()
+        self.zobrist_key ^= WHITE_TO_MOVE_KEY ^ enpassant_key(self.enpassant_possible)
+        self.whiteToMove = not self.whiteToMove
+        self.enpassant_possible = ()
+        # the positions before the null move can't be repeated after it
+        self.halfmove_clock = 0
+
+    def undo_null_move(self) -> None:
+        """
+        The function takes back the null move made by make_null_move
+        """
+        self.whiteToMove = not self.whiteToMove
+        self.pop_undo_record()
+        self.checkmate = False
+        self.stalemate = False
+
+    def push_undo_record(self) -> None:
+        """
+        The function saves the castling rights, en-passant square, hashes and halfmove clock of the position
+        on the undo stack
+        """
+        stack = self.undo_stack
+        top = self.undo_top
+        if top == len(stack):  # a longer game than the stack was allocated for
+            stack.extend([None] * len(stack))
+        stack[top] = self.current_castling_rights
+        stack[top + 1] = self.enpassant_possible
+        stack[top + 2] = self.zobrist_key
+        stack[top + 3] = self.halfmove_clock
+        stack[top + 4] = self.pawn_key
+        self.undo_top = top + UNDO_RECORD_SIZE
+
+    def pop_undo_record(self) -> None:
+        """
+        The function restores the castling rights, en-passant square, hashes and halfmove clock of the last
+        record of the undo stack
+        """
+        stack = self.undo_stack
+        top = self.undo_top - UNDO_RECORD_SIZE
+        self.current_castling_rights = stack[top]
+        self.enpassant_possible = stack[top + 1]
+        self.zobrist_key = stack[top + 2]
+        self.halfmove_clock = stack[top + 3]
+        self.pawn_key = stack[top + 4]
+        self.undo_top = top
+
+    def update_castling_rights(self, move: int) -> None:
+        """
+        The function updates the castling rights given the packed move: a move from or to the square of a king
+        or of a rook in its corner takes the rights of the square away
+        """
+        start, end = move & SQUARE_MASK, move >> END_SQUARE_SHIFT & SQUARE_MASK
+        self.current_castling_rights &= CASTLING_RIGHTS_MASKS[start >> 3][start & 7] & \
+            CASTLING_RIGHTS_MASKS[end >> 3][end & 7]
 
     def in_check(self) -> bool:
         """
@@ -231,13 +423,7 @@ class GameState:
         """
         The function determines if the enemy player can attack the square (row, col)
         """
-        self.whiteToMove = not self.whiteToMove
-        opp_moves = self.get_all_possible_moves()
-        self.whiteToMove = not self.whiteToMove
-        for move in opp_moves:
-            if move.end_row == row and move.end_col == col:  # square is under attack
-                return True
-        return False
+        return is_square_attacked(self.board, row, col, "b" if self.whiteToMove else "w")
 
     def check_for_pins_and_checks(self) -> tuple:
         """
@@ -310,329 +496,244 @@ class GameState:
 
     def get_valid_moves(self) -> list:
         """
-        All moves considering checks
+        All moves considering checks. The pins and checks of the king are found once, then every piece
+        generates only its legal moves: a pinned piece moves along the line of its pin, and in check the
+        other pieces can only capture the checking piece or block its ray
         """
-        temp_castle_rights = CastleRights(self.current_castling_rights.wks, self.current_castling_rights.bks,
-                                          self.current_castling_rights.wqs, self.current_castling_rights.bqs)
-
         moves = []
         self.inCheck, self.pins, self.checks = self.check_for_pins_and_checks()
         if self.whiteToMove:
             king_row, king_col = self.white_king_loc[0], self.white_king_loc[1]
         else:
             king_row, king_col = self.black_king_loc[0], self.black_king_loc[1]
+        # the direction of the pin of every pinned piece (from the king to the piece)
+        self.pin_directions = {(pin[0], pin[1]): (pin[2], pin[3]) for pin in self.pins}
 
-        if self.inCheck:
-            if len(self.checks) == 1:  # there is only 1 check, block or move the king
-                moves = self.get_all_possible_moves()
-                # to block a check you must move a piece into one of the squares between
-                # the enemy piece and king
-                check = self.checks[0]
-                check_row, check_col = check[0], check[1]
-                # enemy piece causing the check
-                piece_checking = self.board[check_row][check_col]
-                valid_squares = []  # squares that the piece can move to
-                # if knight, must capture or move king, other piece can block
-                if piece_checking[1] == "N":
-                    valid_squares = [(check_row, check_col)]
+        if len(self.checks) > 1:  # double check, king has to move
+            self.evasion_squares = None
+            self.get_king_moves(king_row, king_col, moves)
+        else:
+            if self.inCheck:  # there is only 1 check, block it, capture the checking piece or move the king
+                check_row, check_col, d_row, d_col = self.checks[0]
+                # if knight, must capture or move king, other pieces can be blocked
+                if self.board[check_row][check_col][1] == "N":
+                    self.evasion_squares = {(check_row, check_col)}
                 else:
-                    for i in range(8):
-                        valid_square = (
-                            king_row + check[2] * i, king_col + check[3] * i)
-                        valid_squares.append(valid_square)
+                    self.evasion_squares = set()
+                    for i in range(1, 8):
+                        self.evasion_squares.add((king_row + d_row * i, king_col + d_col * i))
                         # once you get to piece end checks
-                        if valid_square[0] == check_row and valid_square[1] == check_col:
+                        if king_row + d_row * i == check_row and king_col + d_col * i == check_col:
                             break
-
-                # get rid of any moves that don't block check or move king
-                for i in range(len(moves) - 1, -1, -1):
-                    # move doesn't move king so it must be block or capture
-                    if moves[i].piece_moved[1] != "K":
-                        # move doesn't block check or capture piece
-                        if not (moves[i].end_row, moves[i].end_col) in valid_squares:
-                            moves.remove(moves[i])
-            else:  # double check, king has to move
-                self.get_king_moves(king_row, king_col, moves)
-        else:  # not in checks so all moves are fine
+            else:  # not in check so all the moves of the pieces are fine
+                self.evasion_squares = None
             moves = self.get_all_possible_moves()
-            if self.whiteToMove:
-                self.get_castle_moves(
-                    self.white_king_loc[0], self.white_king_loc[1], moves)
-            else:
-                self.get_castle_moves(
-                    self.black_king_loc[0], self.black_king_loc[1], moves)
+            if not self.inCheck:
+                self.get_castle_moves(king_row, king_col, moves)
 
         if len(moves) == 0:  # either a checkmate or stalemate
-            if self.in_check():
+            if self.inCheck:
                 self.checkmate = True
             else:
-                # TODO stalemate on repeated moves
+                # draws by repetition and the fifty-move rule are checked by is_threefold_repetition
+                # and is_fifty_move_draw
                 self.stalemate = True
-
-        # update the current castling rights
-        self.current_castling_rights = temp_castle_rights
         return moves
 
     def get_all_possible_moves(self) -> list:
         """
-        All the possible moves without considering checks
+        All the moves of the pieces of the current player, using the pins and the check evasion squares
+        found by get_valid_moves
         """
         moves = []
-        for row in range(len(self.board)):
-            for col in range(len(self.board[row])):
-                turn = self.board[row][col][0]
-                piece = self.board[row][col][1]
-                if (turn == "w" and self.whiteToMove) or (turn == "b" and not self.whiteToMove):
+        ally_color = "w" if self.whiteToMove else "b"
+        for row in range(8):
+            board_row = self.board[row]
+            for col in range(8):
+                piece = board_row[col]
+                if piece[0] == ally_color:
                     # call the function based on the piece type
-                    self.moveFunctions[piece](row, col, moves)
-
+                    self.moveFunctions[piece[1]](row, col, moves)
         return moves
 
     def get_pawn_moves(self, row: int, col: int, moves: list) -> None:
         """
         Get all the pawn moves for the pawn located at (row, col) and add these moves to the list of moves
         """
-        piece_pinned = False
-        pin_direction = ()
-        for i in range(len(self.pins) - 1, -1, -1):
-            if self.pins[i][0] == row and self.pins[i][1] == col:
-                piece_pinned = True
-                pin_direction = (self.pins[i][2], self.pins[i][3])
-                self.pins.remove(self.pins[i])
-                break
-
+        pin_direction = self.pin_directions.get((row, col))
+        evasion_squares = self.evasion_squares
         if self.whiteToMove:
             move_amount = -1
             start_row = 6
             enemy_color = "b"
-            king_row, king_col = self.white_king_loc
+            start = row * 8 + col | PIECE_BITS["wp"]
         else:
             move_amount = 1
             start_row = 1
             enemy_color = "w"
+            start = row * 8 + col | PIECE_BITS["bp"]
+
+        end_row = row + move_amount
+        # pawn advances, a pinned pawn can only advance along a pin on its file
+        if self.board[end_row][col] == "--" and (pin_direction is None or pin_direction[1] == 0):
+            if evasion_squares is None or (end_row, col) in evasion_squares:
+                self.add_pawn_move(start | (end_row * 8 + col) << END_SQUARE_SHIFT, end_row, moves)
+            # 2 square pawn advance
+            if row == start_row and self.board[end_row + move_amount][col] == "--" and \
+                    (evasion_squares is None or (end_row + move_amount, col) in evasion_squares):
+                moves.append(start | ((end_row + move_amount) * 8 + col) << END_SQUARE_SHIFT)
+
+        for end_col in (col - 1, col + 1):  # captures to the left and to the right
+            if not 0 <= end_col < 8:
+                continue
+            if pin_direction is not None and pin_direction != (move_amount, end_col - col) and \
+                    pin_direction != (-move_amount, col - end_col):
+                continue
+            end_piece = self.board[end_row][end_col]
+            if end_piece[0] == enemy_color:
+                if evasion_squares is None or (end_row, end_col) in evasion_squares:
+                    self.add_pawn_move(start | (end_row * 8 + end_col) << END_SQUARE_SHIFT | CAPTURED_BITS[end_piece],
+                                       end_row, moves)
+            elif (end_row, end_col) == self.enpassant_possible:
+                # the capture can also evade a check by taking the checking pawn beside the landing square
+                if (evasion_squares is None or (end_row, end_col) in evasion_squares
+                        or (row, end_col) in evasion_squares) and not self.enpassant_reveals_check(row, col, end_col):
+                    moves.append(start | (end_row * 8 + end_col) << END_SQUARE_SHIFT | ENPASSANT_FLAG |
+                                 CAPTURED_BITS[enemy_color + "p"])
+
+    def enpassant_reveals_check(self, row: int, col: int, captured_col: int) -> bool:
+        """
+        The function checks if the en-passant capture of the pawn at (row, col) opens the row of the king to an
+        enemy rook or queen. Both pawns leave the row at once, so the pins can't see it.
+        """
+        if self.whiteToMove:
+            king_row, king_col = self.white_king_loc
+            enemy_color = "b"
+        else:
             king_row, king_col = self.black_king_loc
+            enemy_color = "w"
+        if king_row != row:
+            return False
+        step = 1 if col > king_col else -1
+        for end_col in range(king_col + step, 8 if step == 1 else -1, step):
+            if end_col == col or end_col == captured_col:
+                continue
+            square = self.board[row][end_col]
+            # only the first piece beside the pawns matters
+            if square != "--":
+                return square[0] == enemy_color and (square[1] == "R" or square[1] == "Q")
+        return False
 
-        if self.board[row + move_amount][col] == "--":  # 1 square pawn advance
-            if not piece_pinned or pin_direction == (move_amount, 0):
-                moves.append(
-                    Move((row, col), (row + move_amount, col), self.board))
-                # 2 square pawn advance
-                if row == start_row and self.board[row + 2 * move_amount][col] == "--":
-                    moves.append(
-                        Move((row, col), (row + 2 * move_amount, col), self.board))
-        if col - 1 >= 0:  # capture to the left
-            if not piece_pinned or pin_direction == (move_amount, -1):
-                if self.board[row + move_amount][col - 1][0] == enemy_color:
-                    moves.append(
-                        Move((row, col), (row + move_amount, col - 1), self.board))
-                if (row + move_amount, col - 1) == self.enpassant_possible:
-                    attacking_piece = blocking_piece = False
-                    if king_row == row:
-                        if king_col < col:  # king is left of the pawn
-                            # inside: between king and the pawn;
-                            # outside: between pawn and border;
-                            inside_range = range(king_col + 1, col - 1)
-                            outside_range = range(col + 1, 8)
-                        else:  # king right of the pawn
-                            inside_range = range(king_col - 1, col, -1)
-                            outside_range = range(col - 2, -1, -1)
-                        for i in inside_range:
-                            # some piece beside en-passant pawn blocks
-                            if self.board[row][i] != "--":
-                                blocking_piece = True
-                        for i in outside_range:
-                            square = self.board[row][i]
-                            if square[0] == enemy_color and (square[1] == "R" or square[1] == "Q"):
-                                attacking_piece = True
-                            elif square != "--":
-                                blocking_piece = True
-                    if not attacking_piece or blocking_piece:
-                        moves.append(Move(
-                            (row, col), (row + move_amount, col - 1), self.board, is_enpassant_move=True))
-        if col + 1 <= 7:  # capture to the right
-            if not piece_pinned or pin_direction == (move_amount, +1):
-                if self.board[row + move_amount][col + 1][0] == enemy_color:
-                    moves.append(
-                        Move((row, col), (row + move_amount, col + 1), self.board))
-                if (row + move_amount, col + 1) == self.enpassant_possible:
-                    attacking_piece = blocking_piece = False
-                    if king_row == row:
-                        if king_col < col:  # king is left of the pawn
-                            # inside: between king and the pawn;
-                            # outside: between pawn and border;
-                            inside_range = range(king_col + 1, col)
-                            outside_range = range(col + 2, 8)
-                        else:  # king right of the pawn
-                            inside_range = range(king_col - 1, col + 1, -1)
-                            outside_range = range(col - 1, -1, -1)
-                        for i in inside_range:
-                            # some piece beside en-passant pawn blocks
-                            if self.board[row][i] != "--":
-                                blocking_piece = True
-                        for i in outside_range:
-                            square = self.board[row][i]
-                            if square[0] == enemy_color and (square[1] == "R" or square[1] == "Q"):
-                                attacking_piece = True
-                            elif square != "--":
-                                blocking_piece = True
-                    if not attacking_piece or blocking_piece:
-                        moves.append(Move(
-                            (row, col), (row + move_amount, col + 1), self.board, is_enpassant_move=True))
+    def add_pawn_move(self, move: int, end_row: int, moves: list) -> None:
+        """
+        Add the packed pawn move to the list of moves, a promotion (a move to end_row 0 or 7) is added once
+        for every promotion piece
+        """
+        if end_row == 0 or end_row == 7:
+            for piece in PROMOTION_PIECES:
+                moves.append(move | PROMOTION_BITS[piece])
+        else:
+            moves.append(move)
+
+    def get_sliding_moves(self, row: int, col: int, rays: list, moves: list) -> None:
+        """
+        Add the moves along the rays of the square (row, col) to the list of moves, a pinned piece only
+        moves along the line of its pin
+        """
+        pin_direction = self.pin_directions.get((row, col))
+        evasion_squares = self.evasion_squares
+        ally_color = "w" if self.whiteToMove else "b"
+        start = row * 8 + col | PIECE_BITS[self.board[row][col]]
+        for ray in rays[row][col]:
+            if pin_direction is not None:
+                d = (ray[0][0] - row, ray[0][1] - col)
+                if d != pin_direction and d != (-pin_direction[0], -pin_direction[1]):
+                    continue
+            for end_row, end_col in ray:
+                end_piece = self.board[end_row][end_col]
+                if end_piece[0] == ally_color:  # same color piece, not valid
+                    break
+                if evasion_squares is None or (end_row, end_col) in evasion_squares:
+                    moves.append(start | (end_row * 8 + end_col) << END_SQUARE_SHIFT | CAPTURED_BITS[end_piece])
+                if end_piece != "--":  # enemy piece valid, but the ray ends
+                    break
 
     def get_rook_moves(self, row: int, col: int, moves: list) -> None:
         """
         Get all the rook moves for the rook located at (row, col) and add these moves to the list of moves
         """
-        piece_pinned = False
-        pin_direction = ()
-        for i in range(len(self.pins) - 1, -1, -1):
-            if self.pins[i][0] == row and self.pins[i][1] == col:
-                piece_pinned = True
-                pin_direction = (self.pins[i][2], self.pins[i][3])
-                # can't remove queen from rook moves, only remove it on bishop
-                if self.board[row][col][1] != "Q":
-                    self.pins.remove(self.pins[i])
-                break
-
-        dir = ((-1, 0), (0, -1), (1, 0), (0, 1))
-        enemy_color = "b" if self.whiteToMove else "w"
-        for d in dir:
-            for i in range(1, 8):
-                end_row = row + d[0] * i
-                end_col = col + d[1] * i
-                if 0 <= end_row < 8 and 0 <= end_col < 8:  # on board
-                    if not piece_pinned or pin_direction == d or pin_direction == (-d[0], -d[1]):
-                        end_piece = self.board[end_row][end_col]
-                        if end_piece == "--":  # empty piece vaild
-                            moves.append(
-                                Move((row, col), (end_row, end_col), self.board))
-                        elif end_piece[0] == enemy_color:  # enemy piece valid
-                            moves.append(
-                                Move((row, col), (end_row, end_col), self.board))
-                            break
-                        else:  # same color piece, not valid
-                            break
-                else:
-                    # off board not valid
-                    break
+        self.get_sliding_moves(row, col, ORTHOGONAL_RAYS, moves)
 
     def get_knight_moves(self, row: int, col: int, moves: list) -> None:
         """
         Get all the knight moves for the knight located at (row, col) and add these moves to the list of moves
         """
-        piece_pinned = False
-        for i in range(len(self.pins) - 1, -1, -1):
-            if self.pins[i][0] == row and self.pins[i][1] == col:
-                piece_pinned = True
-                self.pins.remove(self.pins[i])
-                break
-
-        dir = ((-2, -1), (-2, 1), (-1, -2), (-1, 2),
-               (1, -2), (1, 2), (2, -1), (2, 1))
+        if (row, col) in self.pin_directions:  # a pinned knight can't move
+            return
+        evasion_squares = self.evasion_squares
         ally_color = "w" if self.whiteToMove else "b"
-        for d in dir:
-            end_row = row + d[0]
-            end_col = col + d[1]
-            if 0 <= end_row < 8 and 0 <= end_col < 8:
-                if not piece_pinned:
-                    end_piece = self.board[end_row][end_col]
-                    # not an ally piece (empty or enemy piece)
-                    if end_piece[0] != ally_color:
-                        moves.append(
-                            Move((row, col), (end_row, end_col), self.board))
+        start = row * 8 + col | PIECE_BITS[self.board[row][col]]
+        for end_row, end_col in KNIGHT_SQUARES[row][col]:
+            end_piece = self.board[end_row][end_col]
+            # not an ally piece (empty or enemy piece)
+            if end_piece[0] != ally_color and (evasion_squares is None or (end_row, end_col) in evasion_squares):
+                moves.append(start | (end_row * 8 + end_col) << END_SQUARE_SHIFT | CAPTURED_BITS[end_piece])
 
     def get_bishop_moves(self, row: int, col: int, moves: list) -> None:
         """
         Get all the bishop moves for the bishop located at (row, col) and add these moves to the list of moves
         """
-        piece_pinned = False
-        pin_direction = ()
-        for i in range(len(self.pins) - 1, -1, -1):
-            if self.pins[i][0] == row and self.pins[i][1] == col:
-                piece_pinned = True
-                pin_direction = (self.pins[i][2], self.pins[i][3])
-                self.pins.remove(self.pins[i])
-                break
-
-        dir = ((-1, -1), (-1, 1), (1, -1), (1, 1))
-        enemy_color = "b" if self.whiteToMove else "w"
-        for d in dir:
-            for i in range(1, 8):
-                end_row = row + d[0] * i
-                end_col = col + d[1] * i
-                if 0 <= end_row < 8 and 0 <= end_col < 8:  # on board
-                    if not piece_pinned or pin_direction == d or pin_direction == (-d[0], -d[1]):
-                        end_piece = self.board[end_row][end_col]
-                        if end_piece == "--":  # empty piece vaild
-                            moves.append(
-                                Move((row, col), (end_row, end_col), self.board))
-                        elif end_piece[0] == enemy_color:  # enemy piece valid
-                            moves.append(
-                                Move((row, col), (end_row, end_col), self.board))
-                            break
-                        else:  # same color piece, not valid
-                            break
-                else:
-                    # off board not valid
-                    break
+        self.get_sliding_moves(row, col, DIAGONAL_RAYS, moves)
 
     def get_queen_moves(self, row: int, col: int, moves: list) -> None:
         """
         Get all the queen moves for the queen located at (row, col) and add these moves to the list of moves
         """
         # the queen moves like the rook and the bishop combined
-        self.get_rook_moves(row, col, moves)
-        self.get_bishop_moves(row, col, moves)
+        self.get_sliding_moves(row, col, ORTHOGONAL_RAYS, moves)
+        self.get_sliding_moves(row, col, DIAGONAL_RAYS, moves)
 
     def get_king_moves(self, row: int, col: int, moves: list) -> None:
         """
         Get all the king moves for the king located at (row, col) and add these moves to the list of moves
         """
-        row_moves = (-1, -1, -1, 0, 0, 1, 1, 1)
-        col_moves = (-1, 0, 1, -1, 1, -1, 0, 1)
-        ally_color = "w" if self.whiteToMove else "b"
-        for i in range(8):
-            end_row, end_col = row + row_moves[i], col + col_moves[i]
-            if 0 <= end_row < 8 and 0 <= end_col < 8:
-                end_piece = self.board[end_row][end_col]
-                if end_piece[0] != ally_color:  # not an ally piece, empty or enemy
-                    # place king on end square and look for checks
-                    if ally_color == "w":
-                        self.white_king_loc = (end_row, end_col)
-                    else:
-                        self.black_king_loc = (end_row, end_col)
-                    inCheck, pins, checks = self.check_for_pins_and_checks()
-                    if not inCheck:
-                        moves.append(
-                            Move((row, col), (end_row, end_col), self.board))
-                    # place king back on original location
-                    if ally_color == "w":
-                        self.white_king_loc = (row, col)
-                    else:
-                        self.black_king_loc = (row, col)
+        if self.whiteToMove:
+            ally_color, enemy_color = "w", "b"
+        else:
+            ally_color, enemy_color = "b", "w"
+        # take the king off the board while its squares are checked, so a square behind the king on the ray
+        # of a checking slider is seen as attacked
+        king = self.board[row][col]
+        self.board[row][col] = "--"
+        safe_squares = [(end_row, end_col) for end_row, end_col in KING_SQUARES[row][col]
+                        if self.board[end_row][end_col][0] != ally_color
+                        and not is_square_attacked(self.board, end_row, end_col, enemy_color)]
+        self.board[row][col] = king
+        start = row * 8 + col | PIECE_BITS[king]
+        for end_row, end_col in safe_squares:
+            end_piece = self.board[end_row][end_col]
+            moves.append(start | (end_row * 8 + end_col) << END_SQUARE_SHIFT | CAPTURED_BITS[end_piece])
 
     def get_castle_moves(self, row: int, col: int, moves: list) -> None:
         """
         The function generates all the valid castle moves for the king at (row, col) and adds them 
         to the list of moves
         """
-        if self.square_under_attack(row, col):
-            return  # can't castlr while in check
-        if (self.whiteToMove and self.current_castling_rights.wks) or (
-                not self.whiteToMove and self.current_castling_rights.bks):
+        if self.inCheck:
+            return  # can't castle while in check
+        if self.current_castling_rights & (WHITE_KING_SIDE if self.whiteToMove else BLACK_KING_SIDE):
             self.get_king_side_castle_moves(row, col, moves)
-        if (self.whiteToMove and self.current_castling_rights.wqs) or (
-                not self.whiteToMove and self.current_castling_rights.bqs):
+        if self.current_castling_rights & (WHITE_QUEEN_SIDE if self.whiteToMove else BLACK_QUEEN_SIDE):
             self.get_queen_side_castle_moves(row, col, moves)
 
     def get_king_side_castle_moves(self, row: int, col: int, moves: list) -> None:
         if self.board[row][col + 1] == '--' and self.board[row][col + 2] == '--':
             if not self.square_under_attack(row, col + 1) and not self.square_under_attack(row, col + 2):
-                moves.append(Move((row, col), (row, col + 2),
-                                  self.board, is_castle_move=True))
+                moves.append(row * 8 + col | (row * 8 + col + 2) << END_SQUARE_SHIFT | CASTLE_FLAG |
+                             PIECE_BITS[self.board[row][col]])
 
     def get_queen_side_castle_moves(self, row: int, col: int, moves: list) -> None:
         if self.board[row][col - 1] == '--' and self.board[row][col - 2] == '--' and self.board[row][col - 3] == '--':
             if not self.square_under_attack(row, col - 1) and not self.square_under_attack(row, col - 2):
-                moves.append(Move((row, col), (row, col - 2),
-                                  self.board, is_castle_move=True))
+                moves.append(row * 8 + col | (row * 8 + col - 2) << END_SQUARE_SHIFT | CASTLE_FLAG |
+                             PIECE_BITS[self.board[row][col]])
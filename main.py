@@ -5,16 +5,34 @@ GameState object
 
 import pygame
 from game_state import GameState
-from const import WIDTH, HEIGHT, SQUARE_SIZE, DIMENSIONS, IMAGES, MOVE_LOG_PANEL_HEIGHT, MOVE_LOG_PANEL_WIDTH
-from move import Move
+from bitboard import BitboardGameState
+from const import WIDTH, HEIGHT, SQUARE_SIZE, DIMENSIONS, MOVE_LOG_PANEL_HEIGHT, MOVE_LOG_PANEL_WIDTH
+from move import Move, pack_move_id, find_move
+import os
 import sys
-from multiprocessing import Process, Queue
-from ai import find_best_move, find_random_move
+from ai import find_random_move
+from engine_worker import EngineWorker
 import pprint
 
 pygame.init()
 
 MAX_FPS = 15
+USE_BITBOARDS = False  # generate the moves with the bitboard backend
+BOOK_FILE = "book.bin"  # the opening book of the AI (Polyglot format), used if the file exists
+TABLEBASE_DIR = "tablebases"  # the endgame tablebases of the AI (see tablebase.py), used if the directory exists
+
+# the piece images are only needed by the GUI, they are loaded by load_images when the game starts
+PIECES = ["wp", "wR", "wN", "wB", "wQ",
+          "wK", "bp", "bR", "bN", "bB", "bK", "bQ"]
+IMAGES = {}
+
+
+def load_images() -> None:
+    """
+    Load the images of the pieces
+    """
+    for piece in PIECES:
+        IMAGES[piece] = pygame.image.load(f"images/{piece}.png")
 
 
 def get_row_col_from_mouse(pos: tuple) -> tuple:
@@ -59,7 +77,7 @@ def highlight_squares(win: pygame.display, gs: GameState, valid_moves: list, sel
     Highlight square selected and moves for piece selected.
     """
     if (len(gs.moveLog)) > 0:
-        last_move = gs.moveLog[-1]
+        last_move = Move(gs.moveLog[-1])
         s = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE))
         s.set_alpha(100)
         s.fill(pygame.Color('green'))
@@ -77,7 +95,7 @@ def highlight_squares(win: pygame.display, gs: GameState, valid_moves: list, sel
             win.blit(s, (col * SQUARE_SIZE, row * SQUARE_SIZE))
             # highlight moves from that square
             s.fill(pygame.Color('yellow'))
-            for move in valid_moves:
+            for move in map(Move, valid_moves):
                 if move.start_row == row and move.start_col == col:
                     win.blit(s, (move.end_col * SQUARE_SIZE,
                                  move.end_row * SQUARE_SIZE))
@@ -93,9 +111,9 @@ def draw_move_log(win: pygame.display, gs: GameState, font: pygame.font) -> None
     move_log = gs.moveLog
     move_texts = []
     for i in range(0, len(move_log), 2):
-        move_string = str(i // 2 + 1) + '. ' + str(move_log[i]) + " "
+        move_string = str(i // 2 + 1) + '. ' + str(Move(move_log[i])) + " "
         if i + 1 < len(move_log):
-            move_string += str(move_log[i + 1]) + "  "
+            move_string += str(Move(move_log[i + 1])) + "  "
         move_texts.append(move_string)
 
     moves_per_row = 3
@@ -170,11 +188,19 @@ def draw_game_state(win: pygame.display, gs: GameState, valid_moves: list, selec
     draw_pieces(win, gs.board)
 
 
+def new_game_state() -> GameState:
+    """
+    The function creates the game state with the selected move generation backend
+    """
+    return BitboardGameState() if USE_BITBOARDS else GameState()
+
+
 def main():
+    load_images()
     win = pygame.display.set_mode((WIDTH + MOVE_LOG_PANEL_WIDTH, HEIGHT))
     clock = pygame.time.Clock()
     win.fill(pygame.Color("white"))
-    gs = GameState()
+    gs = new_game_state()
     valid_moves = gs.get_valid_moves()
     move_made = False  # flag variable for when a move is made
     animate = False  # flag variable for when we should animate a move
@@ -188,7 +214,10 @@ def main():
     game_over = False
     ai_thinking = False
     move_undone = False
-    move_finder_process = None
+    # the engine process lives for the whole game and keeps its search tables between moves
+    engine = EngineWorker(BitboardGameState if USE_BITBOARDS else GameState,
+                          BOOK_FILE if os.path.exists(BOOK_FILE) else None,
+                          TABLEBASE_DIR if os.path.isdir(TABLEBASE_DIR) else None)
     move_log_font = pygame.font.SysFont("Arial", 14, False, False)
 
     player_one = True  # if a human is playing white, then this will be True, else False
@@ -199,6 +228,7 @@ def main():
             not gs.whiteToMove and player_two)
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
+                engine.close()
                 pygame.quit()
                 run = False
                 sys.exit()
@@ -217,15 +247,15 @@ def main():
 
                     if len(player_clicks) == 2:
                         # after the second click, make the move
-                        move = Move(player_clicks[0],
-                                    player_clicks[1], gs.board)
-                        for i in range(len(valid_moves)):
-                            if move == valid_moves[i]:
-                                gs.make_move(valid_moves[i])
-                                move_made = True
-                                animate = True
-                                selected_square = ()  # reset user clicks
-                                player_clicks = []
+                        move = find_move(valid_moves, pack_move_id(*player_clicks[0], *player_clicks[1]))
+                        if move is None:  # a pawn reaching the last row promotes to a queen
+                            move = find_move(valid_moves, pack_move_id(*player_clicks[0], *player_clicks[1], "Q"))
+                        if move is not None:
+                            gs.make_move(move)
+                            move_made = True
+                            animate = True
+                            selected_square = ()  # reset user clicks
+                            player_clicks = []
                         if not move_made:
                             player_clicks = [selected_square]
 
@@ -237,11 +267,11 @@ def main():
                     animate = False
                     game_over = False
                     if ai_thinking:
-                        move_finder_process.terminate()
+                        engine.cancel()
                         ai_thinking = False
                     move_undone = True
                 if event.key == pygame.K_r:  # reset the game when 'r' is pressed
-                    gs = GameState()
+                    gs = new_game_state()
                     valid_moves = gs.get_valid_moves()
                     selected_square = ()
                     player_clicks = []
@@ -249,7 +279,7 @@ def main():
                     animate = False
                     game_over = False
                     if ai_thinking:
-                        move_finder_process.terminate()
+                        engine.cancel()
                         ai_thinking = False
                     move_undone = True
 
@@ -257,14 +287,11 @@ def main():
             if not game_over and not human_turn and not move_undone:
                 if not ai_thinking:
                     ai_thinking = True
-                    return_queue = Queue()  # used to pass data between threads
-                    move_finder_process = Process(
-                        target=find_best_move, args=(gs, valid_moves, return_queue))
-                    move_finder_process.start()
-                if not move_finder_process.is_alive():
-                    ai_move = return_queue.get()
+                    engine.start_search(gs)
+                ai_move = engine.get_result(valid_moves)
+                if not engine.searching:
                     if ai_move is None:
-                        ai_move = find_best_move(valid_moves)
+                        ai_move = find_random_move(valid_moves)
                     gs.make_move(ai_move)
                     move_made = True
                     animate = True
@@ -272,7 +299,7 @@ def main():
 
         if move_made:
             if animate:
-                animateMove(gs.moveLog[-1], win, gs.board, clock)
+                animateMove(Move(gs.moveLog[-1]), win, gs.board, clock)
             valid_moves = gs.get_valid_moves()
             move_made = False
             animate = False
@@ -295,6 +322,14 @@ def main():
             game_over = True
             draw_end_game_text(win, "Stalemate")
 
+        elif gs.is_threefold_repetition():
+            game_over = True
+            draw_end_game_text(win, "Draw by repetition")
+
+        elif gs.is_fifty_move_draw():
+            game_over = True
+            draw_end_game_text(win, "Draw by the fifty-move rule")
+
         clock.tick(MAX_FPS)
         pygame.display.flip()
 
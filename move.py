@@ -1,40 +1,137 @@
 from const import RANK2ROW, ROW2RANK, FILES2COLS, COL2FILE
 
+# pieces a pawn can promote to
+PROMOTION_PIECES = ("Q", "R", "B", "N")
+
+# The move generators, make_move/undo_move, the search and the move log work with moves packed in an int:
+#   bits 0-5    start square (row * 8 + col)
+#   bits 6-11   end square
+#   bits 12-14  promotion piece (0 for no promotion, otherwise the index in PROMOTION_PIECES + 1)
+#   bit 15      en-passant capture
+#   bit 16      castle move
+#   bits 17-20  code of the moved piece (see PIECE_CODES)
+#   bits 21-24  code of the captured piece (0 for none, the pawn taken by an en-passant capture)
+# The move id is the low 15 bits: the start square, end square and promotion piece are enough to tell apart
+# all the moves of a position, so the id fits in the 16 bits of a transposition table entry.
+# The Move class wraps a packed move with the attributes and the notation used by the GUI and the front ends.
+SQUARE_MASK = 0x3F
+END_SQUARE_SHIFT = 6
+PROMOTION_SHIFT = 12
+PROMOTION_MASK = 0x7 << PROMOTION_SHIFT
+MOVE_ID_MASK = 0x7FFF
+ENPASSANT_FLAG = 1 << 15
+CASTLE_FLAG = 1 << 16
+PIECE_SHIFT = 17
+CAPTURED_SHIFT = 21
+PIECE_MASK = 0xF
+CAPTURED_MASK = PIECE_MASK << CAPTURED_SHIFT
+TACTICAL_MASK = CAPTURED_MASK | PROMOTION_MASK  # set for the captures and promotions
+
+# the code of every piece, the black pieces have the bit BLACK_PIECE set
+BLACK_PIECE = 8
+PIECE_CODES = {"--": 0, "wp": 1, "wN": 2, "wB": 3, "wR": 4, "wQ": 5, "wK": 6,
+               "bp": 9, "bN": 10, "bB": 11, "bR": 12, "bQ": 13, "bK": 14}
+PIECES = tuple(next((piece for piece, code in PIECE_CODES.items() if code == i), None) for i in range(16))
+BLACK_MOVE_FLAG = BLACK_PIECE << PIECE_SHIFT  # set for the moves of black
+# the bits of the moved and the captured piece, added by the generators to the squares of the move
+PIECE_BITS = {piece: code << PIECE_SHIFT for piece, code in PIECE_CODES.items()}
+CAPTURED_BITS = {piece: code << CAPTURED_SHIFT for piece, code in PIECE_CODES.items()}
+PROMOTION_BITS = {piece: (i + 1) << PROMOTION_SHIFT for i, piece in enumerate(PROMOTION_PIECES)}
+
+
+def pack_move_id(start_row: int, start_col: int, end_row: int, end_col: int, promotion_piece=None) -> int:
+    """
+    The function returns the move id of the move between the squares, promotion_piece is None for a move
+    that doesn't promote
+    """
+    move_id = start_row * 8 + start_col | (end_row * 8 + end_col) << END_SQUARE_SHIFT
+    if promotion_piece is not None:
+        move_id |= PROMOTION_BITS[promotion_piece]
+    return move_id
+
+
+def find_move(moves: list, move_id: int):
+    """
+    The function returns the packed move of the list with the move id, or None if there isn't one
+    """
+    for move in moves:
+        if move & MOVE_ID_MASK == move_id:
+            return move
+    return None
+
 
 class Move:
-    def __init__(self, start_square, end_square, board, is_enpassant_move=False, is_castle_move=False):
-        self.start_row, self.start_col = start_square[0], start_square[1]
-        self.end_row, self.end_col = end_square[0], end_square[1]
-        self.piece_moved = board[self.start_row][self.start_col]
+    # built from a packed move when a move is shown or written, the search never creates one
+    __slots__ = ("packed",)
+
+    def __init__(self, packed: int):
+        self.packed = packed
+
+    @property
+    def start_row(self) -> int:
+        return (self.packed & SQUARE_MASK) >> 3
+
+    @property
+    def start_col(self) -> int:
+        return self.packed & 7
+
+    @property
+    def end_row(self) -> int:
+        return (self.packed >> END_SQUARE_SHIFT & SQUARE_MASK) >> 3
+
+    @property
+    def end_col(self) -> int:
+        return self.packed >> END_SQUARE_SHIFT & 7
+
+    @property
+    def piece_moved(self) -> str:
+        return PIECES[self.packed >> PIECE_SHIFT & PIECE_MASK]
+
+    @property
+    def piece_captured(self) -> str:
         # could be a piece or empty square ("--")
-        self.piece_captured = board[self.end_row][self.end_col]
+        return PIECES[self.packed >> CAPTURED_SHIFT & PIECE_MASK]
 
-        self.move_id = self.start_row * 1000 + self.start_col * \
-            100 + self.end_row * 10 + self.end_col
+    @property
+    def move_id(self) -> int:
+        return self.packed & MOVE_ID_MASK
 
-        # pawn promotion
-        self.is_pawn_promotion = (self.piece_moved == "wp" and self.end_row == 0) or (
-            self.piece_moved == "bp" and self.end_row == 7)
+    @property
+    def is_pawn_promotion(self) -> bool:
+        return self.packed & PROMOTION_MASK != 0
 
-        # enpassent move
-        self.is_enpassant_move = is_enpassant_move
-        if self.is_enpassant_move:
-            self.piece_captured = "wp" if self.piece_moved == "bp" else "bp"
+    @property
+    def promotion_piece(self):
+        """
+        The piece the pawn promotes to, None if the move isn't a promotion
+        """
+        promotion = self.packed >> PROMOTION_SHIFT & 0x7
+        return PROMOTION_PIECES[promotion - 1] if promotion else None
+
+    @property
+    def is_enpassant_move(self) -> bool:
+        return self.packed & ENPASSANT_FLAG != 0
 
-        # castle move
-        self.is_castle_move = is_castle_move
+    @property
+    def is_castle_move(self) -> bool:
+        return self.packed & CASTLE_FLAG != 0
 
-        self.is_capture = self.piece_captured != "--"
+    @property
+    def is_capture(self) -> bool:
+        return self.packed & CAPTURED_MASK != 0
 
     def __eq__(self, other: object) -> bool:
         """
-        Overriding the equals method 
+        Overriding the equals method
         """
         if isinstance(other, Move):
             if self.move_id == other.move_id:
                 return True
         return False
 
+    def __hash__(self) -> int:
+        return self.move_id
+
     def get_rank_file(self, row: int, col: int) -> str:
         """
         The function compute and return the chess notation for the square
@@ -46,7 +143,7 @@ class Move:
         The function compute and return the move chess notation.
         """
         if self.is_pawn_promotion:
-            return self.get_rank_file(self.end_row, self.end_col) + "Q"
+            return self.get_rank_file(self.end_row, self.end_col) + self.promotion_piece
         if self.is_castle_move:
             if self.end_col == 1:
                 return "0-0-0"
@@ -69,6 +166,15 @@ class Move:
 
         # TODO Disambiguating moves
 
+    def get_uci_notation(self) -> str:
+        """
+        The function returns the move in UCI (long algebraic) notation, for example "e2e4" or "e7e8q"
+        """
+        notation = self.get_rank_file(self.start_row, self.start_col) + self.get_rank_file(self.end_row, self.end_col)
+        if self.is_pawn_promotion:
+            notation += self.promotion_piece.lower()
+        return notation
+
     def __str__(self) -> str:
         if self.is_castle_move:
             return "0-0" if self.end_col == 6 else "0-0-0"
@@ -79,7 +185,7 @@ class Move:
             if self.is_capture:
                 return COL2FILE[self.start_col] + "x" + end_square
             else:
-                return end_square + "Q" if self.is_pawn_promotion else end_square
+                return end_square + self.promotion_piece if self.is_pawn_promotion else end_square
 
         move_string = self.piece_moved[1]
         if self.is_capture:
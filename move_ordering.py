@@ -0,0 +1,136 @@
+"""
+Move ordering of the search. The sooner the best move of a position is searched, the sooner alpha-beta
+can cut off the other moves, so the moves of every node are searched in stages:
+    1. the hash move: the best move stored in the transposition table (or of the previous iteration)
+    2. captures and promotions, by most valuable victim - least valuable attacker
+    3. the killer moves: two quiet moves per ply that caused a cutoff in a sibling position
+    4. the other quiet moves, by the history heuristic: how often the move caused a cutoff anywhere
+The stages are picked lazily, a cutoff in an early stage skips sorting the later ones.
+"""
+
+from evaluation import PIECE_SCORE, PIECE_CODE_SCORE
+from move import PROMOTION_PIECES, MOVE_ID_MASK, TACTICAL_MASK, CAPTURED_MASK, BLACK_MOVE_FLAG, PIECE_SHIFT, \
+    CAPTURED_SHIFT, PROMOTION_SHIFT, PIECE_MASK
+
+MAX_PLY = 128  # plies that keep killer moves
+HISTORY_LIMIT = 1 << 20  # the history scores are halved when one reaches the limit
+SQUARE_PAIR_MASK = 0xFFF  # start and end square bits of the move id
+# the ordering value of the promotion bits of a move, by the promotion piece
+PROMOTION_SCORE = (0,) + tuple(10 * PIECE_SCORE[piece] for piece in PROMOTION_PIECES)
+
+
+def mvv_lva(move: int) -> int:
+    """
+    Most valuable victim - least valuable attacker: the ordering value of a capture or promotion (a packed move)
+    """
+    value = PROMOTION_SCORE[move >> PROMOTION_SHIFT & 0x7]
+    if move & CAPTURED_MASK:
+        value += 10 * PIECE_CODE_SCORE[move >> CAPTURED_SHIFT & PIECE_MASK] - \
+            PIECE_CODE_SCORE[move >> PIECE_SHIFT & PIECE_MASK]
+    return value
+
+
+def history_index(move: int) -> int:
+    """
+    The function returns the index of the move in the history table: the side and the start and end squares
+    """
+    return (move & BLACK_MOVE_FLAG != 0) << 12 | move & SQUARE_PAIR_MASK
+
+
+class MoveOrdering:
+    def __init__(self):
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        self.history = [0] * (2 << 12)
+
+        # statistics
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+
+    def clear(self) -> None:
+        """
+        The function forgets the killer moves and the history, used for a new game
+        """
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        self.history = [0] * (2 << 12)
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+
+    def new_search(self) -> None:
+        """
+        The function is called before every search: the killers of the previous position are dropped
+        and the history is aged, so it follows the new position
+        """
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        self.history = [score >> 1 for score in self.history]
+        self.reset_stats()
+
+    def order_moves(self, moves: list, ply: int, hash_move_id=None):
+        """
+        Generator of the moves in the order they should be searched
+        """
+        hash_move = None
+        captures = []
+        quiets = []
+        for move in moves:
+            if move & MOVE_ID_MASK == hash_move_id:
+                hash_move = move
+            elif move & TACTICAL_MASK:
+                captures.append(move)
+            else:
+                quiets.append(move)
+
+        if hash_move is not None:
+            yield hash_move
+
+        captures.sort(key=mvv_lva, reverse=True)
+        yield from captures
+
+        killers = self.killers[ply] if ply < MAX_PLY else (None, None)
+        for killer_id in killers:
+            if killer_id is None:
+                continue
+            for i in range(len(quiets)):
+                if quiets[i] & MOVE_ID_MASK == killer_id:
+                    yield quiets.pop(i)
+                    break
+
+        history = self.history
+        quiets.sort(key=lambda quiet: history[history_index(quiet)], reverse=True)
+        yield from quiets
+
+    def record_cutoff(self, move: int, ply: int, depth: int, move_number: int) -> None:
+        """
+        The function updates the killers and the history after the move caused a beta cutoff,
+        move_number is the position of the move in the search order
+        """
+        self.cutoffs += 1
+        if move_number == 0:
+            self.first_move_cutoffs += 1
+        if move & TACTICAL_MASK:
+            return  # captures are already searched early
+
+        if ply < MAX_PLY:
+            killers = self.killers[ply]
+            move_id = move & MOVE_ID_MASK
+            if killers[0] != move_id:
+                killers[1] = killers[0]
+                killers[0] = move_id
+
+        index = history_index(move)
+        self.history[index] += depth * depth
+        if self.history[index] >= HISTORY_LIMIT:
+            self.history = [score >> 1 for score in self.history]
+
+    def first_move_cutoff_rate(self) -> float:
+        """
+        The function returns the fraction of the cutoffs made by the first searched move, the closer to 1
+        the better the ordering
+        """
+        return self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0
+
+    def stats(self) -> dict:
+        return {"cutoffs": self.cutoffs, "first_move_cutoffs": self.first_move_cutoffs,
+                "first_move_cutoff_rate": self.first_move_cutoff_rate()}
@@ -0,0 +1,84 @@
+"""
+Lazy SMP: several engine processes search the same position at the same time and share one transposition
+table in shared memory, so every process profits from the positions the others already searched.
+The helper processes search the root moves in a different order, which spreads the work over the tree.
+The first process to finish stops the others, and the result of the deepest completed search is played.
+"""
+
+import ctypes
+import os
+import random
+import time
+from multiprocessing import Event, Process, Queue, RawArray
+from game_state import GameState
+from transposition_table import TranspositionTable, table_size
+import ai
+
+
+def smp_worker_loop(worker_id: int, shared_table, tt_size_mb: float, requests: Queue, results: Queue,
+                    stop_event) -> None:
+    """
+    The main loop of a search process, handles the requests until it gets "quit"
+    """
+    ai.transposition_table = TranspositionTable(tt_size_mb, buffer=shared_table)
+    ai.VERBOSE = False
+    while True:
+        request = requests.get()
+        if request[0] == "quit":
+            break
+        _, gs, time_limit, node_limit, max_depth = request
+        valid_moves = gs.get_valid_moves()
+        if worker_id > 0:
+            # every helper searches the root moves in its own order
+            random.Random(worker_id).shuffle(valid_moves)
+        best_move = ai.find_best_move(gs, valid_moves, time_limit=time_limit, node_limit=node_limit,
+                                      max_depth=max_depth, stop_event=stop_event)
+        # the first process to finish stops the others
+        stop_event.set()
+        results.put((worker_id, best_move, ai.completed_depth,
+                     ai.best_score, ai.nodes + ai.qnodes))
+    ai.transposition_table.release()
+
+
+class ParallelSearch:
+    def __init__(self, num_workers: int = os.cpu_count(), tt_size_mb: float = ai.TT_SIZE_MB):
+        self.num_workers = num_workers
+        self.shared_table = RawArray(ctypes.c_char, table_size(tt_size_mb))
+        self.stop_event = Event()
+        self.results = Queue()
+        self.requests = [Queue() for _ in range(num_workers)]
+        self.processes = [Process(target=smp_worker_loop, args=(i, self.shared_table, tt_size_mb, self.requests[i],
+                                                                self.results, self.stop_event), daemon=True)
+                          for i in range(num_workers)]
+        for process in self.processes:
+            process.start()
+
+    def search(self, gs: GameState, time_limit: float = ai.TIME_LIMIT, node_limit: int = ai.NODE_LIMIT,
+               max_depth: int = ai.MAX_DEPTH) -> tuple:
+        """
+        The function searches the position with all the workers and returns the best move and a dict with
+        the depth, score and node count of the search. The node limit is per worker.
+        """
+        start_time = time.perf_counter()
+        self.stop_event.clear()
+        for requests in self.requests:
+            requests.put(("go", gs, time_limit, node_limit, max_depth))
+        results = sorted(self.results.get() for _ in range(self.num_workers))
+        seconds = time.perf_counter() - start_time
+
+        # play the move of the deepest completed search, the main worker wins ties
+        best = max(results, key=lambda result: (result[2], -result[0]))
+        # the packed move of the worker is a move of the same position, it is played as it is
+        best_move = best[1]
+        nodes = sum(result[4] for result in results)
+        return best_move, {"workers": self.num_workers, "depth": best[2], "score": best[3], "nodes": nodes,
+                           "seconds": seconds, "nps": nodes / seconds if seconds > 0 else None}
+
+    def close(self) -> None:
+        self.stop_event.set()
+        for requests in self.requests:
+            requests.put(("quit",))
+        for process in self.processes:
+            process.join(timeout=1)
+            if process.is_alive():
+                process.terminate()
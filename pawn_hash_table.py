@@ -0,0 +1,87 @@
+"""
+A fixed-size pawn hash table for the evaluation, keyed by the pawn hash of the GameState (the zobrist keys
+of its pawns only). It caches the pawn structure score and the passed pawns of evaluation.evaluate_pawn_structure:
+the pawns change in few of the moves of a search, so most positions find their pawn structure in the table.
+Every key has a single slot and a new entry always replaces the old one. The entries are stored in a flat
+buffer, so the memory used is known in advance and doesn't grow during the search.
+"""
+
+ENTRY_SIZE = 33  # bytes per entry: the key, the score, the 2 passed pawn masks and the used flag
+
+
+def table_entries(size_mb: float) -> int:
+    """
+    The function returns the number of entries of a table of size_mb megabytes
+    """
+    return max(1, int(size_mb * 1024 * 1024) // ENTRY_SIZE)
+
+
+class PawnHashTable:
+    def __init__(self, size_mb: float = 1):
+        self.num_entries = table_entries(size_mb)
+        self.buffer = bytearray(32 * self.num_entries)
+        view = memoryview(self.buffer)
+        self.keys = view[:8 * self.num_entries].cast("Q")
+        self.scores = view[8 * self.num_entries:16 * self.num_entries].cast("d")
+        # the white and the black passed pawns of entry i are at 2 * i and 2 * i + 1
+        self.passed_pawns = view[16 * self.num_entries:].cast("Q")
+        # a position without pawns has the key 0, so the keys alone can't tell the empty entries
+        self.used = bytearray(self.num_entries)
+
+        # statistics
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.overwrites = 0
+
+    def clear(self) -> None:
+        """
+        The function removes all the entries and resets the statistics
+        """
+        self.used[:] = bytes(self.num_entries)
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.overwrites = 0
+
+    def probe(self, key: int):
+        """
+        The function returns (score, white passed pawns, black passed pawns) of the stored pawn structure,
+        or None if it isn't in the table
+        """
+        self.probes += 1
+        index = key % self.num_entries
+        if self.used[index] and self.keys[index] == key:
+            self.hits += 1
+            return self.scores[index], self.passed_pawns[2 * index], self.passed_pawns[2 * index + 1]
+        return None
+
+    def store(self, key: int, score: float, white_passed: int, black_passed: int) -> None:
+        """
+        The function stores the evaluation of the pawn structure, replacing the entry of its slot
+        """
+        self.stores += 1
+        index = key % self.num_entries
+        if self.used[index] and self.keys[index] != key:
+            self.overwrites += 1
+        self.keys[index] = key
+        self.scores[index] = score
+        self.passed_pawns[2 * index] = white_passed
+        self.passed_pawns[2 * index + 1] = black_passed
+        self.used[index] = 1
+
+    def hit_rate(self) -> float:
+        return self.hits / self.probes if self.probes else 0.0
+
+    def usage(self) -> float:
+        """
+        The function returns the fraction of the entries that are in use
+        """
+        return sum(self.used) / self.num_entries
+
+    def stats(self) -> dict:
+        return {"size_mb": self.num_entries * ENTRY_SIZE / (1024 * 1024), "probes": self.probes, "hits": self.hits,
+                "hit_rate": self.hit_rate(), "stores": self.stores, "overwrites": self.overwrites}
@@ -0,0 +1,129 @@
+"""
+Perft: count the leaf nodes of the move generation tree to verify and benchmark GameState.get_valid_moves.
+Runs a suite of standard positions with known node counts and prints the results as JSON, for example
+    python perft.py --backend bitboard --max-nodes 200000
+    python perft.py --divide "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq -" 2
+"""
+
+import argparse
+import json
+import sys
+import time
+from game_state import GameState
+from move import Move
+from bitboard import BitboardGameState
+
+BACKENDS = {"mailbox": GameState, "bitboard": BitboardGameState}
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+# name, fen and the known node counts by depth
+POSITIONS = [
+    ("start", START_FEN, {1: 20, 2: 400, 3: 8902, 4: 197281, 5: 4865609}),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     {1: 48, 2: 2039, 3: 97862, 4: 4085603}),
+    ("position 3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", {1: 14, 2: 191, 3: 2812, 4: 43238, 5: 674624}),
+    ("position 4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     {1: 6, 2: 264, 3: 9467, 4: 422333}),
+    ("position 4 mirrored", "r2q1rk1/pP1p2pp/Q4n2/bbp1p3/Np6/1B3NBn/pPPP1PPP/R3K2R b KQ - 0 1",
+     {1: 6, 2: 264, 3: 9467, 4: 422333}),
+    ("position 5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", {1: 44, 2: 1486, 3: 62379}),
+    ("position 6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     {1: 46, 2: 2079, 3: 89890}),
+    ("illegal en-passant 1", "3k4/3p4/8/K1P4r/8/8/8/8 b - - 0 1", {6: 1134888}),
+    ("illegal en-passant 2", "8/8/4k3/8/2p5/8/B2P2K1/8 w - - 0 1", {6: 1015133}),
+    ("en-passant capture checks opponent", "8/8/1k6/2b5/2pP4/8/5K2/8 b - d3 0 1", {6: 1440467}),
+    ("short castling gives check", "5k2/8/8/8/8/8/8/4K2R w K - 0 1", {6: 661072}),
+    ("long castling gives check", "3k4/8/8/8/8/8/8/R3K3 w Q - 0 1", {6: 803711}),
+    ("castle rights", "r3k2r/1b4bq/8/8/8/8/7B/R3K2R w KQkq - 0 1", {4: 1274206}),
+    ("castling prevented", "r3k2r/8/3Q4/8/8/5q2/8/R3K2R b KQkq - 0 1", {4: 1720476}),
+    ("promote out of check", "2K2r2/4P3/8/8/8/8/8/3k4 w - - 0 1", {6: 3821001}),
+    ("discovered check", "8/8/1P2K3/8/2n5/1q6/8/5k2 b - - 0 1", {5: 1004658}),
+    ("promote to give check", "4k3/1P6/8/8/8/8/K7/8 w - - 0 1", {6: 217342}),
+    ("under promote to give check", "8/P1k5/K7/8/8/8/8/8 w - - 0 1", {6: 92683}),
+    ("self stalemate", "K1k5/8/P7/8/8/8/8/8 w - - 0 1", {6: 2217}),
+    ("stalemate and checkmate 1", "8/k1P5/8/1K6/8/8/8/8 w - - 0 1", {7: 567584}),
+    ("stalemate and checkmate 2", "8/8/2k5/5q2/5n2/8/5K2/8 b - - 0 1", {4: 23527}),
+]
+
+
+def perft(gs: GameState, depth: int) -> int:
+    """
+    The function counts the leaf nodes of the move generation tree of the given depth
+    """
+    moves = gs.get_valid_moves()
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        gs.make_move(move)
+        nodes += perft(gs, depth - 1)
+        gs.undo_move()
+    return nodes
+
+
+def divide(gs: GameState, depth: int) -> dict:
+    """
+    The function returns the perft node count of every move of the position
+    """
+    counts = {}
+    for move in gs.get_valid_moves():
+        gs.make_move(move)
+        counts[Move(move).get_uci_notation()] = perft(gs, depth - 1) if depth > 1 else 1
+        gs.undo_move()
+    return counts
+
+
+def run_position(name: str, fen: str, depth: int, expected: int, backend: str) -> dict:
+    gs = BACKENDS[backend].from_fen(fen)
+    start_time = time.perf_counter()
+    nodes = perft(gs, depth)
+    seconds = time.perf_counter() - start_time
+    return {"name": name, "fen": fen, "backend": backend, "depth": depth, "nodes": nodes, "expected": expected,
+            "passed": nodes == expected, "seconds": round(seconds, 4),
+            "nps": round(nodes / seconds) if seconds > 0 else None}
+
+
+def run_suite(backend: str, max_nodes: int, names: list = None) -> list:
+    """
+    The function runs every position at the deepest known depth that has at most max_nodes leaf nodes
+    """
+    results = []
+    for name, fen, known in POSITIONS:
+        if names and name not in names:
+            continue
+        depths = [depth for depth, nodes in known.items() if nodes <= max_nodes]
+        if not depths:
+            continue
+        depth = max(depths)
+        results.append(run_position(name, fen, depth, known[depth], backend))
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Perft move generation suite")
+    parser.add_argument("--backend", choices=BACKENDS.keys(), default="mailbox")
+    parser.add_argument("--max-nodes", type=int, default=100000,
+                        help="run each position at the deepest known depth with at most this many nodes")
+    parser.add_argument("--position", action="append", help="run only the named position (can be repeated)")
+    parser.add_argument("--divide", nargs=2, metavar=("FEN", "DEPTH"),
+                        help="print the node count of every move of the position")
+    args = parser.parse_args()
+
+    if args.divide:
+        fen, depth = args.divide
+        counts = divide(BACKENDS[args.backend].from_fen(fen), int(depth))
+        print(json.dumps({"fen": fen, "depth": int(depth), "nodes": sum(counts.values()), "moves": counts}, indent=2))
+        return 0
+
+    results = run_suite(args.backend, args.max_nodes, args.position)
+    nodes = sum(result["nodes"] for result in results)
+    seconds = sum(result["seconds"] for result in results)
+    print(json.dumps({"backend": args.backend, "passed": all(result["passed"] for result in results),
+                      "nodes": nodes, "seconds": round(seconds, 4), "nps": round(nodes / seconds) if seconds else None,
+                      "positions": results}, indent=2))
+    return 0 if all(result["passed"] for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
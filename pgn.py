@@ -0,0 +1,106 @@
+"""
+Reading PGN game collections. The games are read lazily, one at a time, so collections of any size can be
+processed. Comments, variations, move numbers and numeric annotation glyphs are skipped.
+"""
+
+import re
+from const import RANK2ROW, FILES2COLS
+from move import Move
+
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+HEADER = re.compile(r'\[(\w+)\s+"(.*)"\]')
+# a comment, a variation bracket, a glyph or a move number are skipped, anything else is a move or a result
+MOVE_TEXT_TOKEN = re.compile(r"\{[^}]*\}|;[^\n]*|\(|\)|\$\d+|\d+\.+|[^\s{}();]+")
+SAN_SUFFIXES = "+#!?"
+
+
+def read_games(path: str):
+    """
+    Generator of the (headers, SAN moves) of the games of the PGN file
+    """
+    with open(path, encoding="utf-8", errors="replace") as file:
+        headers = {}
+        move_text = []
+        for line in file:
+            line = line.strip()
+            header = HEADER.match(line)
+            if header:
+                if move_text:
+                    yield headers, parse_move_text(" ".join(move_text))
+                    headers, move_text = {}, []
+                headers[header.group(1)] = header.group(2)
+            elif line and not line.startswith("%"):
+                move_text.append(line)
+        if move_text:
+            yield headers, parse_move_text(" ".join(move_text))
+
+
+def parse_move_text(move_text: str) -> list:
+    """
+    The function returns the SAN moves of the main line of the move text of a game
+    """
+    moves = []
+    variation_depth = 0
+    for token in MOVE_TEXT_TOKEN.findall(move_text):
+        if token == "(":
+            variation_depth += 1
+        elif token == ")":
+            variation_depth -= 1
+        elif variation_depth > 0 or token[0] in "{;$" or token in RESULTS or token[-1] == ".":
+            continue
+        else:
+            moves.append(token)
+    return moves
+
+
+def matches_start_square(move: Move, disambiguation: str) -> bool:
+    """
+    The function checks the start square of the move against the file and/or rank of the disambiguation
+    """
+    for char in disambiguation:
+        if char in FILES2COLS and move.start_col != FILES2COLS[char]:
+            return False
+        if char in RANK2ROW and move.start_row != RANK2ROW[char]:
+            return False
+    return True
+
+
+def find_san_move(san: str, valid_moves: list):
+    """
+    The function returns the packed move of valid_moves written as san (standard algebraic notation), or None
+    if there is no such move or the notation is ambiguous
+    """
+    san = san.rstrip(SAN_SUFFIXES)
+    if san in ("O-O", "0-0", "O-O-O", "0-0-0"):
+        end_col = 6 if len(san) == 3 else 2
+        for packed_move in valid_moves:
+            move = Move(packed_move)
+            if move.is_castle_move and move.end_col == end_col:
+                return packed_move
+        return None
+
+    promotion_piece = None
+    if "=" in san:
+        san, promotion_piece = san.split("=")
+    elif san[-1] in "QRBN" and len(san) > 2 and san[-2].isdigit():
+        san, promotion_piece = san[:-1], san[-1]
+    if len(san) < 2 or san[-2] not in FILES2COLS or san[-1] not in RANK2ROW:
+        return None
+    end_row, end_col = RANK2ROW[san[-1]], FILES2COLS[san[-2]]
+    piece = san[0] if san[0] in "KQRBN" else "p"
+    # the file and/or rank of the start square, when the piece alone is ambiguous
+    disambiguation = (san[1:-2] if piece != "p" else san[:-2]).replace("x", "")
+
+    found = None
+    for packed_move in valid_moves:
+        move = Move(packed_move)
+        if move.piece_moved[1] != piece or move.end_row != end_row or move.end_col != end_col:
+            continue
+        if move.is_pawn_promotion and move.promotion_piece != (promotion_piece or "Q"):
+            continue
+        if not matches_start_square(move, disambiguation):
+            continue
+        if found is not None:
+            return None
+        found = packed_move
+    return found
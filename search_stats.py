@@ -0,0 +1,127 @@
+"""
+Statistics of one search of the AI: node counts, speed, transposition table and move ordering statistics,
+the result of every iteration of the iterative deepening, how often the principal variation search and
+the aspiration windows had to search again, how often the selective search pruned, and optionally the
+time spent in every phase of the search (move generation, making and undoing moves, evaluation).
+"""
+
+import functools
+import time
+from move import Move
+
+
+class SearchStats:
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.seconds = 0.0
+        self.depth = 0
+        self.nodes = 0
+        self.qnodes = 0
+        self.iterations = []  # depth, score, nodes, seconds and principal variation of every completed iteration
+        self.transposition_table = {}
+        self.move_ordering = {}
+        self.pawn_hash_table = {}
+        self.tablebase_hits = 0
+        # null-window searches of the principal variation search and the moves that had to be searched again
+        self.null_window_searches = 0
+        self.null_window_researches = 0
+        # iterations searched with an aspiration window and the searches again with a wider window
+        self.aspiration_searches = 0
+        self.aspiration_researches = 0
+        self.pruning = {}  # how often each technique of the selective search applied
+        # seconds and number of calls of every phase, only when the phases are timed
+        self.phase_seconds = {}
+        self.phase_calls = {}
+
+    def timed(self, phase: str, function):
+        """
+        The function returns function wrapped so the time spent in it is added to the phase
+        """
+        self.phase_seconds.setdefault(phase, 0.0)
+        self.phase_calls.setdefault(phase, 0)
+        perf_counter = time.perf_counter
+        phase_seconds, phase_calls = self.phase_seconds, self.phase_calls
+
+        @functools.wraps(function)
+        def timed_function(*args, **kwargs):
+            start_time = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                phase_seconds[phase] += perf_counter() - start_time
+                phase_calls[phase] += 1
+        return timed_function
+
+    def add_iteration(self, depth: int, score: float, nodes: int, principal_variation: list) -> None:
+        self.depth = depth
+        self.iterations.append({"depth": depth, "score": score, "nodes": nodes,
+                                "seconds": round(time.perf_counter() - self.start_time, 4),
+                                "best_move": Move(principal_variation[0]).get_uci_notation() if principal_variation
+                                else None,
+                                "pv": [Move(move).get_uci_notation() for move in principal_variation]})
+
+    def finish(self, nodes: int, qnodes: int, transposition_table, move_ordering, tablebases=None,
+               pawn_hash_table=None) -> None:
+        """
+        The function is called at the end of the search to collect the final counts
+        """
+        self.seconds = time.perf_counter() - self.start_time
+        self.nodes = nodes
+        self.qnodes = qnodes
+        self.transposition_table = transposition_table.stats()
+        self.move_ordering = move_ordering.stats()
+        if tablebases is not None:
+            self.tablebase_hits = tablebases.hits
+        if pawn_hash_table is not None:
+            self.pawn_hash_table = pawn_hash_table.stats()
+
+    def record_researches(self, null_window_searches: int, null_window_researches: int, aspiration_searches: int,
+                          aspiration_researches: int) -> None:
+        self.null_window_searches = null_window_searches
+        self.null_window_researches = null_window_researches
+        self.aspiration_searches = aspiration_searches
+        self.aspiration_researches = aspiration_researches
+
+    def research_rate(self) -> float:
+        """
+        The function returns the share of the null-window searches that failed high and were searched again
+        """
+        return self.null_window_researches / self.null_window_searches if self.null_window_searches else 0.0
+
+    def aspiration_research_rate(self) -> float:
+        """
+        The function returns the number of searches again per iteration searched with an aspiration window,
+        a high rate means the window is too narrow
+        """
+        return self.aspiration_researches / self.aspiration_searches if self.aspiration_searches else 0.0
+
+    def nps(self) -> float:
+        return (self.nodes + self.qnodes) / self.seconds if self.seconds > 0 else 0.0
+
+    def branching_factor(self) -> float:
+        """
+        The function returns the effective branching factor: the nodes searched by the last iteration divided
+        by the nodes searched by the iteration before it. The node counts of the iterations are cumulative, so
+        the nodes of an iteration are the difference with the previous count (0 with less than three iterations).
+        """
+        if len(self.iterations) < 3:
+            return 0.0
+        last = self.iterations[-1]["nodes"] - self.iterations[-2]["nodes"]
+        previous = self.iterations[-2]["nodes"] - self.iterations[-3]["nodes"]
+        return last / previous if previous > 0 else 0.0
+
+    def as_dict(self) -> dict:
+        stats = {"depth": self.depth, "nodes": self.nodes, "qnodes": self.qnodes, "seconds": round(self.seconds, 4),
+                 "nps": round(self.nps()), "branching_factor": round(self.branching_factor(), 2),
+                 "transposition_table": self.transposition_table, "move_ordering": self.move_ordering,
+                 "pawn_hash_table": self.pawn_hash_table,
+                 "tablebase_hits": self.tablebase_hits,
+                 "null_window_searches": self.null_window_searches, "research_rate": round(self.research_rate(), 3),
+                 "aspiration_searches": self.aspiration_searches,
+                 "aspiration_research_rate": round(self.aspiration_research_rate(), 3), "pruning": self.pruning,
+                 "iterations": self.iterations}
+        if self.phase_seconds:
+            stats["phases"] = {phase: {"seconds": round(seconds, 4), "calls": self.phase_calls[phase],
+                                       "share": round(seconds / self.seconds, 3) if self.seconds > 0 else 0.0}
+                               for phase, seconds in self.phase_seconds.items()}
+        return stats
@@ -0,0 +1,312 @@
+"""
+Endgame tablebases: the exact result (win, draw or loss) and distance to mate of every position of an
+endgame with a king and one piece against a lone king (KQK, KRK and KPK).
+The tables are generated by retrograde analysis with the move generator of GameState:
+    python tablebase.py generate --dir tablebases
+and probed from the search, which then doesn't have to search the endgame at all.
+
+Every table is a file of one byte per position after an 8 byte header. The positions are stored with the
+strong side as white, a position where black has the piece is mirrored. The index of a position is
+    side to move (0 strong side, 1 weak side) << 18 | strong king << 12 | weak king << 6 | piece square
+(squares are row * 8 + col) and the byte is 0 for a draw (or an impossible position), otherwise the
+number of plies to mate + 1: the side to move wins if the number of plies is odd and loses if it is even.
+"""
+
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from game_state import GameState
+from move import Move
+from castle_right import NO_CASTLING_RIGHTS
+from attacks import is_square_attacked
+
+HEADER = struct.Struct(">4sB3s")  # magic, version, material
+MAGIC = b"PYTB"
+VERSION = 1
+# the piece of the strong side of every table, in the order the tables have to be generated
+# (the pawn promotes to a queen or a rook, so KPK needs the other two tables)
+MATERIALS = {"KQK": "Q", "KRK": "R", "KPK": "p"}
+TABLE_SIZE = 2 << 18
+MAX_PIECES = 3
+
+# results, from the point of view of the side to move
+WIN = 1
+DRAW = 0
+LOSS = -1
+
+# value of a drawn position while generating, 0 is still unknown
+GENERATION_DRAW = 255
+# turns the generation values into the stored values
+STORED_VALUES = bytes(range(255)) + b"\x00"
+
+
+def position_index(strong_to_move: bool, strong_king: int, weak_king: int, piece: int) -> int:
+    return (0 if strong_to_move else 1) << 18 | strong_king << 12 | weak_king << 6 | piece
+
+
+def decode_value(value: int) -> tuple:
+    """
+    The function returns the (result, plies to mate) of a stored value
+    """
+    if value == 0:
+        return DRAW, 0
+    plies = value - 1
+    return (WIN if plies % 2 == 1 else LOSS), plies
+
+
+def generate_table(material: str, tables: dict) -> bytearray:
+    """
+    The function generates the table of the material, tables are the tables generated already
+    (needed for the promotions of KPK)
+    """
+    piece = "w" + MATERIALS[material]
+    gs = GameState()
+    gs.board = [["--"] * 8 for _ in range(8)]
+    gs.current_castling_rights = NO_CASTLING_RIGHTS
+    gs.enpassant_possible = ()
+
+    # positions reached by a capture or a promotion are in other tables, their values are taken from
+    # virtual positions after the end of the table, one per value
+    values = bytearray(TABLE_SIZE + 256)
+    for value in range(1, 256):
+        values[TABLE_SIZE + value] = value
+    draw_node = TABLE_SIZE + GENERATION_DRAW
+
+    # the successors of every position, as the indexes of the positions after each move
+    successors = array("l")
+    offsets = array("l", [0]) * (TABLE_SIZE + 1)
+    unknown = []
+    for index in range(TABLE_SIZE):
+        offsets[index] = len(successors)
+        white_to_move = index >> 18 == 0
+        white_king, black_king, piece_square = index >> 12 & 63, index >> 6 & 63, index & 63
+        white_king_loc, black_king_loc, piece_loc = divmod(white_king, 8), divmod(black_king, 8), \
+            divmod(piece_square, 8)
+        # impossible positions: two pieces on one square, a pawn on the first or last rank, touching kings
+        if piece_square == white_king or piece_square == black_king or white_king == black_king:
+            continue
+        if piece[1] == "p" and piece_loc[0] in (0, 7):
+            continue
+        if abs(white_king_loc[0] - black_king_loc[0]) <= 1 and abs(white_king_loc[1] - black_king_loc[1]) <= 1:
+            continue
+
+        gs.board[white_king_loc[0]][white_king_loc[1]] = "wK"
+        gs.board[black_king_loc[0]][black_king_loc[1]] = "bK"
+        gs.board[piece_loc[0]][piece_loc[1]] = piece
+        gs.white_king_loc, gs.black_king_loc, gs.whiteToMove = white_king_loc, black_king_loc, white_to_move
+        # the side that just moved can't be in check
+        waiting_king = black_king_loc if white_to_move else white_king_loc
+        if not is_square_attacked(gs.board, waiting_king[0], waiting_king[1], "w" if white_to_move else "b"):
+            moves = gs.get_valid_moves()
+            if not moves:
+                values[index] = 1 if gs.inCheck else GENERATION_DRAW  # mated in 0 plies or stalemate
+            else:
+                for packed_move in moves:
+                    move = Move(packed_move)
+                    end_square = move.end_row * 8 + move.end_col
+                    if move.is_capture:
+                        successors.append(draw_node)  # the lone kings can't win
+                    elif move.is_pawn_promotion:
+                        promoted = "K" + move.promotion_piece + "K"
+                        value = tables[promoted][position_index(False, white_king, black_king, end_square)] \
+                            if promoted in tables else 0
+                        successors.append(TABLE_SIZE + value if value else draw_node)
+                    elif move.piece_moved == "wK":
+                        successors.append(position_index(not white_to_move, end_square, black_king, piece_square))
+                    elif move.piece_moved == "bK":
+                        successors.append(position_index(not white_to_move, white_king, end_square, piece_square))
+                    else:
+                        successors.append(position_index(not white_to_move, white_king, black_king, end_square))
+                unknown.append(index)
+        gs.board[white_king_loc[0]][white_king_loc[1]] = "--"
+        gs.board[black_king_loc[0]][black_king_loc[1]] = "--"
+        gs.board[piece_loc[0]][piece_loc[1]] = "--"
+    offsets[TABLE_SIZE] = len(successors)
+
+    # retrograde analysis: the positions won in n plies have a move to a position lost in n - 1 plies,
+    # the positions lost in n plies have only moves to positions won in less than n plies.
+    # It ends when two iterations in a row find nothing and no value of the other tables is left
+    last_external_value = max((max(table) for table in tables.values()), default=0)
+    plies = 1
+    quiet_iterations = 0
+    while unknown and (quiet_iterations < 2 or plies <= last_external_value) and plies < GENERATION_DRAW - 1:
+        found = []
+        still_unknown = []
+        for index in unknown:
+            position_successors = successors[offsets[index]:offsets[index + 1]]
+            if plies % 2 == 1:
+                resolved = plies in (values[successor] for successor in position_successors)
+            else:
+                resolved = all(values[successor] and values[successor] % 2 == 0 for successor in position_successors)
+            (found if resolved else still_unknown).append(index)
+        # the values are set after the iteration, so every position found has exactly `plies` plies to mate
+        for index in found:
+            values[index] = plies + 1
+        unknown = still_unknown
+        quiet_iterations = 0 if found else quiet_iterations + 1
+        plies += 1
+
+    # the positions left unknown are draws
+    return bytearray(values[:TABLE_SIZE].translate(STORED_VALUES))
+
+
+def write_table(path: str, material: str, table: bytearray) -> None:
+    with open(path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, material.encode()))
+        file.write(table)
+
+
+def generate(directory: str, materials: list = None) -> dict:
+    """
+    The function generates the tables of the materials (all of them by default) into the directory and
+    returns the generation statistics of every table
+    """
+    os.makedirs(directory, exist_ok=True)
+    tables = Tablebases(directory).tables
+    stats = {}
+    for material in MATERIALS:
+        if materials is not None and material not in materials:
+            continue
+        start_time = time.perf_counter()
+        table = generate_table(material, tables)
+        write_table(os.path.join(directory, f"{material}.tb"), material, table)
+        tables[material] = table
+        wins = sum(1 for value in table if value and value % 2 == 0)
+        stats[material] = {"seconds": round(time.perf_counter() - start_time, 1), "wins": wins,
+                           "losses": sum(1 for value in table if value % 2 == 1),
+                           # the plies to mate of the longest win, the side to move of the longest loss
+                           # needs one more ply because it moves first
+                           "longest_mate_plies": max((value - 1 for value in table if value and value % 2 == 0),
+                                                     default=0)}
+    return stats
+
+
+class Tablebases:
+    def __init__(self, directory: str):
+        """
+        The tables of the directory are memory-mapped, missing tables are skipped
+        """
+        self.files = []
+        self.tables = {}
+        for material in MATERIALS:
+            path = os.path.join(directory, f"{material}.tb")
+            if not os.path.exists(path):
+                continue
+            file = open(path, "rb")
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, stored_material = HEADER.unpack_from(data)
+            if magic != MAGIC or version != VERSION or stored_material.decode() != material or \
+                    len(data) != HEADER.size + TABLE_SIZE:
+                raise ValueError(f"{path} is not a tablebase of {material}")
+            self.files.append((file, data))
+            self.tables[material] = memoryview(data)[HEADER.size:]
+
+        # statistics
+        self.probes = 0
+        self.hits = 0
+
+    def reset_stats(self) -> None:
+        self.probes = 0
+        self.hits = 0
+
+    def close(self) -> None:
+        for material in list(self.tables):
+            self.tables.pop(material).release()
+        for file, data in self.files:
+            data.close()
+            file.close()
+        self.files = []
+
+    def probe(self, gs: GameState):
+        """
+        The function returns the (result, plies to mate) of the position from the point of view of the side
+        to move, or None if the position isn't in the tables
+        """
+        if gs.piece_count > MAX_PIECES:
+            return None
+        if gs.current_castling_rights != NO_CASTLING_RIGHTS:
+            return None
+        self.probes += 1
+        pieces = [(gs.board[row][col], row, col) for row in range(8) for col in range(8)
+                  if gs.board[row][col] != "--" and gs.board[row][col][1] != "K"]
+        if not pieces or (len(pieces) == 1 and pieces[0][0][1] in "BN"):
+            self.hits += 1
+            return DRAW, 0  # not enough material to mate
+        if len(pieces) != 1:
+            return None
+        piece, row, col = pieces[0]
+        table = self.tables.get("K" + piece[1].upper() + "K")
+        if table is None:
+            return None
+        self.hits += 1
+        if piece[0] == "w":
+            index = position_index(gs.whiteToMove, gs.white_king_loc[0] * 8 + gs.white_king_loc[1],
+                                   gs.black_king_loc[0] * 8 + gs.black_king_loc[1], row * 8 + col)
+        else:
+            # mirror the board so the strong side is white
+            index = position_index(not gs.whiteToMove, (7 - gs.black_king_loc[0]) * 8 + gs.black_king_loc[1],
+                                   (7 - gs.white_king_loc[0]) * 8 + gs.white_king_loc[1], (7 - row) * 8 + col)
+        return decode_value(table[index])
+
+    def best_move(self, gs: GameState, valid_moves: list):
+        """
+        The function returns the packed move with the best tablebase result: the fastest win, a draw or the slowest
+        loss, or None if the position isn't in the tables
+        """
+        if self.probe(gs) is None:
+            return None
+        best_move = None
+        best_key = None
+        for move in valid_moves:
+            gs.make_move(move)
+            result = self.probe(gs)
+            gs.undo_move()
+            if result is None:
+                return None
+            # the result of the opponent: a loss in few plies is best, a win in few plies is worst
+            opponent_result, plies = result
+            key = (-opponent_result, -plies if opponent_result == LOSS else plies)
+            if best_key is None or key > best_key:
+                best_move, best_key = move, key
+        return best_move
+
+    def stats(self) -> dict:
+        return {"tables": sorted(self.tables), "probes": self.probes, "hits": self.hits}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Endgame tablebases")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    generate_parser = subparsers.add_parser("generate", help="generate the tables")
+    generate_parser.add_argument("--dir", default="tablebases")
+    generate_parser.add_argument("materials", nargs="*", help=f"the tables to generate, of {', '.join(MATERIALS)}")
+    probe_parser = subparsers.add_parser("probe", help="print the result of a position")
+    probe_parser.add_argument("fen")
+    probe_parser.add_argument("--dir", default="tablebases")
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        unknown_materials = set(args.materials) - set(MATERIALS)
+        if unknown_materials:
+            parser.error(f"unknown tables {', '.join(sorted(unknown_materials))}")
+        print(generate(args.dir, args.materials or None))
+    elif args.command == "probe":
+        tablebases = Tablebases(args.dir)
+        gs = GameState.from_fen(args.fen)
+        result = tablebases.probe(gs)
+        if result is None:
+            print("not in the tables")
+        else:
+            best_move = tablebases.best_move(gs, gs.get_valid_moves())
+            print({WIN: "win", DRAW: "draw", LOSS: "loss"}[result[0]], f"in {result[1]} plies" if result[1] else "",
+                  f"best move {Move(best_move).get_uci_notation()}" if best_move is not None else "")
+        tablebases.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
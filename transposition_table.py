@@ -0,0 +1,122 @@
+"""
+A fixed-size transposition table for the search, keyed by the zobrist hash of the GameState.
+The table is split into buckets of two entries: the first entry keeps the deepest search of the
+position (depth-preferred), the second entry is always replaced. Entries are stored in a flat buffer
+so the memory used is known in advance and doesn't grow during the search. The buffer can be shared
+memory, so several search processes can use the same table (see parallel_search.py).
+"""
+
+# bound types of the stored score
+EXACT = 0
+LOWER_BOUND = 1  # the search failed high, the real score is at least the stored score
+UPPER_BOUND = 2  # the search failed low, the real score is at most the stored score
+
+ENTRY_SIZE = 16  # bytes per entry: the key and the packed data
+NO_MOVE = 0xFFFF
+SCORE_SCALE = 10000  # scores are stored as integers in units of 1 / SCORE_SCALE
+SCORE_OFFSET = 1 << 31
+
+
+def table_size(size_mb: float) -> int:
+    """
+    The function returns the size in bytes of a table of size_mb megabytes (rounded down to whole buckets)
+    """
+    return max(1, int(size_mb * 1024 * 1024) // (2 * ENTRY_SIZE)) * 2 * ENTRY_SIZE
+
+
+class TranspositionTable:
+    def __init__(self, size_mb: float = 16, buffer=None):
+        num_bytes = table_size(size_mb)
+        self.num_buckets = num_bytes // (2 * ENTRY_SIZE)
+        if buffer is None:
+            buffer = bytearray(num_bytes)
+        self.view = memoryview(buffer).cast("B")[:num_bytes]
+        # the key is stored xor-ed with the data, so an entry written by two processes at the same
+        # time (a torn entry) doesn't match any key and is never used
+        self.keys = self.view[:num_bytes // 2].cast("Q")
+        # bits 0-15 move id, bits 16-23 depth, bits 24-25 bound type, bits 26-31 age, bits 32-63 score
+        self.data = self.view[num_bytes // 2:].cast("Q")
+        self.age = 0
+
+        # statistics
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.overwrites = 0
+
+    def clear(self) -> None:
+        """
+        The function removes all the entries and resets the statistics
+        """
+        self.view[:] = bytes(len(self.view))
+        self.age = 0
+        self.reset_stats()
+
+    def release(self) -> None:
+        """
+        The function releases the buffer of the table (needed before closing a shared memory block)
+        """
+        self.keys.release()
+        self.data.release()
+        self.view.release()
+
+    def reset_stats(self) -> None:
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.overwrites = 0
+
+    def new_search(self) -> None:
+        """
+        The function is called before every search, entries from older searches are replaced first
+        """
+        self.age = (self.age + 1) & 0x3F
+
+    def probe(self, key: int):
+        """
+        The function returns (depth, bound, score, move_id) of the stored position, or None if the
+        position isn't in the table. move_id is None if no best move was stored.
+        """
+        self.probes += 1
+        index = 2 * (key % self.num_buckets)
+        for i in (index, index + 1):
+            data = self.data[i]
+            if data != 0 and self.keys[i] ^ data == key:
+                self.hits += 1
+                move_id = data & NO_MOVE
+                return (data >> 16) & 0xFF, (data >> 24) & 0x3, ((data >> 32) - SCORE_OFFSET) / SCORE_SCALE, \
+                    None if move_id == NO_MOVE else move_id
+        return None
+
+    def store(self, key: int, depth: int, bound: int, score: float, move_id=None) -> None:
+        """
+        The function stores the search result of the position
+        """
+        self.stores += 1
+        index = 2 * (key % self.num_buckets)
+        # depth-preferred entry: replace it if it is the same position, a shallower search
+        # or left over from an older search, otherwise use the always-replace entry
+        stored = self.data[index]
+        if stored != 0 and self.keys[index] ^ stored != key and (stored >> 16) & 0xFF > depth \
+                and (stored >> 26) & 0x3F == self.age:
+            index += 1
+        stored = self.data[index]
+        if stored != 0 and self.keys[index] ^ stored != key:
+            self.overwrites += 1
+        data = (NO_MOVE if move_id is None else move_id) | (depth & 0xFF) << 16 | bound << 24 | self.age << 26 | \
+            (round(score * SCORE_SCALE) + SCORE_OFFSET) << 32
+        self.keys[index] = key ^ data
+        self.data[index] = data
+
+    def hit_rate(self) -> float:
+        return self.hits / self.probes if self.probes else 0.0
+
+    def usage(self) -> float:
+        """
+        The function returns the fraction of the entries that are in use
+        """
+        return sum(1 for data in self.data if data != 0) / len(self.data)
+
+    def stats(self) -> dict:
+        return {"size_mb": len(self.view) / (1024 * 1024), "probes": self.probes, "hits": self.hits,
+                "hit_rate": self.hit_rate(), "stores": self.stores, "overwrites": self.overwrites}
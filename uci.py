@@ -0,0 +1,228 @@
+"""
+UCI (Universal Chess Interface) front end, so the engine can run headless in tournament managers and
+batch pipelines. Reads commands from stdin and writes the answers to stdout:
+    python uci.py
+    position startpos moves e2e4 e7e5
+    go movetime 1000
+"""
+
+import sys
+import threading
+from game_state import GameState
+from move import Move
+from bitboard import BitboardGameState
+from transposition_table import TranspositionTable
+from book import OpeningBook
+from tablebase import Tablebases
+import ai
+
+ENGINE_NAME = "Python Chess Engine"
+ENGINE_AUTHOR = "iTerner"
+BACKENDS = {"mailbox": GameState, "bitboard": BitboardGameState}
+MOVES_TO_GO = 30  # moves the remaining time is split over when the GUI doesn't say
+MOVE_OVERHEAD = 0.05  # seconds kept for communication
+MIN_HASH_MB, MAX_HASH_MB = 1, 4096  # range of the Hash option, other sizes are clamped to it
+
+
+def send(line: str) -> None:
+    sys.stdout.write(line + "\n")
+    sys.stdout.flush()
+
+
+def parse_position(tokens: list, game_state_class) -> GameState:
+    """
+    The function creates the game state of a "position startpos|fen <fen> [moves ...]" command
+    """
+    if "moves" in tokens:
+        moves = tokens[tokens.index("moves") + 1:]
+        tokens = tokens[:tokens.index("moves")]
+    else:
+        moves = []
+    if tokens[0] == "fen":
+        gs = game_state_class.from_fen(" ".join(tokens[1:]))
+    else:
+        gs = game_state_class()
+    for uci_move in moves:
+        for move in gs.get_valid_moves():
+            if Move(move).get_uci_notation() == uci_move:
+                gs.make_move(move)
+                break
+        else:
+            raise ValueError(f"illegal move {uci_move}")
+    return gs
+
+
+def format_score(score: float) -> str:
+    """
+    The function formats the score (in pawns, from the side to move) as a UCI score
+    """
+    if abs(score) >= ai.TABLEBASE_SCORE_MIN:
+        # a mate or tablebase score, CHECKMATE or TABLEBASE_WIN minus the plies to mate
+        plies = round((ai.CHECKMATE if abs(score) >= ai.MATE_SCORE_MIN else ai.TABLEBASE_WIN) - abs(score))
+        mate_in = (plies + 1) // 2
+        return f"mate {mate_in if score > 0 else -mate_in}"
+    return f"cp {round(score * 100)}"
+
+
+def parse_go(tokens: list, white_to_move: bool) -> dict:
+    """
+    The function converts the arguments of a "go" command to the search limits of ai.find_best_move
+    """
+    args = {}
+    i = 0
+    while i < len(tokens):
+        if tokens[i] == "infinite":
+            args["infinite"] = True
+            i += 1
+        elif i + 1 < len(tokens):
+            try:
+                args[tokens[i]] = int(tokens[i + 1])
+            except ValueError:
+                pass
+            i += 2
+        else:
+            i += 1
+
+    limits = {"time_limit": None, "node_limit": None, "max_depth": args.get("depth", ai.MAX_DEPTH)}
+    if "nodes" in args:
+        limits["node_limit"] = args["nodes"]
+    if "movetime" in args:
+        limits["time_limit"] = args["movetime"] / 1000
+    elif "wtime" in args or "btime" in args:
+        remaining = args.get("wtime" if white_to_move else "btime", 0) / 1000
+        increment = args.get("winc" if white_to_move else "binc", 0) / 1000
+        moves_to_go = args.get("movestogo", MOVES_TO_GO)
+        limits["time_limit"] = max(0.01, min(remaining / moves_to_go + increment / 2, remaining - MOVE_OVERHEAD))
+    elif "depth" not in args and "nodes" not in args and "infinite" not in args:
+        limits["time_limit"] = ai.TIME_LIMIT
+    return limits
+
+
+class UciEngine:
+    def __init__(self):
+        self.game_state_class = GameState
+        self.gs = GameState()
+        self.search_thread = None
+        self.stop_event = threading.Event()
+        self.own_book = False
+        self.book_path = None
+        ai.VERBOSE = False  # stdout is the protocol channel
+
+    def send_info(self, info: dict) -> None:
+        nps = round(info["nodes"] / info["time"]) if info["time"] > 0 else 0
+        pv = " ".join(Move(move).get_uci_notation() for move in info["pv"])
+        send(f"info depth {info['depth']} score {format_score(info['score'])} "
+             f"nodes {info['nodes']} nps {nps} time {round(info['time'] * 1000)} pv {pv}")
+
+    def search(self, gs: GameState, limits: dict) -> None:
+        valid_moves = gs.get_valid_moves()
+        best_move = None
+        if valid_moves:
+            best_move = ai.find_best_move(gs, valid_moves, stop_event=self.stop_event,
+                                          info_callback=self.send_info, **limits)
+            if best_move is None:  # stopped before the first iteration finished
+                best_move = valid_moves[0]
+        send(f"bestmove {Move(best_move).get_uci_notation() if best_move is not None else '0000'}")
+
+    def stop(self) -> None:
+        if self.search_thread is not None:
+            self.stop_event.set()
+            self.search_thread.join()
+            self.search_thread = None
+
+    def set_option(self, tokens: list) -> None:
+        """
+        The function handles "setoption name <name> value <value>"
+        """
+        if "name" not in tokens or "value" not in tokens:
+            return
+        name = " ".join(tokens[tokens.index("name") + 1:tokens.index("value")]).lower()
+        value = " ".join(tokens[tokens.index("value") + 1:])
+        if name == "hash":
+            try:
+                size_mb = int(value)
+            except ValueError:
+                send(f"info string invalid Hash value: {value}")
+                return
+            ai.transposition_table = TranspositionTable(min(max(size_mb, MIN_HASH_MB), MAX_HASH_MB))
+        elif name == "backend" and value in BACKENDS:
+            self.game_state_class = BACKENDS[value]
+            self.gs = self.game_state_class()
+        elif name == "bookfile":
+            self.book_path = None if value in ("", "<empty>") else value
+        elif name == "ownbook":
+            self.own_book = value == "true"
+        if name in ("bookfile", "ownbook"):
+            self.load_book()
+        elif name == "tablebasepath":
+            if ai.tablebases is not None:
+                ai.tablebases.close()
+            ai.tablebases = None if value in ("", "<empty>") else Tablebases(value)
+
+    def load_book(self) -> None:
+        if ai.opening_book is not None:
+            ai.opening_book.close()
+            ai.opening_book = None
+        if self.own_book and self.book_path is not None:
+            try:
+                ai.opening_book = OpeningBook(self.book_path)
+            except OSError as error:
+                send(f"info string can't open the book: {error}")
+
+    def handle(self, line: str) -> bool:
+        """
+        The function handles one command, returns False when the engine should quit
+        """
+        tokens = line.split()
+        if not tokens:
+            return True
+        command = tokens[0]
+        if command == "uci":
+            send(f"id name {ENGINE_NAME}")
+            send(f"id author {ENGINE_AUTHOR}")
+            send(f"option name Hash type spin default {ai.TT_SIZE_MB} min {MIN_HASH_MB} max {MAX_HASH_MB}")
+            send("option name Backend type combo default mailbox var mailbox var bitboard")
+            send("option name OwnBook type check default false")
+            send("option name BookFile type string default <empty>")
+            send("option name TablebasePath type string default <empty>")
+            send("uciok")
+        elif command == "isready":
+            send("readyok")
+        elif command == "setoption":
+            self.stop()
+            self.set_option(tokens[1:])
+        elif command == "ucinewgame":
+            self.stop()
+            self.gs = self.game_state_class()
+            ai.transposition_table.clear()
+            ai.move_ordering.clear()
+        elif command == "position":
+            self.stop()
+            try:
+                self.gs = parse_position(tokens[1:], self.game_state_class)
+            except (ValueError, KeyError, IndexError) as error:
+                send(f"info string invalid position: {error}")
+        elif command == "go":
+            self.stop()
+            self.stop_event.clear()
+            limits = parse_go(tokens[1:], self.gs.whiteToMove)
+            self.search_thread = threading.Thread(target=self.search, args=(self.gs, limits), daemon=True)
+            self.search_thread.start()
+        elif command == "stop":
+            self.stop()
+        elif command == "quit":
+            self.stop()
+            return False
+        return True
+
+
+def main() -> None:
+    engine = UciEngine()
+    for line in sys.stdin:
+        if not engine.handle(line.strip()):
+            break
+    engine.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Zobrist hashing of a chess position.
+Every (piece, square) pair, the side to move, each castling right and each en-passant file gets a random
+64-bit key, and the hash of a position is the XOR of the keys of everything that is true in it. This lets
+GameState update the hash incrementally in make_move and undo_move instead of rehashing the whole board.
+The keys are the random numbers of the Polyglot book format, so the hash is the key of the position in
+Polyglot opening books (see book.polyglot_key for the one difference, the en-passant file).
+The pawn hash is the XOR of the keys of the pawns only, the key of the pawn structure in the pawn hash table.
+"""
+
+from polyglot_keys import RANDOM64
+from castle_right import WHITE_KING_SIDE, WHITE_QUEEN_SIDE, BLACK_KING_SIDE, BLACK_QUEEN_SIDE
+
+PIECES = ["wp", "wR", "wN", "wB", "wQ", "wK",
+          "bp", "bR", "bN", "bB", "bQ", "bK"]
+
+# the Polyglot kind of every piece
+POLYGLOT_PIECE_KINDS = {"bp": 0, "wp": 1, "bN": 2, "wN": 3, "bB": 4, "wB": 5,
+                        "bR": 6, "wR": 7, "bQ": 8, "wQ": 9, "bK": 10, "wK": 11}
+
+# PIECE_SQUARE_KEYS[piece][row][col], Polyglot numbers the squares from a1 (row 7, col 0)
+PIECE_SQUARE_KEYS = {piece: [[RANDOM64[64 * POLYGLOT_PIECE_KINDS[piece] + 8 * (7 - row) + col] for col in range(8)]
+                             for row in range(8)]
+                     for piece in PIECES}
+CASTLE_KEYS = {WHITE_KING_SIDE: RANDOM64[768], WHITE_QUEEN_SIDE: RANDOM64[769], BLACK_KING_SIDE: RANDOM64[770],
+               BLACK_QUEEN_SIDE: RANDOM64[771]}
+ENPASSANT_FILE_KEYS = RANDOM64[772:780]
+# in the hash when white is to move, every move toggles it
+WHITE_TO_MOVE_KEY = RANDOM64[780]
+
+
+def compute_castle_rights_keys() -> list:
+    """
+    The function computes the combined key of the available rights of every 4-bit castling rights value
+    """
+    keys = []
+    for castle_rights in range(16):
+        key = 0
+        for right, right_key in CASTLE_KEYS.items():
+            if castle_rights & right:
+                key ^= right_key
+        keys.append(key)
+    return keys
+
+
+CASTLE_RIGHTS_KEYS = compute_castle_rights_keys()
+
+
+def castle_rights_key(castle_rights: int) -> int:
+    """
+    The function returns the combined key of all the castling rights that are still available
+    """
+    return CASTLE_RIGHTS_KEYS[castle_rights]
+
+
+def enpassant_key(enpassant_possible: tuple) -> int:
+    """
+    The function returns the key of the en-passant file, or 0 if en-passant is not possible
+    """
+    if enpassant_possible == ():
+        return 0
+    return ENPASSANT_FILE_KEYS[enpassant_possible[1]]
+
+
+def compute_hash(gs) -> int:
+    """
+    The function computes the hash of the game state from scratch
+    """
+    key = 0
+    for row in range(8):
+        for col in range(8):
+            piece = gs.board[row][col]
+            if piece != "--":
+                key ^= PIECE_SQUARE_KEYS[piece][row][col]
+    if gs.whiteToMove:
+        key ^= WHITE_TO_MOVE_KEY
+    key ^= castle_rights_key(gs.current_castling_rights)
+    key ^= enpassant_key(gs.enpassant_possible)
+    return key
+
+
+def compute_pawn_hash(gs) -> int:
+    """
+    The function computes the pawn hash of the game state (the keys of its pawns) from scratch
+    """
+    key = 0
+    for row in range(8):
+        for col in range(8):
+            piece = gs.board[row][col]
+            if piece == "wp" or piece == "bp":
+                key ^= PIECE_SQUARE_KEYS[piece][row][col]
+    return key